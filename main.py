@@ -13,6 +13,8 @@ from models.ticking_class.ticking_sun import TickingSun
 if __name__ == "__main__":
     if len(sys.argv) >= 2 and sys.argv[1] == "GUI":
         app = QtWidgets.QApplication([])
+        # python main.py GUI process: the simulation runs in a child process, see SimulationProcess
+        MainController.SIMULATION_PROCESS = len(sys.argv) >= 3 and sys.argv[2] == "process"
         controller = MainController()
 
         controller.view.show()
@@ -20,7 +22,9 @@ if __name__ == "__main__":
     else:
         universe = Universe()
         universe.sun = TickingSun()  # Can be replace with Sun()
-        universe.earth = TickingEarth(shape=(400, 400))  # Can be replace with Earth(shape=(400, 400))
+        # python main.py periodic: opposite borders are linked, the uniform earth then diffuses in Fourier space
+        periodic = len(sys.argv) >= 2 and sys.argv[1] == "periodic"
+        universe.earth = TickingEarth(shape=(400, 400), periodic=periodic)  # Can be replace with Earth(shape=(400, 400))
         universe.discover_everything()
 
         # Fills the earth with random GridChunk of water
@@ -1,7 +1,13 @@
 CANVAS_SIZE = (400, 400)
+# Resolutions of the earth that can be simulated, independently of the canvas that scales it [cells]
+EARTH_SHAPES = [(100, 100), (200, 200), (400, 400), (800, 800)]
+EARTH_SHAPE = CANVAS_SIZE
 ICON_SIZE = (16, 16)
+FRAME_RATE = 20  # [frames s^-1] Highest rate at which the views show the snapshots of a running simulation
 
-COMPONENTS = ["WATER", "AIR", "LAND"]  # Here and not in the model universe because it is required by the GUI and the model
+# Here and not in the model universe because it is required by the GUI and the model. The position of a material is its
+# id in models.physical_class.component_registry
+COMPONENTS = ["WATER", "AIR", "LAND", "ARGON", "NITROGEN", "OXYGEN"]
 
 SPECIFIC_HEAT_CAPACITY = {  # [J kg^-1 C^-1]
     "WATER": 4184,
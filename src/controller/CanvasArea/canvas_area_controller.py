@@ -1,5 +1,7 @@
 from typing import TYPE_CHECKING
 
+import numpy
+
 from controller.CanvasArea.subcontrollers.canvas_controller import CanvasController
 from controller.CanvasArea.subcontrollers.text_edit_controller import TextEditController
 from views.canvas_area import CanvasArea
@@ -10,6 +12,8 @@ if TYPE_CHECKING:
 
 
 class CanvasAreaController:
+    rendered: int = 0  # Number of snapshots published by the universe when the last one was shown
+
     def __init__(self, parent_controller: "MainController"):
         self.main_controller = parent_controller
         self.canvas_controller = CanvasController(parent_controller=self, main_controller=self.main_controller)
@@ -23,12 +27,34 @@ class CanvasAreaController:
     def clear_canvas(self):
         self.canvas_controller.clear_canvas()
         self.temperature_view.clear()
+        self.rendered = 0
+
+    def render_snapshot(self):
+        """
+        Called at FRAME_RATE, show the last snapshot published by the simulation if it was not shown yet
+        :return:
+        """
+        snapshots = self.main_controller.snapshots
+        if snapshots.published == self.rendered:
+            return
+        self.rendered = snapshots.published
+        if self.temperature_view.isVisible():
+            with snapshots.latest() as snapshot:
+                self.temperature_view.show_snapshot(snapshot)
+
+    def redraw_cells(self, indices: numpy.ndarray):
+        self.canvas_controller.redraw_cells(indices)
+        self.temperature_view.update_pixels()
+
+    def draw_pixels(self, pixels: numpy.ndarray):
+        self.canvas_controller.view.draw_pixels(pixels)
+        self.temperature_view.update_pixels()
 
     def set_canvas_enabled(self, value: bool):
         self.canvas_controller.view.setEnabled(value)
 
     def get_canvas_as_qimage(self):
-        return self.view.canvas.pixmap().toImage()
+        return self.view.canvas.image
 
     def update_temperature_canvas(self):
         self.temperature_view.update_pixels()
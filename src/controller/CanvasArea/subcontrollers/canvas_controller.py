@@ -1,6 +1,13 @@
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 
+import math
+
+import numpy
+
+from constants import CANVAS_SIZE
 from messages import Loading
+from models.array_class.palette import EMPTY_COLOR, mix_colors, pack
+from models.array_class.resampling import resample_area
 from views.widgets.canvas_widget import CanvasWidget
 
 if TYPE_CHECKING:
@@ -10,7 +17,9 @@ if TYPE_CHECKING:
 
 class CanvasController:
     painting_enabled: bool = True
-    last_painted_positions: list[tuple[int, int]] = []
+    # (*stroke_shape) Part of the earth painted since the mouse was pressed, at least as fine as the canvas
+    stroke: Optional[numpy.ndarray] = None
+    COVERAGE_THRESHOLD: float = 0.5  # Fraction of a cell that the stroke covers for the cell to be painted
 
     def __init__(self, parent_controller: "CanvasAreaController", main_controller: "MainController"):
         self.main_controller = main_controller
@@ -20,9 +29,34 @@ class CanvasController:
     def get_brush_width(self):
         return self.main_controller.get_brush_width()
 
+    def get_grid_shape(self) -> tuple[int, int]:
+        """
+        :return: (height, width) of the earth, that the canvas shows
+        """
+        return tuple(reversed(self.main_controller.model.earth.shape))
+
+    def get_stroke_shape(self) -> tuple[int, int]:
+        """
+        :return: (height, width) of the strokes, so that a cell coarser than a pixel of the whole canvas is painted
+            according to the area of it that the brush covered
+        """
+        return tuple(max(grid, canvas) for grid, canvas in zip(self.get_grid_shape(), reversed(CANVAS_SIZE)))
+
     def clear_canvas(self):
         self.view.clear()
 
+    def redraw_cells(self, indices: numpy.ndarray):
+        """
+        Draw again the cells from the grid chunks of the earth, after they were replaced without the brush
+        :param indices: flat indices of the cells
+        :return:
+        """
+        cells = self.main_controller.model.earth.cells(indices)
+        total_mass = cells.mass.sum(axis=0)
+        ratios = numpy.divide(cells.mass, total_mass, out=numpy.zeros(cells.mass.shape), where=total_mass > 0)
+        colors = numpy.where(cells.active, pack(mix_colors(ratios.T)), pack(EMPTY_COLOR)) | 0xFF000000
+        self.view.draw_cells(indices, colors.tolist())
+
     def is_painting_enabled(self):
         return self.painting_enabled
 
@@ -30,19 +64,57 @@ class CanvasController:
         self.painting_enabled = value
 
     def mouse_moved(self, x: int, y: int):
-        if self.main_controller.model:
+        if self.main_controller.is_simulating():
+            # The grid chunks are being updated, only the snapshots can be read
+            with self.main_controller.latest_snapshot(refresh=False) as snapshot:
+                active = snapshot is not None and snapshot.active[y, x]
+                self.view.setToolTip(f"Temperature {snapshot.temperature[y, x]}°C" if active else "")
+        elif self.main_controller.model:
             component = self.main_controller.model.get_component_at(x, y)
             self.view.setToolTip(component.__str__() or f"Component at {x}, {y}")
         else:
             self.view.setToolTip("")
 
     def mouse_engaged(self):
-        pass
+        self.stroke = numpy.zeros(self.get_stroke_shape(), dtype=bool)
+
+    def paint_square(self, row: float, column: float, width: float):
+        """
+        Add the square of the brush centered on the position to the stroke
+        :param row: position of the center of the brush in the earth [cells]
+        :param column:
+        :param width: side of the brush [cells]
+        :return:
+        """
+        if self.stroke is None:
+            self.mouse_engaged()
+        key = []
+        for position, stroke, grid in zip((row, column), self.stroke.shape, self.get_grid_shape()):
+            scale = stroke / grid
+            start = math.floor((position - width / 2) * scale + 0.5)
+            stop = max(start + 1, math.floor((position + width / 2) * scale + 0.5))
+            # The brush may go past the borders of the earth, or be entirely outside of it
+            key.append(slice(min(max(0, start), stroke), min(max(0, stop), stroke)))
+        self.stroke[tuple(key)] = True
+
+    def rasterize_stroke(self) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        :return: (*grid_shape) the cells covered enough by the stroke to be painted, and the cells that the stroke
+            covers partly, whose color on the canvas may differ from what is painted
+        """
+        coverage = resample_area(self.stroke, self.get_grid_shape())
+        return coverage >= self.COVERAGE_THRESHOLD, ~numpy.isclose(coverage, 0) & ~numpy.isclose(coverage, 1)
 
     def mouse_released(self):
+        if self.stroke is None or not self.stroke.any():
+            self.stroke = None
+            return
         self.main_controller.process_message(Loading())
-        self.main_controller.components_painted(*self.last_painted_positions)
-        self.last_painted_positions = []
+        painted, edges = self.rasterize_stroke()
+        self.stroke = None
+        if painted.any():
+            self.main_controller.components_painted(painted)
+        self.redraw_cells(numpy.flatnonzero(edges))
         self.main_controller.finish_process_message(Loading)
 
         self.parent_controller.temperature_view.update_pixels()
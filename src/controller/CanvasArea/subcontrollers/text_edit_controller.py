@@ -1,5 +1,6 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
+from models.physical_class.summary import UniverseSummary
 from views.widgets.text_edit_widget import TextEdit
 
 if TYPE_CHECKING:
@@ -8,6 +9,8 @@ if TYPE_CHECKING:
 
 
 class TextEditController:
+    shown: Optional[UniverseSummary] = None  # Summary in the text edit
+
     def __init__(self, parent_controller: "CanvasAreaController", main_controller: "MainController"):
         self.parent_controller = parent_controller
         self.main_controller = main_controller
@@ -22,4 +25,7 @@ class TextEditController:
             self.view.auto_update_timer.stop()
 
     def refresh(self):
-        self.view.text_edit.setText(self.main_controller.model.__str__())
+        with self.main_controller.latest_snapshot() as snapshot:
+            if snapshot is not None and snapshot.summary is not self.shown:
+                self.shown = snapshot.summary
+                self.view.text_edit.setText(str(self.shown))
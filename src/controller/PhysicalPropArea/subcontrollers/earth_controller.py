@@ -22,6 +22,8 @@ class EarthController:
 
     def button_pressed(self):
         result = self.popup.exec_()
-        if result:
+        if not result:
+            return
+        with self.main_controller.edit_history.group():
             self.main_controller.set_earth_radius(float(self.popup.radius_value.text()))
             self.main_controller.set_earth_albedo(self.popup.albedo.get_value() / 100)
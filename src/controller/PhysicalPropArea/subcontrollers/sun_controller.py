@@ -22,6 +22,8 @@ class SunController:
 
     def button_pressed(self):
         result = self.popup.exec_()
-        if result:
+        if not result:
+            return
+        with self.main_controller.edit_history.group():
             self.main_controller.set_sun_energy_per_second(float(self.popup.output.text()))
             self.main_controller.set_sun_radius(float(self.popup.radius_value.text()))
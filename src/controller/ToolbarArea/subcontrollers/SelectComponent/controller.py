@@ -24,16 +24,23 @@ class SelectComponentController:
         result = self.popup_controller.view.exec_()
         if result:
             self.main_controller.finish_process_message(NoComponentBrushSelected)
-            components = []
             ratios = self.get_ratios()
             if all(not r for r in ratios):  # If all ratios are 0
                 return
-            ratios = [x / sum(ratios) for x in ratios]  # Normalize
-            for i, controller in enumerate(self.popup_controller.sub_controllers):
-                components.append(ChunkComponent(self.get_mass() * ratios[i], self.get_temperature(),
-                                                 component_type=controller.type))
-            self.__grid_chunk = TickingGridChunk(components, volume=self.get_volume_each(),
-                                                 carbon_ppm=self.popup_controller.view.carbon_widget.value())
+            self.__grid_chunk = self.build_grid_chunk(ratios)
+
+    def build_grid_chunk(self, ratios: list[float]) -> TickingGridChunk:
+        """
+        :param ratios: ratio of each component of the popup, not all 0
+        :return: a grid chunk of these ratios, with the mass, temperature and carbon of the popup
+        """
+        ratios = [x / sum(ratios) for x in ratios]  # Normalize
+        components = []
+        for i, controller in enumerate(self.popup_controller.sub_controllers):
+            components.append(ChunkComponent(self.get_mass() * ratios[i], self.get_temperature(),
+                                             component_type=controller.type))
+        return TickingGridChunk(components, volume=self.get_volume_each(),
+                                carbon_ppm=self.popup_controller.view.carbon_widget.value())
 
     def get_ratios(self) -> list[float]:
         return [x.get_ratio() for x in self.popup_controller.sub_controllers]
@@ -0,0 +1,34 @@
+from typing import TYPE_CHECKING
+
+from views.widgets.earth_image_widget import EarthImageWidget
+
+if TYPE_CHECKING:
+    from controller.ToolbarArea.toolbar_area_controller import ToolbarController
+    from controller.main_controller import MainController
+
+
+class EarthImageController:
+    def __init__(self, parent_controller: "ToolbarController", main_controller: "MainController"):
+        self.parent_controller = parent_controller
+        self.main_controller = main_controller
+        self.view = EarthImageWidget(self)
+
+    def import_pressed(self):
+        path = self.view.ask_open_path()
+        if path:
+            self.main_controller.import_image(path)
+
+    def export_pressed(self):
+        path = self.view.ask_save_path()
+        if path:
+            self.main_controller.export_image(path)
+
+    def record_toggled(self, checked: bool):
+        if not checked:
+            self.main_controller.stop_recording()
+            return
+        directory = self.view.ask_directory()
+        if directory:
+            self.main_controller.start_recording(directory)
+        else:
+            self.view.record_button.setChecked(False)
@@ -0,0 +1,26 @@
+from typing import TYPE_CHECKING
+
+from constants import EARTH_SHAPES
+from views.widgets.resolution_widget import ResolutionWidget
+
+if TYPE_CHECKING:
+    from controller.ToolbarArea.toolbar_area_controller import ToolbarController
+    from controller.main_controller import MainController
+
+
+class ResolutionController:
+    def __init__(self, parent_controller: "ToolbarController", main_controller: "MainController"):
+        self.parent_controller = parent_controller
+        self.main_controller = main_controller
+        self.view = ResolutionWidget(self)
+
+    def get_shapes(self) -> list[tuple[int, int]]:
+        return EARTH_SHAPES
+
+    def get_shape(self) -> tuple[int, int]:
+        return self.main_controller.earth_shape
+
+    def shape_selected(self, index: int):
+        self.main_controller.set_earth_shape(EARTH_SHAPES[index])
+        # The resolution does not change while simulating
+        self.view.show_shape(self.main_controller.earth_shape)
@@ -0,0 +1,20 @@
+from typing import TYPE_CHECKING
+
+from views.widgets.undo_redo_widget import UndoRedoWidget
+
+if TYPE_CHECKING:
+    from controller.ToolbarArea.toolbar_area_controller import ToolbarController
+    from controller.main_controller import MainController
+
+
+class UndoRedoController:
+    def __init__(self, parent_controller: "ToolbarController", main_controller: "MainController"):
+        self.parent_controller = parent_controller
+        self.main_controller = main_controller
+        self.view = UndoRedoWidget(self)
+
+    def undo_pressed(self):
+        self.main_controller.undo_pressed()
+
+    def redo_pressed(self):
+        self.main_controller.redo_pressed()
@@ -3,7 +3,10 @@ from typing import TYPE_CHECKING
 from controller.PhysicalPropArea.physical_prop_area_controller import PhysicalPropAreaController
 from controller.ToolbarArea.subcontrollers.SelectComponent.controller import SelectComponentController
 from controller.ToolbarArea.subcontrollers.clear_canvas_controller import ClearCanvasController
+from controller.ToolbarArea.subcontrollers.earth_image_controller import EarthImageController
+from controller.ToolbarArea.subcontrollers.resolution_controller import ResolutionController
 from controller.ToolbarArea.subcontrollers.simulation_time_controller import SimulationTimeController
+from controller.ToolbarArea.subcontrollers.undo_redo_controller import UndoRedoController
 from controller.update_methods_controller import UpdateMethodsController
 from views.toolbar_area import ToolbarArea
 
@@ -15,6 +18,9 @@ class ToolbarController:
     def __init__(self, parent_controller: "MainController"):
         self.parent_controller = parent_controller
         self.clear_canvas_controller = ClearCanvasController(parent_controller=self, main_controller=parent_controller)
+        self.undo_redo_controller = UndoRedoController(parent_controller=self, main_controller=parent_controller)
+        self.resolution_controller = ResolutionController(parent_controller=self, main_controller=parent_controller)
+        self.earth_image_controller = EarthImageController(parent_controller=self, main_controller=parent_controller)
         self.select_component_controller = SelectComponentController(parent_controller=self,
                                                                      main_controller=parent_controller)
         self.simulation_time_controller = SimulationTimeController(parent_controller=self,
@@ -1,26 +1,44 @@
+import contextlib
 import threading
-from typing import Optional
+from typing import Any, Callable, Iterator, Optional, Union
 
-from constants import CANVAS_SIZE
+import numpy
+
+from constants import EARTH_SHAPE
 from controller.CanvasArea.canvas_area_controller import CanvasAreaController
 from controller.ToolbarArea.toolbar_area_controller import ToolbarController
 from controller.exception_controller import MessageController
-from messages import MessageToProcess
+from messages import CannotPaintNow, CannotReadImage, CannotWriteImage, Loading, MessageToProcess
+from models.array_class.earth_state import EarthState
+from models.array_class.palette import Palette
+from models.array_class.resampling import resample_nearest
+from models.array_class.simulation_process import SimulationProcess
+from models.physical_class.edit_history import AttributeEdit, CellsEdit, Edit, EditGroup, EditHistory
+from models.physical_class.snapshot import Snapshot, SnapshotBuffer
+from models.physical_class.summary import UniverseSummary
 from models.physical_class.universe import Universe
 from models.ticking_class.ticking_earth import TickingEarth
 from models.ticking_class.ticking_sun import TickingSun
+from other.animation import AnimationExporter
+from other.earth_image import load_earth_image, save_earth_image
 from views.main_view import MainView
 
 
 class MainController:
     model: Universe
     simulation_thread: Optional[threading.Thread] = None
+    earth_shape: tuple[int, int] = EARTH_SHAPE  # Resolution of the simulation, the canvas scales it [cells]
+    exporter: Optional[AnimationExporter] = None  # Writing the frames of the simulation, while recording
+    # Run the simulation in a child process instead of a thread, so that it does not share the interpreter with the GUI
+    SIMULATION_PROCESS: bool = False
+    simulation_process: Optional[SimulationProcess] = None
 
     def __init__(self):
         self.model = Universe()
-        self.model.earth = TickingEarth(shape=CANVAS_SIZE, parent=self.model)
+        self.model.earth = TickingEarth(shape=self.earth_shape, parent=self.model)
         self.model.sun = TickingSun()
         self.model.discover_everything()
+        self.edit_history = EditHistory()
         self.message_controller = MessageController(parent_controller=self)
         self.toolbar_controller = ToolbarController(parent_controller=self)
         self.canvas_controller = CanvasAreaController(parent_controller=self)
@@ -28,16 +46,93 @@ class MainController:
         self.canvas_controller.clear_canvas()
 
     def clear_pressed(self):
-        self.canvas_controller.clear_canvas()
+        self.__close_simulation_process()
         self.model = Universe()
-        self.model.earth = TickingEarth(shape=CANVAS_SIZE, parent=self.model)
+        self.model.earth = TickingEarth(shape=self.earth_shape, parent=self.model)
         self.model.sun = TickingSun()
+        if self.exporter is not None:
+            self.model.attach(self.exporter)  # The recording goes on with the new universe
+        self.edit_history.clear()
+        self.canvas_controller.clear_canvas()
+
+    def set_earth_shape(self, shape: tuple[int, int]):
+        """
+        Start again from an empty earth of another resolution
+        :param shape: (width, height) [cells]
+        :return:
+        """
+        if tuple(shape) == self.earth_shape:
+            return
+        if self.is_simulating():
+            self.process_message(CannotPaintNow())
+            return
+        self.earth_shape = tuple(shape)
+        self.clear_pressed()
+
+    def undo_pressed(self):
+        self.__restore(self.edit_history.undo)
+
+    def redo_pressed(self):
+        self.__restore(self.edit_history.redo)
+
+    def __restore(self, move: Callable[[], Optional[Edit]]):
+        """
+        :param move: undo or redo of the edit history
+        :return:
+        """
+        if self.is_simulating():
+            self.process_message(CannotPaintNow())
+            return
+        edit = move()
+        edits = edit.edits if isinstance(edit, EditGroup) else [edit]
+        if self.simulation_process is not None:
+            targets = {id(self.model): "universe", id(self.model.earth): "earth", id(self.model.sun): "sun"}
+            for attribute_edit in edits:
+                if isinstance(attribute_edit, AttributeEdit) and id(attribute_edit.target) in targets:
+                    self.simulation_process.set(targets[id(attribute_edit.target)], attribute_edit.name,
+                                                getattr(attribute_edit.target, attribute_edit.name))
+        indices = [edit.indices for edit in edits if isinstance(edit, CellsEdit)]
+        if indices:
+            self.canvas_controller.redraw_cells(numpy.concatenate(indices))
+
+    def is_simulating(self) -> bool:
+        if self.simulation_process is not None:
+            return self.simulation_process.running
+        return self.simulation_thread is not None and self.simulation_thread.is_alive()
+
+    @property
+    def snapshots(self) -> Union[SnapshotBuffer, SimulationProcess]:
+        """
+        :return: where the snapshots of the running simulation are published
+        """
+        if self.simulation_process is not None and self.simulation_process.running:
+            return self.simulation_process
+        return self.model.snapshots
+
+    @contextlib.contextmanager
+    def latest_snapshot(self, *, refresh: bool = True) -> Iterator[Optional[Snapshot]]:
+        """
+        The views read the universe through its snapshots only, since it may be updated by the simulation thread
+        :param refresh: when the simulation is not running, publish a snapshot of the universe as it is now first, unless
+            it did not change since the last one (see UniverseSummary.key_of)
+        :return: the last snapshot published, see SnapshotBuffer.latest
+        """
+        if refresh and not self.is_simulating():
+            with self.model.snapshots.latest() as snapshot:
+                published = None if snapshot is None else snapshot.summary.key
+            if published != UniverseSummary.key_of(self.model):
+                self.model.snapshots.publish(self.model)
+        with self.snapshots.latest() as snapshot:
+            yield snapshot
 
     def start_pressed(self):
         self.canvas_controller.set_canvas_enabled(False)
         self.__start_simulation()
 
     def update_pressed(self):
+        if self.simulation_process is not None:
+            self.simulation_process.step()
+            return
         self.simulation_thread = threading.Thread(target=self.model.update_all, args=())
         self.simulation_thread.start()
 
@@ -54,20 +149,61 @@ class MainController:
         self.__stop_simulation()
 
     def __start_simulation(self):
+        if self.SIMULATION_PROCESS:
+            self.__close_simulation_process()
+            self.simulation_process = SimulationProcess(self.model)
+            self.simulation_process.resume()
+            return
         self.simulation_thread = threading.Thread(target=self.model.start_simulation, args=())
         self.simulation_thread.start()
 
     def __pause_simulation(self):
+        if self.simulation_process is not None:
+            self.simulation_process.pause()  # The state of the child is written in the model, to be painted on
+            return
         self.model.pause_updating()
 
     def __resume_simulation(self):
+        if self.simulation_process is not None:
+            self.simulation_process.resume()
+            return
         self.simulation_thread = threading.Thread(target=self.model.resume_updating, args=())
         self.simulation_thread.start()
 
     def __stop_simulation(self):
+        if self.simulation_process is not None:
+            if self.simulation_process.running:
+                self.simulation_process.pause()
+            self.__close_simulation_process()
+            return
         self.model.stop_updating()
         self.simulation_thread = None
 
+    def closed(self):
+        """
+        The window was closed, the simulation process and its shared memory are released
+        :return:
+        """
+        self.__close_simulation_process()
+        self.stop_recording()
+
+    def __close_simulation_process(self):
+        if self.simulation_process is not None:
+            self.simulation_process.close()
+            self.simulation_process = None
+
+    def __set(self, target: str, name: str, value: Any):
+        """
+        Set a parameter of the model, and of the simulation process if there is one
+        :param target: "universe", "earth" or "sun"
+        :param name:
+        :param value:
+        :return:
+        """
+        self.edit_history.set(self.model if target == "universe" else getattr(self.model, target), name, value)
+        if self.simulation_process is not None:
+            self.simulation_process.set(target, name, value)
+
     def get_brush_width(self):
         return self.toolbar_controller.get_brush_width()
 
@@ -80,13 +216,81 @@ class MainController:
     def is_message_processing(self, exception: type[MessageToProcess]):
         return any(isinstance(e, exception) for e in self.message_controller.message_stack)
 
-    def components_painted(self, *positions: tuple[int, int]):
-        for x, y in set(positions):
-            chunk = self.toolbar_controller.select_component_controller.get_grid_chunk().deep_copy()
-            chunk.index = x + y * self.model.earth.shape[1]
-            chunk.earth = self.model.earth
-            chunk.neighbours = chunk.earth.neighbours(chunk.index)
-            self.model.earth.set_component_at(chunk, x, y)
+    def components_painted(self, stroke: numpy.ndarray):
+        """
+        :param stroke: (height, width) True on the cells painted with the selected grid chunk
+        :return:
+        """
+        self.edit_history.paint(self.model.earth, stroke,
+                                self.toolbar_controller.select_component_controller.get_grid_chunk())
+
+    def export_image(self, path: str):
+        """
+        Save the composition of the earth as an image of one pixel per cell
+        :param path: a PNG file
+        :return:
+        """
+        if self.is_simulating():
+            self.process_message(CannotPaintNow())
+            return
+        palette, codes = Palette.from_state(self.model.earth.fields)
+        if not save_earth_image(path, palette, codes):
+            self.process_message(CannotWriteImage())
+
+    def import_image(self, path: str):
+        """
+        Replace the composition of the earth by the one of an image, scaled to the resolution of the earth. The grid
+        chunks take the mass, temperature and carbon of the component brush, one chunk is built for each composition
+        :param path: an image, see load_earth_image
+        :return:
+        """
+        if self.is_simulating():
+            self.process_message(CannotPaintNow())
+            return
+        loaded = load_earth_image(path)
+        if loaded is None:
+            self.process_message(CannotReadImage())
+            return
+        palette, codes = loaded
+        self.process_message(Loading())
+        earth = self.model.earth
+        codes = resample_nearest(codes, tuple(reversed(earth.shape)))
+        select_component_controller = self.toolbar_controller.select_component_controller
+        active = earth.fields.active  # Read once, it is gathered from the grid chunks with the object engine
+        with self.edit_history.group():
+            for code in numpy.unique(codes).tolist():
+                mask = codes == code
+                if code < 0:
+                    mask &= active  # Only the cells with a grid chunk are emptied
+                    if mask.any():
+                        self.edit_history.paint(earth, mask, None)
+                    continue
+                ratios = [palette.ratios[code][EarthState.COMPONENTS.index(controller.type)]
+                          for controller in select_component_controller.popup_controller.sub_controllers]
+                self.edit_history.paint(earth, mask, select_component_controller.build_grid_chunk(ratios))
+        self.canvas_controller.draw_pixels(palette.pixels(codes))
+        self.finish_process_message(Loading)
+
+    def start_recording(self, directory: str):
+        """
+        Write a heatmap of the temperature of the earth every SNAPSHOT_INTERVAL ticks of the simulation, as PNG frames
+        :param directory:
+        :return:
+        """
+        self.stop_recording()
+        self.exporter = AnimationExporter(directory, interval=self.model.SNAPSHOT_INTERVAL)
+        self.model.attach(self.exporter)
+
+    def stop_recording(self):
+        """
+        Detach the exporter, the frames already recorded are still written
+        :return:
+        """
+        if self.exporter is None:
+            return
+        self.model.detach(self.exporter)
+        self.exporter.close()
+        self.exporter = None
 
     def get_ratios(self):
         return self.toolbar_controller.select_component_controller.get_ratios()
@@ -95,16 +299,18 @@ class MainController:
         return self.toolbar_controller.select_component_controller.get_grid_chunk()
 
     def set_sun_energy_per_second(self, energy_per_second: float):
-        self.model.sun.energy_radiated_per_second = energy_per_second
+        self.__set("sun", "energy_radiated_per_second", energy_per_second)
 
     def set_earth_radiation_ratio(self, earth_radiation_ratio: float):
         self.model.sun.earth_radiation_ratio = earth_radiation_ratio
+        if self.simulation_process is not None:
+            self.simulation_process.set("sun", "earth_radiation_ratio", earth_radiation_ratio)
 
     def get_energy_per_second(self):
         return self.model.sun.energy_radiated_per_second
 
     def set_time_delta(self, time_delta):
-        self.model.TIME_DELTA = time_delta
+        self.__set("universe", "TIME_DELTA", time_delta)
 
     def get_time_delta(self):
         return self.model.TIME_DELTA
@@ -113,16 +319,16 @@ class MainController:
         return self.model.earth.radius
 
     def set_earth_radius(self, radius: float):
-        self.model.earth.radius = radius
+        self.__set("earth", "radius", radius)
 
     def get_earth_albedo(self):
         return self.model.earth.albedo
 
     def set_earth_albedo(self, albedo: float):
-        self.model.earth.albedo = albedo
+        self.__set("earth", "albedo", albedo)
 
     def get_sun_radius(self):
         return self.model.sun.radius
 
     def set_sun_radius(self, radius: float):
-        self.model.sun.radius = radius
+        self.__set("sun", "radius", radius)
@@ -24,3 +24,11 @@ class CannotPaintNow(ErrorMessageToProcess):
 
 class Loading(MessageToProcess):
     pass
+
+
+class CannotReadImage(ErrorMessageToProcess):
+    text = "The image could not be read"
+
+
+class CannotWriteImage(ErrorMessageToProcess):
+    text = "The image could not be written"
@@ -1,3 +1,4 @@
+from collections.abc import Collection
 from typing import final, Callable, Any
 
 
@@ -11,10 +12,12 @@ def on_tick_builder(cls: type["TickingModel"]):
     :return: the decorator
     """
 
-    def decorator_factory(enabled: bool = True):
+    def decorator_factory(enabled: bool = True, compiled: bool = False):
         """
         Allows for the decorator to take parameters
         :param enabled: if the on_tick method should be used on update
+        :param compiled: for the per cell rules of the grid chunks, if the method can be translated into a loop over
+        the arrays of the earth state (compiled with numba when installed) instead of being called chunk by chunk
         :return:
         """
 
@@ -25,6 +28,7 @@ def on_tick_builder(cls: type["TickingModel"]):
             :return: the callable given in parameter so the function can be properly called
             """
             func.enabled = enabled
+            func.compiled = compiled
             cls.on_tick_methods.append(func)
             return func
 
@@ -69,14 +73,15 @@ class TickingModel(metaclass=TickableModelMeta):
         self._t = 0
         self.__running = False
 
-    def update(self):
+    def update(self, *, exclude: Collection[Callable] = ()):
         """
         The update function that is called when the model wants to move forward in time
         Else, it will only tick the on_tick method of the model updating
+        :param exclude: on_tick methods that must not be called, because they were already applied by another mean
         :return:
         """
         for method in self.on_tick_methods:
-            if method.enabled and method.__module__ == self.__module__:
+            if method.enabled and method.__module__ == self.__module__ and method not in exclude:
                 method(self)
         self._t += 1
 
@@ -0,0 +1,72 @@
+import itertools
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+
+
+def departure_points(velocity: numpy.ndarray, time_delta: float) -> numpy.ndarray:
+    """
+    Trace back in time the trajectory of the air arriving at the center of every cell
+    :param velocity: velocity in grid cells per second, shape (axis, *grid_shape) with the axis in grid_shape order
+    :param time_delta:
+    :return: fractional grid coordinates of the departure points, same shape as velocity
+    """
+    grid_shape = velocity.shape[1:]
+    return numpy.indices(grid_shape, dtype=float) - velocity * time_delta
+
+
+def interpolate(field: numpy.ndarray, coordinates: numpy.ndarray, *, periodic: bool) -> numpy.ndarray:
+    """
+    Multilinear interpolation of the field at the given fractional grid coordinates
+    :param field:
+    :param coordinates: shape (axis, *grid_shape)
+    :param periodic: wraps around the borders if True, else the value at the border is used outside the grid
+    :return:
+    """
+    floor = numpy.floor(coordinates).astype(int)
+    fraction = coordinates - floor
+    result = numpy.zeros(coordinates.shape[1:], dtype=field.dtype)
+    for corner in itertools.product((0, 1), repeat=field.ndim):
+        weight = numpy.ones(coordinates.shape[1:], dtype=field.dtype)
+        index = []
+        for axis, offset in enumerate(corner):
+            position = floor[axis] + offset
+            index.append(position % field.shape[axis] if periodic else numpy.clip(position, 0, field.shape[axis] - 1))
+            weight *= fraction[axis] if offset else 1 - fraction[axis]
+        result += weight * field[tuple(index)]
+    return result
+
+
+def semi_lagrangian_advection(state: EarthState, wind: numpy.ndarray, time_delta: float, *, periodic: bool = False):
+    """
+    Moves the air mass, the energy of the air and the carbon along the wind.
+    Each cell takes the value found at the departure point of its back-trajectory, which is stable whatever the
+    Courant number. Empty cells neither give nor receive anything, and the totals are rescaled afterwards so that
+    nothing is created or lost by the interpolation.
+    :param state:
+    :param wind: velocity in grid cells per second, shape (axis, *grid_shape) with the axis in the Earth shape order
+    (x first), or anything that broadcasts to it
+    :param time_delta:
+    :param periodic:
+    :return:
+    """
+    grid_shape = state.grid_shape
+    # The Earth shape is (x, y, ...) while the arrays are indexed (..., y, x)
+    velocity = numpy.broadcast_to(numpy.asarray(wind, dtype=float), (len(grid_shape),) + grid_shape)[::-1]
+    coordinates = departure_points(velocity, time_delta)
+    active = state.active.astype(state.dtype)
+    # Fraction of the departure neighbourhood that actually holds a chunk, used to renormalize the interpolation
+    coverage = interpolate(active, coordinates, periodic=periodic)
+
+    air = state.component_index("AIR")
+    for field in (state.mass[air], state.energy[air], state.carbon_ppm):
+        total = state.total(field[state.active])
+        moved = numpy.divide(interpolate(field * active, coordinates, periodic=periodic), coverage,
+                             out=numpy.zeros(grid_shape, dtype=state.dtype), where=coverage > 0)
+        moved[~state.active] = 0
+        moved_total = state.total(moved)
+        if moved_total > 0:
+            moved *= total / moved_total
+        field[...] = moved
+    state.modified()
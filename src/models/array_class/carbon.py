@@ -0,0 +1,89 @@
+from dataclasses import dataclass
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+
+
+@dataclass
+class CarbonBudget:
+    """
+    Carbon exchanged during one tick, summed over the whole earth [ppm]
+    """
+    emissions: float
+    ocean_uptake: float
+    land_decay: float
+    biosphere_absorption: float
+    total: float  # Carbon contained in the earth after the tick
+
+    @property
+    def net(self) -> float:
+        return self.emissions - self.ocean_uptake + self.land_decay - self.biosphere_absorption
+
+
+FLOWS = ("emissions", "ocean_uptake", "land_decay", "biosphere_absorption")
+
+
+def distribute(amount: float, weights: numpy.ndarray, total_weight: float) -> numpy.ndarray:
+    """
+    Split amount between the cells proportionally to the weights
+    :param amount:
+    :param weights:
+    :param total_weight: sum of the weights over the whole earth
+    :return: the share of each cell, all zeros if no cell has weight
+    """
+    if total_weight <= 0:
+        return numpy.zeros_like(weights)
+    return amount * weights / total_weight
+
+
+def carbon_weights(state: EarthState) -> dict[str, numpy.ndarray]:
+    """
+    The emissions are spread evenly on the earth, the ocean absorbs carbon with respect to the water fraction of each
+    cell and the biomass decays and grows with respect to the land fraction of each cell.
+    :param state:
+    :return: the weight of each cell in each of the carbon flows
+    """
+    total_mass = state.total_mass
+    has_mass = state.active & (total_mass > 0)
+    water_fraction = numpy.divide(state.mass[state.component_index("WATER")], total_mass,
+                                  out=numpy.zeros(state.grid_shape, dtype=state.dtype), where=has_mass)
+    land_fraction = numpy.divide(state.mass[state.component_index("LAND")], total_mass,
+                                 out=numpy.zeros(state.grid_shape, dtype=state.dtype), where=has_mass)
+    return {"emissions": state.active.astype(state.dtype), "ocean_uptake": water_fraction, "land_decay": land_fraction,
+            "biosphere_absorption": land_fraction}
+
+
+def apply_carbon_flows(state: EarthState, flows: dict[str, float],
+                       total_weights: dict[str, float]) -> dict[str, numpy.ndarray]:
+    """
+    :param state:
+    :param flows: global flows per tick [ppm], for each name of FLOWS
+    :param total_weights: sums over the whole earth of the carbon_weights
+    :return: the flows applied to each cell
+    """
+    weights = carbon_weights(state)
+    cell_flows = {name: distribute(flows[name], weights[name], total_weights[name]) for name in FLOWS}
+    state.carbon_ppm += cell_flows["emissions"] - cell_flows["ocean_uptake"] + cell_flows["land_decay"] - \
+        cell_flows["biosphere_absorption"]
+    state.modified()
+    return cell_flows
+
+
+def carbon_cycle(state: EarthState, *, emissions: float, ocean_uptake: float, land_decay: float,
+                 biosphere_absorption: float) -> CarbonBudget:
+    """
+    Spatially resolved carbon cycle, see carbon_weights.
+    The budget returned is the sum of what was actually applied to the cells.
+    :param state:
+    :param emissions: global flows per tick [ppm]
+    :param ocean_uptake:
+    :param land_decay:
+    :param biosphere_absorption:
+    :return:
+    """
+    total_weights = {name: state.total(weights) for name, weights in carbon_weights(state).items()}
+    cell_flows = apply_carbon_flows(state, dict(emissions=emissions, ocean_uptake=ocean_uptake, land_decay=land_decay,
+                                                biosphere_absorption=biosphere_absorption), total_weights)
+    return CarbonBudget(**{name: state.total(cell_flows[name]) for name in FLOWS},
+                        total=state.total(state.carbon_ppm[state.active]))
@@ -0,0 +1,315 @@
+import ast
+import inspect
+import itertools
+import textwrap
+import warnings
+from typing import Callable, Iterable, Optional
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.physical_class.chunk_component import ChunkComponent
+
+try:
+    import numba
+except ImportError:  # The rules are then run as a plain Python loop over the arrays
+    numba = None
+JIT_AVAILABLE = numba is not None
+
+
+class UnsupportedCellRule(Exception):
+    """
+    The per cell rule uses something that has no equivalent on the arrays of an EarthState
+    """
+
+
+HELPERS = '''
+def _temperature(mass, energy, heat, i):
+    total = 0.0
+    count = 0
+    for k in range(mass.shape[0]):
+        if mass[k, i] > 0:
+            total += energy[k, i] / (heat[k] * mass[k, i])
+            count += 1
+    return total / max(1, count)
+
+
+def _total_mass(mass, i):
+    total = 0.0
+    for k in range(mass.shape[0]):
+        total += mass[k, i]
+    return total
+
+
+def _energy(energy, i):
+    total = 0.0
+    for k in range(energy.shape[0]):
+        total += energy[k, i]
+    return total
+'''
+ARGUMENTS = ("mass", "energy", "carbon_ppm", "volume", "active", "heat")
+BUILTINS = {"abs", "min", "max", "float", "int", "range", "round"}
+
+
+class CellRuleTranslator(ast.NodeTransformer):
+    """
+    Rewrites the body of a per cell rule written on a GridChunk (self.water_component.mass, self.temperature, ...) into
+    the body of a loop over the cells of an EarthState, the cell being `i`
+    """
+    CHUNK_FIELDS = {"carbon_ppm": "carbon_ppm", "volume": "volume"}
+    CHUNK_PROPERTIES = {"temperature": "_temperature(mass, energy, heat, i)", "total_mass": "_total_mass(mass, i)",
+                        "energy": "_energy(energy, i)"}
+    PROPERTY_FIELDS = {"temperature": ("mass", "energy"), "total_mass": ("mass",), "energy": ("energy",)}
+
+    def __init__(self, function: Callable, self_name: str, local_names: set[str]):
+        self.function = function
+        self.self_name = self_name
+        self.local_names = local_names
+        self.externals: list[str] = []  # Expressions evaluated outside the kernel and given as arguments
+        self.modules: dict[str, object] = {}  # Modules whose functions are called by the kernel
+        self.fields: set[str] = set()  # Fields of the state read or written by the kernel
+        self.written: set[str] = set()  # Fields of the state written by the kernel
+        self.loop_depth = 0
+
+    def __chain(self, node: ast.expr) -> Optional[list[str]]:
+        """
+        :param node:
+        :return: the names of a chain of attributes (a.b.c -> [a, b, c]), None if it is not such a chain
+        """
+        names = []
+        while isinstance(node, ast.Attribute):
+            names.insert(0, node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return None
+        return [node.id] + names
+
+    def __component_index(self, attribute: str) -> int:
+        if not attribute.endswith("_component") or \
+                attribute[:-len("_component")].upper() not in EarthState.COMPONENTS:
+            raise UnsupportedCellRule(f"Unknown component {attribute}")
+        return EarthState.component_index(attribute[:-len("_component")])
+
+    def __use(self, ctx: Optional[ast.expr_context], *fields: str):
+        self.fields.update(fields)
+        if ctx is not None and not isinstance(ctx, ast.Load):
+            self.written.update(fields)
+
+    def __expression(self, source: str, ctx: ast.expr_context = None) -> ast.expr:
+        expression = ast.parse(source, mode="eval").body
+        if ctx is not None:
+            expression.ctx = ctx
+        return expression
+
+    def __external(self, node: ast.expr) -> ast.expr:
+        """
+        Replace a value from outside the rule (a constant of the Universe...) by an argument of the kernel, or keep the
+        call to a function of a module the kernel can use (math)
+        """
+        if not isinstance(node.ctx, ast.Load):
+            raise UnsupportedCellRule(f"The rule cannot modify {ast.unparse(node)}")
+        source = ast.unparse(node)
+        value = eval(source, self.function.__globals__)
+        if callable(value):
+            root = self.__chain(node)[0]
+            if getattr(value, "__module__", None) != "math" or isinstance(node, ast.Name):
+                raise UnsupportedCellRule(f"Cannot call {source} in a compiled rule")
+            self.modules[root] = self.function.__globals__[root]
+            return node
+        if source not in self.externals:
+            self.externals.append(source)
+        return ast.Name(id=f"_external_{self.externals.index(source)}", ctx=ast.Load())
+
+    def visit_Name(self, node: ast.Name):
+        if node.id == self.self_name:
+            raise UnsupportedCellRule("The chunk itself cannot be used in a compiled rule")
+        if node.id in self.local_names or node.id in BUILTINS:
+            return node
+        return self.__external(node)
+
+    def visit_Attribute(self, node: ast.Attribute):
+        chain = self.__chain(node)
+        if chain is None:
+            return self.generic_visit(node)
+        if chain[0] == self.self_name:
+            if len(chain) == 2 and chain[1] in self.CHUNK_FIELDS:
+                self.__use(node.ctx, self.CHUNK_FIELDS[chain[1]])
+                return self.__expression(f"{self.CHUNK_FIELDS[chain[1]]}[i]", node.ctx)
+            if len(chain) == 2 and chain[1] in self.CHUNK_PROPERTIES and isinstance(node.ctx, ast.Load):
+                self.__use(None, *self.PROPERTY_FIELDS[chain[1]])
+                return self.__expression(self.CHUNK_PROPERTIES[chain[1]])
+            if len(chain) == 3 and chain[2] in ("mass", "energy"):
+                self.__use(node.ctx, chain[2])
+                return self.__expression(f"{chain[2]}[{self.__component_index(chain[1])}, i]", node.ctx)
+            raise UnsupportedCellRule(f"{ast.unparse(node)} has no equivalent on the arrays")
+        if chain[0] in self.local_names:
+            return self.generic_visit(node)
+        return self.__external(node)
+
+    def visit_Compare(self, node: ast.Compare):
+        chain = self.__chain(node.left)
+        # self.water_component is None -> there is no water in the cell
+        if chain is not None and chain[0] == self.self_name and len(chain) == 2 and len(node.ops) == 1 and \
+                isinstance(node.ops[0], (ast.Is, ast.IsNot)) and isinstance(node.comparators[0], ast.Constant) and \
+                node.comparators[0].value is None:
+            operator = "<=" if isinstance(node.ops[0], ast.Is) else ">"
+            self.__use(None, "mass")
+            return self.__expression(f"mass[{self.__component_index(chain[1])}, i] {operator} 0")
+        return self.generic_visit(node)
+
+    def visit_Assign(self, node: ast.Assign):
+        chain = self.__chain(node.targets[0]) if len(node.targets) == 1 else None
+        if chain is None or chain[0] != self.self_name or len(chain) != 2 or not chain[1].endswith("_component"):
+            return self.generic_visit(node)
+        # self.air_component = ChunkComponent(mass, temperature, "AIR")
+        k = self.__component_index(chain[1])
+        self.__use(ast.Store(), "mass", "energy")
+        if isinstance(node.value, ast.Constant) and node.value.value is None:
+            return ast.parse(f"mass[{k}, i] = 0.0\nenergy[{k}, i] = 0.0").body
+        call = node.value
+        if not isinstance(call, ast.Call) or \
+                eval(ast.unparse(call.func), self.function.__globals__) is not ChunkComponent:
+            raise UnsupportedCellRule(f"Cannot assign {ast.unparse(call)} to a component")
+        arguments = dict(zip(("mass", "temperature", "component_type"), call.args))
+        arguments.update({keyword.arg: keyword.value for keyword in call.keywords})
+        component_type = arguments["component_type"]
+        if not isinstance(component_type, ast.Constant) or \
+                EarthState.component_index(component_type.value) != k:
+            raise UnsupportedCellRule(f"The component assigned to {chain[1]} must be of the same type")
+        statements = [ast.Assign(targets=[ast.Name(id="_new_mass", ctx=ast.Store())],
+                                 value=self.visit(arguments["mass"])),
+                      ast.Assign(targets=[ast.Name(id="_new_temperature", ctx=ast.Store())],
+                                 value=self.visit(arguments["temperature"]))]
+        return statements + ast.parse(f"energy[{k}, i] = heat[{k}] * _new_mass * _new_temperature\n"
+                                      f"mass[{k}, i] = _new_mass").body
+
+    def visit_Return(self, node: ast.Return):
+        if node.value is not None or self.loop_depth:
+            raise UnsupportedCellRule("A compiled rule can only return early with a bare return outside of loops")
+        return ast.Continue()
+
+    def visit_For(self, node: ast.For):
+        self.loop_depth += 1
+        node = self.generic_visit(node)
+        self.loop_depth -= 1
+        return node
+
+    visit_While = visit_For
+
+
+def translate(function: Callable) -> tuple[Callable, list[str], frozenset[str], frozenset[str]]:
+    """
+    :param function: a per cell rule, taking the GridChunk as only parameter
+    :return: a kernel applying the rule to every active cell of the arrays, the expressions to evaluate to get the
+    values of its external arguments, the fields of the state it uses and the ones it writes
+    """
+    try:
+        source = textwrap.dedent(inspect.getsource(function))
+    except (OSError, TypeError) as e:
+        raise UnsupportedCellRule("The source of the rule is not available") from e
+    definition = ast.parse(source).body[0]
+    if not isinstance(definition, ast.FunctionDef) or len(definition.args.args) != 1:
+        raise UnsupportedCellRule("A compiled rule must be a method without parameters")
+    body = definition.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+        body = body[1:]  # Docstring
+    local_names = {node.id for node in ast.walk(definition) if isinstance(node, ast.Name)
+                   and isinstance(node.ctx, ast.Store)}
+    translator = CellRuleTranslator(function, definition.args.args[0].arg, local_names)
+    body = [translator.visit(statement) for statement in body]
+    body = list(itertools.chain.from_iterable(x if isinstance(x, list) else [x] for x in body))
+
+    arguments = ARGUMENTS + tuple(f"_external_{j}" for j in range(len(translator.externals)))
+    kernel = ast.parse(f"def kernel({', '.join(arguments)}):\n"
+                       f"    for i in range(active.shape[0]):\n"
+                       f"        if not active[i]:\n"
+                       f"            continue\n")
+    kernel.body[0].body[0].body.extend(body or [ast.Pass()])
+    module = ast.fix_missing_locations(ast.Module(body=ast.parse(HELPERS).body + kernel.body, type_ignores=[]))
+    namespace = dict(translator.modules)
+    exec(compile(module, f"<compiled rule {function.__qualname__}>", "exec"), namespace)
+    if numba is not None:
+        for name in ("_temperature", "_total_mass", "_energy", "kernel"):
+            namespace[name] = numba.njit(namespace[name])
+    return namespace["kernel"], translator.externals, frozenset(translator.fields), frozenset(translator.written)
+
+
+class CompiledCellRule:
+    """
+    A per cell rule of a TickingGridChunk translated into a loop over the arrays of an EarthState, compiled with numba
+    when it is installed.
+    """
+    SAMPLE_SIZE: int = 16  # Number of chunks used to check the translation on first use, spread over the earth
+
+    def __init__(self, function: Callable):
+        self.function = function
+        self.kernel, self.externals, self.fields, self.writes = translate(function)
+        self.verified: Optional[bool] = None  # None until checked against the per cell rule
+
+    def __call__(self, state: EarthState, *, where: numpy.ndarray = None):
+        """
+        Apply the rule on every active cell of the state
+        :param state: a state whose fields used by the rule (see `fields`) are contiguous
+        :param where: cells on which the rule applies, all the active ones if None
+        :return:
+        """
+        active = state.active if where is None else state.active & where
+
+        def argument(name: str) -> numpy.ndarray:
+            if name not in self.fields:
+                # Not flattened, which would copy a field that is not contiguous for nothing
+                return numpy.empty((0,) * (2 if name in EarthState.COMPONENT_FIELDS else 1), dtype=state.dtype)
+            value = getattr(state, name)
+            return state.flat(value) if name in EarthState.COMPONENT_FIELDS else value.reshape(-1)
+
+        self.kernel(argument("mass"), argument("energy"), argument("carbon_ppm"), argument("volume"),
+                    numpy.ascontiguousarray(active).reshape(-1), state.SPECIFIC_HEAT_CAPACITY, *self.external_values())
+        state.modified()
+
+    def external_values(self) -> list:
+        """
+        :return: current value of the names read by the rule outside of the chunk (Universe.EVAPORATION_RATE, ...)
+        """
+        return [eval(source, self.function.__globals__) for source in self.externals]
+
+    def verify(self, chunks: Iterable) -> bool:
+        """
+        On first use, apply both the compiled rule and the per cell rule on copies of a few chunks evenly spread over the
+        ones given, and check they agree
+        :param chunks:
+        :return: if the compiled rule can be used
+        """
+        if self.verified is None:
+            chunks = list(chunks)
+            positions = numpy.unique(numpy.linspace(0, len(chunks) - 1, self.SAMPLE_SIZE).round().astype(int)) \
+                if chunks else []
+            sample = [chunks[position].deep_copy() for position in positions]
+            if not sample:
+                return True  # Nothing to check yet
+            state = EarthState.from_chunks(sample, (len(sample),))
+            self(state)
+            for chunk in sample:
+                self.function(chunk)
+            expected = EarthState.from_chunks(sample, (len(sample),))
+            self.verified = all(numpy.allclose(getattr(state, name), getattr(expected, name), rtol=1e-9, atol=1e-12)
+                                for name in ("mass", "energy", "carbon_ppm"))
+            if not self.verified:
+                warnings.warn(f"The compiled version of {self.function.__qualname__} does not match the per cell "
+                              f"rule, the rule will be applied chunk by chunk")
+        return self.verified
+
+
+def compiled_rule(function: Callable) -> Optional[CompiledCellRule]:
+    """
+    :param function: an on_tick method marked as compiled
+    :return: its compiled version, built on first call. None if it cannot be translated
+    """
+    if not getattr(function, "compiled", False):
+        return None
+    if not hasattr(function, "compiled_rule"):
+        try:
+            function.compiled_rule = CompiledCellRule(function)
+        except UnsupportedCellRule as e:
+            warnings.warn(f"{function.__qualname__} cannot be compiled ({e}), it will be applied chunk by chunk")
+            function.compiled_rule = None
+    return function.compiled_rule
@@ -0,0 +1,276 @@
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.physical_class.component_registry import COMPONENT_REGISTRY
+
+
+def is_uniform(state: EarthState) -> bool:
+    """
+    Check if every cell of the grid exists and is made of exactly the same material, in which case the heat
+    diffusion coefficient is the same everywhere
+    :param state:
+    :return:
+    """
+    if not state.active.all():
+        return False
+    fields = (*state.mass, state.volume, state.specific_heat_capacity, state.heat_transfer_coefficient)
+    return all(numpy.allclose(field, field.flat[0], rtol=1e-9, atol=0) for field in fields)
+
+
+def periodic_laplacian_eigenvalues(grid_shape: tuple) -> numpy.ndarray:
+    """
+    Eigenvalues of the graph Laplacian of a periodic grid (each cell linked to its 2 neighbours on every axis), in
+    the layout returned by numpy.fft.rfftn
+    :param grid_shape:
+    :return:
+    """
+    eigenvalues = numpy.zeros(grid_shape[:-1] + (grid_shape[-1] // 2 + 1,))
+    for axis, size in enumerate(grid_shape):
+        frequencies = numpy.fft.rfftfreq(size) if axis == len(grid_shape) - 1 else numpy.fft.fftfreq(size)
+        broadcast_shape = [1] * len(grid_shape)
+        broadcast_shape[axis] = len(frequencies)
+        eigenvalues = eigenvalues + (2 - 2 * numpy.cos(2 * numpy.pi * frequencies)).reshape(broadcast_shape)
+    return eigenvalues
+
+
+def spectral_diffusion(state: EarthState, time_delta: float):
+    """
+    Advance the heat equation of a uniform periodic grid by time_delta. Each Fourier mode of the temperature decays
+    exponentially, which is the exact solution of the exchange between neighbours done by the stencil, for any
+    time_delta and in O(N log N).
+    :param state: a uniform state, see is_uniform
+    :param time_delta:
+    :return:
+    """
+    first = (0,) * len(state.grid_shape)
+    total_mass = state.total_mass[first]
+    inverse_heat_capacity = state.inverse_heat_capacity[first]
+    surface = state.volume[first] ** (2 / 3)
+    # Rate at which the temperature of a cell follows the temperature difference with one of its neighbours
+    diffusivity = state.heat_transfer_coefficient[first] * state.specific_heat_capacity[first] * \
+        inverse_heat_capacity / (surface * total_mass)
+
+    temperature = state.temperature
+    decay = numpy.exp(-diffusivity * time_delta * periodic_laplacian_eigenvalues(state.grid_shape))
+    new_temperature = numpy.fft.irfftn(numpy.fft.rfftn(temperature) * decay, s=state.grid_shape)
+    state.add_energy((new_temperature - temperature) * total_mass / inverse_heat_capacity)
+
+
+def edge_pairs(field: numpy.ndarray, axis: int, periodic: bool) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    :param field:
+    :param axis:
+    :param periodic:
+    :return: the values of the field on the lower and on the upper side of every edge along the axis
+    """
+    if periodic:
+        return field, numpy.roll(field, -1, axis=axis)
+    before = (slice(None),) * axis
+    return field[before + (slice(None, -1),)], field[before + (slice(1, None),)]
+
+
+def refresh_mixture(state: EarthState, threshold: float) -> numpy.ndarray:
+    """
+    Array version of GridChunk.update_mixture_properties: the specific heat capacity and heat transfer coefficient of
+    the cells whose mass ratios changed by more than the threshold are computed again
+    :param state:
+    :param threshold:
+    :return: mask of the cells that were updated
+    """
+    ratio = state.mass_ratio
+    drift = numpy.abs(ratio - state.mixture_ratio).max(axis=0)
+    changed = state.active & state.present.any(axis=0) & (drift > threshold)
+    if not changed.any():
+        return changed
+    count = numpy.maximum(1, state.present.sum(axis=0))
+    specific_heat_capacity, heat_transfer_coefficient = COMPONENT_REGISTRY.mixture(ratio)
+    state.specific_heat_capacity[changed] = (specific_heat_capacity / count)[changed]
+    state.heat_transfer_coefficient[changed] = (heat_transfer_coefficient / count)[changed]
+    state.mixture_ratio[:, changed] = ratio[:, changed]
+    state.modified()
+    return changed
+
+
+class ConductanceCache:
+    """
+    Energy exchanged through each edge of the grid per degree of difference and per second, as computed by the chunk
+    with the lowest index of the edge (GridChunk.conductance). It is kept between the ticks and only computed again for
+    the cells whose volume or mixture properties changed.
+    """
+    def __init__(self):
+        self.cell: numpy.ndarray = None  # Conductance of each cell
+        self.__inputs: tuple[numpy.ndarray, ...] = ()  # Values from which cell was computed
+        self.__edges: dict[tuple[int, bool], numpy.ndarray] = {}  # (axis, periodic) -> conductance of the edges
+
+    def update(self, state: EarthState) -> numpy.ndarray:
+        """
+        :param state: the whole earth
+        :return: mask of the cells whose conductance changed
+        """
+        inputs = (state.active, state.volume, state.specific_heat_capacity, state.heat_transfer_coefficient)
+        if self.cell is None or self.cell.shape != state.grid_shape or self.cell.dtype != state.dtype:
+            changed = numpy.ones(state.grid_shape, dtype=bool)
+            self.cell, self.__edges = numpy.zeros(state.grid_shape, dtype=state.dtype), {}
+        else:
+            changed = numpy.zeros(state.grid_shape, dtype=bool)
+            for new, old in zip(inputs, self.__inputs):
+                changed |= new != old
+            if not changed.any():
+                return changed
+        self.cell[changed] = cell_conductance(state)[changed]
+        self.__inputs = tuple(field.copy() for field in inputs)
+        for (axis, periodic), edges in self.__edges.items():
+            lower, upper = edge_pairs(changed, axis, periodic)
+            update = lower | upper
+            edges[update] = self.__edge_conductance(axis, periodic)[update]
+        return changed
+
+    def __edge_conductance(self, axis: int, periodic: bool) -> numpy.ndarray:
+        index = numpy.arange(self.cell.size).reshape(self.cell.shape)
+        return edge_conductance(self.cell, index, axis, periodic)
+
+    def edges(self, axis: int, periodic: bool) -> numpy.ndarray:
+        """
+        :param axis:
+        :param periodic:
+        :return: the conductance of the edges along the axis, in the layout of edge_pairs
+        """
+        if (axis, periodic) not in self.__edges:
+            self.__edges[(axis, periodic)] = self.__edge_conductance(axis, periodic)
+        return self.__edges[(axis, periodic)]
+
+
+def cell_conductance(state: EarthState) -> numpy.ndarray:
+    """
+    Same definition as GridChunk.conductance
+    :param state:
+    :return: the conductance of each cell
+    """
+    return numpy.divide(state.heat_transfer_coefficient, state.surface,
+                        out=numpy.zeros(state.grid_shape, dtype=state.dtype), where=state.active) * \
+        state.specific_heat_capacity
+
+
+def edge_conductance(conductance: numpy.ndarray, index: numpy.ndarray, axis: int, periodic: bool) -> numpy.ndarray:
+    """
+    :param conductance: conductance of each cell
+    :param index: index in the Earth of each cell
+    :param axis:
+    :param periodic:
+    :return: conductance of each edge along the axis, the one of the cell with the lowest index
+    """
+    lower_index, upper_index = edge_pairs(index, axis, periodic)
+    lower_conductance, upper_conductance = edge_pairs(conductance, axis, periodic)
+    return numpy.where(lower_index < upper_index, lower_conductance, upper_conductance)
+
+
+def stencil_diffusion(state: EarthState, time_delta: float, *, periodic: bool = False, index: numpy.ndarray = None,
+                      cache: ConductanceCache = None):
+    """
+    Array version of TickingEarth.average_temperature: every pair of neighbours exchange energy with respect to their
+    temperature difference, using the coefficients of the chunk with the lowest index of the pair
+    :param state:
+    :param time_delta:
+    :param periodic: if the borders of the state are linked
+    :param index: index in the Earth of each cell of the state, needed when the state is only a part of the Earth
+    :param cache: conductances of the whole Earth, up to date (see ConductanceCache.update)
+    :return:
+    """
+    everywhere = numpy.arange(state.active.size).reshape(state.grid_shape)
+    # The edges of the cache can only be used when the state is the whole Earth, not a tile
+    whole = index is None or cache is not None and index.shape == cache.cell.shape and (index == everywhere).all()
+    if index is None:
+        index = everywhere
+    temperature = state.temperature
+    conductance = cell_conductance(state) if cache is None else cache.cell.ravel()[index]
+    received = numpy.zeros(state.grid_shape, dtype=state.dtype)
+    for axis in range(len(state.grid_shape)):
+        lower_active, upper_active = edge_pairs(state.active, axis, periodic)
+        lower_temperature, upper_temperature = edge_pairs(temperature, axis, periodic)
+        if cache is not None and whole:
+            edges = cache.edges(axis, periodic)
+        else:
+            edges = edge_conductance(conductance, index, axis, periodic)
+        exchanged = numpy.where(lower_active & upper_active,
+                                (upper_temperature - lower_temperature) * (edges * time_delta), 0)
+        if periodic:
+            received += exchanged
+            received -= numpy.roll(exchanged, 1, axis=axis)
+        else:
+            before = (slice(None),) * axis
+            received[before + (slice(None, -1),)] += exchanged
+            received[before + (slice(1, None),)] -= exchanged
+    state.add_energy(received)
+
+
+def implicit_diffusion(state: EarthState, time_delta: float, *, periodic: bool = False,
+                       cache: ConductanceCache = None, tolerance: float = 1e-10, max_iterations: int = 1000) -> int:
+    """
+    Backward Euler version of stencil_diffusion: the new temperatures T' solve
+    capacity * (T' - T) = time_delta * (energy exchanged with the neighbours at the temperatures T'),
+    which is stable for any time_delta, so that long steps can be taken (see the coarse propagator of parareal). The
+    system is symmetric positive definite and solved by a conjugate gradient preconditioned by its diagonal. As the
+    stencil, the energy of the earth is conserved
+    :param state: the whole earth
+    :param time_delta:
+    :param periodic: if the borders of the state are linked
+    :param cache: conductances of the earth, up to date (see ConductanceCache.update)
+    :param tolerance: of the residual, relative to the energy of the cells
+    :param max_iterations:
+    :return: number of iterations of the conjugate gradient
+    """
+    temperature = state.temperature
+    # Energy needed to warm each cell by one degree, see EarthState.inverse_heat_capacity
+    capacity = numpy.divide(state.total_mass, state.inverse_heat_capacity, out=numpy.zeros_like(temperature),
+                            where=state.active & (state.inverse_heat_capacity > 0))
+    index = numpy.arange(state.active.size).reshape(state.grid_shape)
+    conductance = cell_conductance(state) if cache is None else cache.cell
+    edges = []
+    for axis in range(len(state.grid_shape)):
+        lower_active, upper_active = edge_pairs(capacity > 0, axis, periodic)
+        conductances = cache.edges(axis, periodic) if cache is not None else \
+            edge_conductance(conductance, index, axis, periodic)
+        edges.append(numpy.where(lower_active & upper_active, conductances * time_delta, 0))
+
+    def apply(values: numpy.ndarray) -> numpy.ndarray:
+        result = capacity * values
+        for axis, edge in enumerate(edges):
+            lower, upper = edge_pairs(values, axis, periodic)
+            flow = edge * (upper - lower)
+            if periodic:
+                result -= flow
+                result += numpy.roll(flow, 1, axis=axis)
+            else:
+                before = (slice(None),) * axis
+                result[before + (slice(None, -1),)] -= flow
+                result[before + (slice(1, None),)] += flow
+        return result
+
+    diagonal = capacity.copy()
+    for axis, edge in enumerate(edges):
+        if periodic:
+            diagonal += edge + numpy.roll(edge, 1, axis=axis)
+        else:
+            before = (slice(None),) * axis
+            diagonal[before + (slice(None, -1),)] += edge
+            diagonal[before + (slice(1, None),)] += edge
+    inverse_diagonal = numpy.divide(1, diagonal, out=numpy.zeros_like(diagonal), where=diagonal > 0)
+
+    target = capacity * temperature
+    new_temperature = temperature.copy()
+    residual = target - apply(new_temperature)
+    direction = inverse_diagonal * residual
+    product = (residual * direction).sum()
+    bound = (tolerance * numpy.linalg.norm(target)) ** 2
+    iterations = 0
+    while iterations < max_iterations and (residual * residual).sum() > bound:
+        applied = apply(direction)
+        step = product / (direction * applied).sum()
+        new_temperature += step * direction
+        residual -= step * applied
+        preconditioned = inverse_diagonal * residual
+        product, previous = (residual * preconditioned).sum(), product
+        direction = preconditioned + (product / previous) * direction
+        iterations += 1
+    state.add_energy(capacity * (new_temperature - temperature))
+    return iterations
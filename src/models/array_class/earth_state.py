@@ -0,0 +1,384 @@
+import functools
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, ClassVar, Iterable, Optional
+
+import numpy
+
+from models.physical_class.chunk_component import ChunkComponent
+from models.physical_class.component_registry import COMPONENT_REGISTRY
+
+if TYPE_CHECKING:
+    from models.physical_class.earth import Earth
+    from models.physical_class.grid_chunk import GridChunk
+
+
+def derived_field(method: Callable[["EarthState"], numpy.ndarray]) -> property:
+    """
+    Turns a method computing an array from the fields of the state into a property computed on first read and cached
+    until the state is modified (see EarthState.modified). The cached array is read only
+    :param method:
+    :return:
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def getter(self: "EarthState") -> numpy.ndarray:
+        version, value = self.derived.get(name, (None, None))
+        if version != self.version:
+            value = method(self)
+            value.flags.writeable = False
+            self.derived[name] = (self.version, value)
+        return value
+
+    return property(getter)
+
+
+@dataclass
+class EarthState:
+    """
+    Array representation of the state of an Earth.
+    Every field is stored as a numpy array of shape `grid_shape`, that is the Earth shape reversed so that the flat index
+    of a cell is the same as the index of its GridChunk in the Earth (x + y * shape[0] + ...).
+    The per component fields (mass, energy) have an additional first axis, the component axis, following the ids of the
+    COMPONENT_REGISTRY (listed by `COMPONENTS`).
+
+    This is the layer on which the vectorized kernels work, the GridChunk objects are only read once to build it and
+    written once when the kernel is done.
+
+    The values derived from the fields (temperature, total mass, ...) are cached until `modified` is called, which
+    every function writing in the arrays must do. The regions of a state are views with their own cache, writing in a
+    region does not invalidate the cache of the whole state.
+
+    The precision of the arrays is one of PRECISIONS: float64, float32 (arrays and sums over the earth in 32 bits) or
+    mixed (32 bits arrays, 64 bits sums over the earth, see `total`).
+    """
+    PRECISIONS = ("float64", "float32", "mixed")
+    # Kept up to date with the COMPONENT_REGISTRY, see the end of the module
+    COMPONENTS: ClassVar[tuple[str, ...]] = ()
+    SPECIFIC_HEAT_CAPACITY: ClassVar[numpy.ndarray]
+    HEAT_TRANSFER_COEFFICIENT: ClassVar[numpy.ndarray]
+    FIELDS = ("mass", "energy", "carbon_ppm", "volume", "specific_heat_capacity", "heat_transfer_coefficient",
+              "mixture_ratio", "active")
+    COMPONENT_FIELDS = ("mass", "energy", "mixture_ratio")
+
+    shape: tuple
+    mass: numpy.ndarray  # [kg] (component, *grid_shape)
+    energy: numpy.ndarray  # [J] (component, *grid_shape)
+    carbon_ppm: numpy.ndarray  # [ppm]
+    volume: numpy.ndarray  # [m3]
+    specific_heat_capacity: numpy.ndarray  # Mixture value, as stored in the GridChunk
+    heat_transfer_coefficient: numpy.ndarray  # Mixture value, as stored in the GridChunk
+    mixture_ratio: numpy.ndarray  # (component, *grid_shape) Mass ratios for which the mixture values were computed
+    active: numpy.ndarray  # False where the Earth has no GridChunk
+    precision: str = field(default="float64", compare=False)  # One of PRECISIONS
+    version: int = field(default=0, compare=False)  # Incremented by modified
+    derived: dict = field(default_factory=dict, compare=False, repr=False)  # name -> (version, value)
+
+    @classmethod
+    def empty(cls, shape: tuple, *, precision: str = "float64") -> "EarthState":
+        if precision not in cls.PRECISIONS:
+            raise ValueError(f"Unknown precision {precision}, expected one of {cls.PRECISIONS}")
+        grid_shape = tuple(reversed(shape))
+        dtype = numpy.float64 if precision == "float64" else numpy.float32
+        return cls(shape=tuple(shape),
+                   mass=numpy.zeros((len(cls.COMPONENTS),) + grid_shape, dtype=dtype),
+                   energy=numpy.zeros((len(cls.COMPONENTS),) + grid_shape, dtype=dtype),
+                   carbon_ppm=numpy.zeros(grid_shape, dtype=dtype),
+                   volume=numpy.zeros(grid_shape, dtype=dtype),
+                   specific_heat_capacity=numpy.zeros(grid_shape, dtype=dtype),
+                   heat_transfer_coefficient=numpy.zeros(grid_shape, dtype=dtype),
+                   mixture_ratio=numpy.zeros((len(cls.COMPONENTS),) + grid_shape, dtype=dtype),
+                   active=numpy.zeros(grid_shape, dtype=bool),
+                   precision=precision)
+
+    @classmethod
+    def from_earth(cls, earth: "Earth", *, precision: str = "float64") -> "EarthState":
+        """
+        Gather the state of all the GridChunk of the earth in arrays
+        :param earth:
+        :param precision: one of PRECISIONS
+        :return:
+        """
+        return cls.from_chunks(earth, earth.shape, precision=precision)
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Optional["GridChunk"]], shape: tuple, *,
+                    precision: str = "float64") -> "EarthState":
+        """
+        :param chunks: the grid chunks (or None) in the order of their index
+        :param shape: shape of the earth they belong to
+        :param precision: one of PRECISIONS
+        :return:
+        """
+        state = cls.empty(shape, precision=precision)
+        mass, energy, mixture_ratio = state.flat(state.mass), state.flat(state.energy), state.flat(state.mixture_ratio)
+        for index, chunk in enumerate(chunks):
+            if chunk is None:
+                continue
+            state.active.flat[index] = True
+            state.carbon_ppm.flat[index] = chunk.carbon_ppm
+            state.volume.flat[index] = chunk.volume
+            state.specific_heat_capacity.flat[index] = getattr(chunk, "specific_heat_capacity", 0)
+            state.heat_transfer_coefficient.flat[index] = getattr(chunk, "heat_transfer_coefficient", 0)
+            for component_type, ratio in getattr(chunk, "mixture_ratio", {}).items():
+                mixture_ratio[cls.component_index(component_type), index] = ratio
+            for component in chunk:
+                mass[component.id, index] = component.mass
+                energy[component.id, index] = component.energy
+        return state
+
+    def write_to(self, earth: Iterable[Optional["GridChunk"]], *, components: bool = True):
+        """
+        Write the state back into the GridChunk of the earth. Components that gained mass are created and components
+        that lost all their mass are removed from their chunk. The mixture properties are written when they changed.
+        :param earth:
+        :param components: if False, only the per chunk fields (carbon) are written
+        :return:
+        """
+        mass, energy = self.flat(self.mass).tolist(), self.flat(self.energy).tolist()
+        carbon_ppm = self.carbon_ppm.ravel().tolist()
+        specific_heat_capacity = self.specific_heat_capacity.ravel().tolist()
+        heat_transfer_coefficient = self.heat_transfer_coefficient.ravel().tolist()
+        mixture_ratio = self.flat(self.mixture_ratio).T.tolist()
+        for index, chunk in enumerate(earth):
+            if chunk is None:
+                continue
+            chunk.carbon_ppm = carbon_ppm[index]
+            if not components:
+                continue
+            for k, component_type in enumerate(self.COMPONENTS):
+                component = chunk.get_by_id(k)
+                if mass[k][index] <= 0:
+                    if component is not None:
+                        chunk.set_by_id(k, None)
+                    continue
+                if component is None:
+                    component = ChunkComponent(mass[k][index], 0, component_type)
+                    component.chunk = chunk
+                    chunk.set_by_id(k, component)
+                component.mass = mass[k][index]
+                component.energy = energy[k][index]
+            if specific_heat_capacity[index] and (
+                    getattr(chunk, "specific_heat_capacity", None) != specific_heat_capacity[index] or
+                    getattr(chunk, "heat_transfer_coefficient", None) != heat_transfer_coefficient[index]):
+                chunk.set_mixture_properties(specific_heat_capacity[index], heat_transfer_coefficient[index],
+                                             {component_type: ratio for component_type, ratio
+                                              in zip(self.COMPONENTS, mixture_ratio[index]) if ratio > 0})
+
+    def __getstate__(self) -> dict:
+        # The derived fields are not sent to other processes, they are computed again there when needed
+        return {**self.__dict__, "derived": {}}
+
+    def copy(self) -> "EarthState":
+        return EarthState(shape=self.shape, **{name: getattr(self, name).copy() for name in self.FIELDS},
+                          precision=self.precision)
+
+    def with_precision(self, precision: str) -> "EarthState":
+        """
+        :param precision: one of PRECISIONS
+        :return: this state if it already has that precision, else a copy converted to it
+        """
+        if precision == self.precision:
+            return self
+        state = EarthState.empty(self.shape, precision=precision)
+        state.assign(tuple(slice(None) for _ in self.grid_shape), self)
+        return state
+
+    def __field_key(self, name: str, key: tuple) -> tuple:
+        return ((slice(None),) + key) if name in self.COMPONENT_FIELDS else key
+
+    def region(self, key: tuple[slice, ...]) -> "EarthState":
+        """
+        :param key: one slice per axis of the grid
+        :return: a state whose arrays are views on a part of this one
+        """
+        fields = {name: getattr(self, name)[self.__field_key(name, key)] for name in self.FIELDS}
+        return EarthState(shape=tuple(reversed(fields["active"].shape)), **fields, precision=self.precision)
+
+    def window(self, key: tuple[slice, ...], written: Iterable[str]) -> "EarthState":
+        """
+        :param key: one slice per axis of the grid
+        :param written: fields that will be modified
+        :return: a state with a copy of the written fields of the region and read only views on its other fields
+        """
+        written = set(written)
+        fields = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)[self.__field_key(name, key)]
+            if name in written:
+                value = value.copy()
+            else:
+                value = value.view()
+                value.flags.writeable = False
+            fields[name] = value
+        return EarthState(shape=tuple(reversed(fields["active"].shape)), **fields, precision=self.precision)
+
+    def take(self, positions: tuple[numpy.ndarray, ...]) -> "EarthState":
+        """
+        :param positions: the positions to take along each axis of the grid
+        :return: a copy of the cells at the cross product of the positions
+        """
+        key = numpy.ix_(*positions)
+        fields = {name: getattr(self, name)[self.__field_key(name, key)] for name in self.FIELDS}
+        return EarthState(shape=tuple(reversed(fields["active"].shape)), **fields, precision=self.precision)
+
+    def cells(self, indices: numpy.ndarray) -> "EarthState":
+        """
+        :param indices: flat indices of cells, that is the indices of their GridChunk in the Earth
+        :return: a copy of these cells, as a state of shape (len(indices),)
+        """
+        key = numpy.unravel_index(indices, self.grid_shape)
+        fields = {name: getattr(self, name)[self.__field_key(name, key)] for name in self.FIELDS}
+        return EarthState(shape=(len(indices),), **fields, precision=self.precision)
+
+    def put(self, indices: numpy.ndarray, cells: "EarthState"):
+        """
+        Copy the fields of the cells at the flat indices, the reverse of `cells`
+        :param indices: flat indices of cells
+        :param cells: a state of shape (len(indices),)
+        :return:
+        """
+        key = numpy.unravel_index(indices, self.grid_shape)
+        for name in self.FIELDS:
+            getattr(self, name)[self.__field_key(name, key)] = getattr(cells, name)
+        self.modified()
+
+    def assign(self, key: tuple[slice, ...], other: "EarthState", fields: Iterable[str] = None):
+        """
+        Copy the fields of other in the region of this state
+        :param key: one slice per axis of the grid
+        :param other: a state with the shape of the region
+        :param fields: the fields copied, all of them by default
+        :return:
+        """
+        for name in self.FIELDS if fields is None else fields:
+            getattr(self, name)[self.__field_key(name, key)] = getattr(other, name)
+        self.modified()
+
+    def fill(self, mask: numpy.ndarray, cell: "EarthState"):
+        """
+        Copy the fields of a single cell in every cell of the mask
+        :param mask: (grid_shape) where the cell is copied
+        :param cell: a state of one cell
+        :return:
+        """
+        for name in self.FIELDS:
+            value = getattr(cell, name).reshape((len(self.COMPONENTS), 1) if name in self.COMPONENT_FIELDS else ())
+            if name in self.COMPONENT_FIELDS:
+                getattr(self, name)[:, mask] = value
+            else:
+                getattr(self, name)[mask] = value
+        self.modified()
+
+    def modified(self):
+        """
+        Must be called after writing in the arrays, so that the derived fields are computed again on their next read
+        :return:
+        """
+        self.version += 1
+
+    @staticmethod
+    def component_index(component_type: str) -> int:
+        return COMPONENT_REGISTRY.id(component_type)
+
+    @property
+    def grid_shape(self) -> tuple:
+        return self.carbon_ppm.shape
+
+    @property
+    def dtype(self) -> type:
+        """
+        :return: type of the values of the fields
+        """
+        return self.carbon_ppm.dtype.type
+
+    def total(self, values: numpy.ndarray) -> float:
+        """
+        Sum over the earth, computed in 64 bits except in float32 precision
+        :param values:
+        :return:
+        """
+        return values.sum(dtype=numpy.float32 if self.precision == "float32" else numpy.float64)
+
+    def per_component(self, values: numpy.ndarray) -> numpy.ndarray:
+        """
+        :param values: one value per component (SPECIFIC_HEAT_CAPACITY, ...)
+        :return: the values in the type of the fields, shaped to be broadcast against a per component field
+        """
+        return values.astype(self.dtype, copy=False).reshape((-1,) + (1,) * len(self.grid_shape))
+
+    def flat(self, field: numpy.ndarray) -> numpy.ndarray:
+        """
+        :param field: a per component field
+        :return: a (component, cell) view of the field
+        """
+        return field.reshape(len(self.COMPONENTS), -1)
+
+    @derived_field
+    def present(self) -> numpy.ndarray:
+        """
+        :return: per component mask of the components that exist in each chunk
+        """
+        return self.mass > 0
+
+    @derived_field
+    def total_mass(self) -> numpy.ndarray:
+        return self.mass.sum(axis=0)
+
+    @derived_field
+    def mass_ratio(self) -> numpy.ndarray:
+        """
+        Same definition as GridChunk.get_ratio_of_component, for every component
+        :return: per component ratio of the mass of each cell
+        """
+        total_mass = self.total_mass
+        return numpy.divide(self.mass, total_mass, out=numpy.zeros_like(self.mass), where=total_mass > 0)
+
+    @derived_field
+    def surface(self) -> numpy.ndarray:
+        """
+        Same definition as GridChunk.surface, the cells being cubes
+        :return:
+        """
+        return (self.volume ** (1 / 3)) ** 2
+
+    @derived_field
+    def inverse_heat_capacity(self) -> numpy.ndarray:
+        """
+        Mean of 1 / specific heat capacity over the components present in each cell. Multiplied by the energy added
+        to a cell and divided by its mass, it gives the increase of temperature of the cell
+        :return:
+        """
+        present = self.present
+        inverse = numpy.where(present, 1 / self.per_component(self.SPECIFIC_HEAT_CAPACITY), self.dtype(0))
+        return inverse.sum(axis=0) / numpy.maximum(1, present.sum(axis=0)).astype(self.dtype)
+
+    @derived_field
+    def temperature(self) -> numpy.ndarray:
+        """
+        Same definition as GridChunk.temperature: the mean of the temperature of the components present in each cell
+        :return:
+        """
+        present = self.present
+        heat_capacity = self.per_component(self.SPECIFIC_HEAT_CAPACITY) * self.mass
+        temperatures = numpy.divide(self.energy, heat_capacity, out=numpy.zeros_like(self.energy), where=present)
+        return temperatures.sum(axis=0) / numpy.maximum(1, present.sum(axis=0)).astype(self.dtype)
+
+    def add_energy(self, value: numpy.ndarray):
+        """
+        Same behaviour as GridChunk.add_energy: the energy of each cell is split between its components with respect to
+        their mass ratio
+        :param value: energy added to each cell
+        :return:
+        """
+        self.energy += value * self.mass_ratio
+        self.modified()
+
+
+def _register_component(name: str, component_id: int):
+    EarthState.COMPONENTS = tuple(COMPONENT_REGISTRY.names)
+    EarthState.SPECIFIC_HEAT_CAPACITY = COMPONENT_REGISTRY.specific_heat_capacity
+    EarthState.HEAT_TRANSFER_COEFFICIENT = COMPONENT_REGISTRY.heat_transfer_coefficient
+
+
+COMPONENT_REGISTRY.on_register(_register_component)
@@ -0,0 +1,254 @@
+import argparse
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Sequence
+
+import numpy
+
+from models.physical_class.component_registry import COMPONENT_REGISTRY
+
+if TYPE_CHECKING:
+    from models.physical_class.universe import Universe
+
+# Settings the emulator is trained over: the albedo of the earth, the power of the sun [W] and the evaporation rate of
+# the universe [s^-1]
+PARAMETERS = ("albedo", "energy_radiated_per_second", "EVAPORATION_RATE")
+
+
+@dataclass
+class Run:
+    """
+    Global trajectory of a completed simulation: the mean temperature of the earth and its composition, sampled every
+    few ticks, with the parameters it was run with
+    """
+    parameters: dict[str, float]
+    ticks: numpy.ndarray  # (samples,) Tick of each sample
+    mean_temperature: numpy.ndarray  # (samples,) [K]
+    composition: numpy.ndarray  # (samples, component) Mass ratio of each component of the COMPONENT_REGISTRY
+
+    @property
+    def vector(self) -> numpy.ndarray:
+        """
+        :return: the trajectory as a single vector, as used by the emulator
+        """
+        return numpy.concatenate((self.mean_temperature, self.composition.ravel()))
+
+    def parameter_vector(self) -> numpy.ndarray:
+        return numpy.array([self.parameters[name] for name in PARAMETERS], dtype=float)
+
+    def save(self, path: str):
+        numpy.savez(path, parameters=self.parameter_vector(), ticks=self.ticks, mean_temperature=self.mean_temperature,
+                    composition=self.composition, components=numpy.array(COMPONENT_REGISTRY.names))
+
+    @classmethod
+    def load(cls, path: str) -> "Run":
+        with numpy.load(path) as data:
+            composition = numpy.zeros((len(data["ticks"]), len(COMPONENT_REGISTRY)))
+            for k, name in enumerate(data["components"]):
+                composition[:, COMPONENT_REGISTRY.id(str(name))] = data["composition"][:, k]
+            return cls(dict(zip(PARAMETERS, data["parameters"].tolist())), data["ticks"], data["mean_temperature"],
+                       composition)
+
+
+def record_run(universe: "Universe", ticks: int, *, every: int = 1) -> Run:
+    """
+    Update the universe and record its trajectory
+    :param universe:
+    :param ticks:
+    :param every: number of ticks between two samples
+    :return:
+    """
+    sample_ticks, temperatures, compositions = [], [], []
+    for tick in range(ticks + 1):
+        if tick % every == 0 or tick == ticks:
+            universe.synchronize()
+            composition = universe.earth.composition
+            sample_ticks.append(tick)
+            temperatures.append(universe.earth.compute_average_temperature())
+            compositions.append([composition.get(name, 0) for name in COMPONENT_REGISTRY.names])
+        if tick < ticks:
+            universe.update_all()
+    parameters = {"albedo": universe.earth.albedo, "EVAPORATION_RATE": universe.EVAPORATION_RATE,
+                  "energy_radiated_per_second": universe.sun.energy_radiated_per_second}
+    return Run(parameters, numpy.array(sample_ticks), numpy.array(temperatures), numpy.array(compositions))
+
+
+def simulate(build: Callable[[], "Universe"], parameters: dict[str, float], ticks: int, *, every: int = 1) -> Run:
+    """
+    Run a full simulation with the given parameters
+    :param build: creates the universe in its initial state
+    :param parameters: value of each of PARAMETERS
+    :param ticks:
+    :param every: number of ticks between two samples
+    :return:
+    """
+    universe = build()
+    universe_class = type(universe)
+    evaporation_rate = universe_class.EVAPORATION_RATE
+    universe.earth.albedo = parameters["albedo"]
+    universe.sun.energy_radiated_per_second = parameters["energy_radiated_per_second"]
+    # The grid chunks read the evaporation rate on the class
+    universe_class.EVAPORATION_RATE = parameters["EVAPORATION_RATE"]
+    try:
+        return record_run(universe, ticks, every=every)
+    finally:
+        universe_class.EVAPORATION_RATE = evaporation_rate
+
+
+@dataclass
+class EmulatedRun:
+    """
+    Trajectory predicted by the emulator
+    """
+    parameters: dict[str, float]
+    ticks: numpy.ndarray
+    mean_temperature: numpy.ndarray  # [K]
+    composition: dict[str, numpy.ndarray]  # Mass ratio of each component over time
+
+
+@dataclass
+class ValidationReport:
+    """
+    Errors of the emulator against full simulations it was not trained on
+    """
+    runs: int
+    temperature_rmse: float  # [K]
+    temperature_max_error: float  # [K]
+    temperature_relative_error: float  # Largest temperature error relative to the temperature simulated
+    composition_max_error: float  # Largest difference of a mass ratio
+    errors: list[float] = field(default_factory=list)  # Largest temperature error [K] of each run
+
+    def __str__(self):
+        return f"{self.runs} held-out runs: mean temperature RMSE {self.temperature_rmse:.3g} K, max error " \
+               f"{self.temperature_max_error:.3g} K ({self.temperature_relative_error:.3%}), composition max error " \
+               f"{self.composition_max_error:.3g}"
+
+
+class Emulator:
+    """
+    Reduced order model of the global trajectories of the simulation.
+    The trajectories of the training runs are projected on their principal components (PCA), and the coordinates on
+    these components are fitted as a polynomial of the parameters. A query is then a polynomial evaluation and a
+    projection back, which takes well under a millisecond instead of a full simulation.
+    All the runs must be sampled at the same ticks.
+    """
+    def __init__(self, *, modes: int = 4, degree: int = 2, ridge: float = 1e-9):
+        """
+        :param modes: largest number of principal components kept
+        :param degree: degree of the polynomial of the parameters
+        :param ridge: regularization of the least squares fit
+        """
+        self.modes = modes
+        self.degree = degree
+        self.ridge = ridge
+        self.ticks: numpy.ndarray = None  # Ticks at which the trajectories are sampled
+        self.parameter_center: numpy.ndarray = None
+        self.parameter_scale: numpy.ndarray = None
+        self.mean: numpy.ndarray = None  # Mean trajectory of the training runs
+        self.scale: numpy.ndarray = None  # Standard deviation of each value of the trajectories
+        self.basis: numpy.ndarray = None  # (mode, trajectory) Principal components
+        self.coefficients: numpy.ndarray = None  # (monomial, mode) Polynomial of each principal component
+        self.validation: ValidationReport = None  # Set by validate
+
+    def fit(self, runs: Sequence[Run]) -> "Emulator":
+        self.ticks = runs[0].ticks
+        if any(not numpy.array_equal(run.ticks, self.ticks) for run in runs):
+            raise ValueError("All the runs of the emulator must be sampled at the same ticks")
+        parameters = numpy.array([run.parameter_vector() for run in runs])
+        # The parameters are scaled to [-1, 1] so that the polynomial is well conditioned whatever their units
+        self.parameter_center = (parameters.max(axis=0) + parameters.min(axis=0)) / 2
+        self.parameter_scale = numpy.maximum((parameters.max(axis=0) - parameters.min(axis=0)) / 2,
+                                             numpy.abs(self.parameter_center) * 1e-12 + 1e-300)
+        trajectories = numpy.array([run.vector for run in runs])
+        # Each value is standardized, so that the composition weighs as much as the temperature in the components
+        self.mean = trajectories.mean(axis=0)
+        self.scale = trajectories.std(axis=0)
+        self.scale[self.scale == 0] = 1
+        standardized = (trajectories - self.mean) / self.scale
+        _, singular_values, basis = numpy.linalg.svd(standardized, full_matrices=False)
+        kept = singular_values > singular_values.max(initial=0) * 1e-10
+        self.basis = basis[kept][:self.modes]
+        coordinates = standardized @ self.basis.T
+        features = self.features(parameters)
+        self.coefficients = numpy.linalg.solve(features.T @ features + self.ridge * numpy.eye(features.shape[1]),
+                                               features.T @ coordinates)
+        return self
+
+    def features(self, parameters: numpy.ndarray) -> numpy.ndarray:
+        """
+        :param parameters: (runs, parameter)
+        :return: (runs, monomial) the monomials of the scaled parameters up to the degree
+        """
+        scaled = (parameters - self.parameter_center) / self.parameter_scale
+        columns = [numpy.ones(len(scaled))]
+        for degree in range(1, self.degree + 1):
+            for combination in itertools.combinations_with_replacement(range(scaled.shape[1]), degree):
+                columns.append(numpy.prod(scaled[:, combination], axis=1))
+        return numpy.stack(columns, axis=1)
+
+    def predict_vector(self, parameters: numpy.ndarray) -> numpy.ndarray:
+        """
+        :param parameters: (runs, parameter)
+        :return: (runs, trajectory) the predicted trajectories in the layout of Run.vector
+        """
+        return self.mean + (self.features(parameters) @ self.coefficients @ self.basis) * self.scale
+
+    def predict(self, parameters: dict[str, float]) -> EmulatedRun:
+        """
+        :param parameters: value of each of PARAMETERS
+        :return: the trajectory the simulation would have with these parameters
+        """
+        vector = self.predict_vector(numpy.array([[parameters[name] for name in PARAMETERS]], dtype=float))[0]
+        samples = len(self.ticks)
+        composition = vector[samples:].reshape(samples, len(COMPONENT_REGISTRY))
+        return EmulatedRun(parameters, self.ticks, vector[:samples],
+                           {name: composition[:, k] for k, name in enumerate(COMPONENT_REGISTRY.names)})
+
+    def validate(self, runs: Sequence[Run]) -> ValidationReport:
+        """
+        Compare the emulator with full simulations, the result is kept in validation
+        :param runs: runs that were not used to fit the emulator
+        :return:
+        """
+        samples = len(self.ticks)
+        predicted = self.predict_vector(numpy.array([run.parameter_vector() for run in runs]))
+        expected = numpy.array([run.vector for run in runs])
+        temperature_error = numpy.abs(predicted[:, :samples] - expected[:, :samples])
+        self.validation = ValidationReport(len(runs), float(numpy.sqrt(numpy.mean(temperature_error ** 2))),
+                                           float(temperature_error.max()),
+                                           float((temperature_error / numpy.abs(expected[:, :samples])).max()),
+                                           float(numpy.abs(predicted[:, samples:] - expected[:, samples:]).max()),
+                                           temperature_error.max(axis=1).tolist())
+        return self.validation
+
+
+def train(runs: Sequence[Run], *, held_out: int = 2, **kwargs) -> Emulator:
+    """
+    Fit an emulator on the runs and validate it on the last held_out ones
+    :param runs:
+    :param held_out: number of runs kept for the validation
+    :param kwargs: see Emulator
+    :return:
+    """
+    if not 0 < held_out < len(runs):
+        raise ValueError(f"Cannot hold out {held_out} of {len(runs)} runs")
+    emulator = Emulator(**kwargs).fit(runs[:-held_out])
+    emulator.validate(runs[-held_out:])
+    return emulator
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train an emulator from saved runs (see Run.save) and query it")
+    parser.add_argument("runs", nargs="+", help="saved runs, the last ones are held out for the validation")
+    parser.add_argument("--held-out", type=int, default=2)
+    parser.add_argument("--query", type=float, nargs=len(PARAMETERS), metavar=PARAMETERS)
+    arguments = parser.parse_args()
+    trained = train([Run.load(path) for path in arguments.runs], held_out=arguments.held_out)
+    print(trained.validation)
+    if arguments.query:
+        start = time.perf_counter()
+        emulated = trained.predict(dict(zip(PARAMETERS, arguments.query)))
+        print(f"Final mean temperature {emulated.mean_temperature[-1]:.3f} K, composition "
+              f"{ {name: round(float(ratio[-1]), 4) for name, ratio in emulated.composition.items()} } "
+              f"({(time.perf_counter() - start) * 1000:.2f} ms)")
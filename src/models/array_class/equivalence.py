@@ -0,0 +1,129 @@
+import argparse
+import random
+import time
+from dataclasses import dataclass, field
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.physical_class.universe import Universe
+from models.ticking_class.ticking_earth import TickingEarth
+from models.ticking_class.ticking_grid_chunk import TickingGridChunk
+from models.ticking_class.ticking_sun import TickingSun
+
+
+def seeded_universe(shape: tuple, *, seed: int = 0, periodic: bool = False, filling_density: float = 0.8) -> Universe:
+    """
+    Build a universe with a sun and an earth filled with random grid chunks. The same seed always gives the same
+    universe
+    :param shape: shape of the earth
+    :param seed:
+    :param periodic: if the borders of the earth are linked
+    :param filling_density: probability of each cell to contain a grid chunk
+    :return:
+    """
+    generator = random.Random(seed)
+    universe = Universe()
+    universe.earth = TickingEarth(shape=shape, parent=universe, periodic=periodic)
+    universe.sun = TickingSun()
+    for i in range(len(universe.earth)):
+        if generator.uniform(0, 1) < filling_density:
+            components = [(generator.uniform(100, 1000), generator.uniform(250, 350), component_type)
+                          for component_type in ("WATER", "AIR", "LAND") if generator.uniform(0, 1) < 0.6]
+            universe.earth[i] = TickingGridChunk.from_components_tuple(*(components or [(1000, 300, "WATER")]),
+                                                                       volume=generator.uniform(1, 10), index=i,
+                                                                       parent=universe.earth)
+    universe.discover_everything()
+    return universe
+
+
+@dataclass
+class EngineComparison:
+    """
+    Result of running the object and the array engines from the same initial state
+    """
+    ticks: int
+    object_seconds: float
+    array_seconds: float
+    max_errors: dict[str, float] = field(default_factory=dict)  # Largest absolute difference of each field
+    mismatches: list[str] = field(default_factory=list)  # Fields that do not agree within the tolerance
+
+    @property
+    def equivalent(self) -> bool:
+        return not self.mismatches
+
+    @property
+    def speedup(self) -> float:
+        return self.object_seconds / self.array_seconds if self.array_seconds else float("inf")
+
+    def __str__(self):
+        res = f"{self.ticks} ticks: object engine {self.object_seconds:.3f} s, array engine " \
+              f"{self.array_seconds:.3f} s, speedup x{self.speedup:.1f}\n"
+        res += "\n".join(f"- {name}: max error {error:.3g}{' MISMATCH' if name in self.mismatches else ''}"
+                          for name, error in self.max_errors.items())
+        return res
+
+
+def run_engine(universe: Universe, engine: str, ticks: int) -> float:
+    """
+    :param universe:
+    :param engine: one of Universe.ENGINES
+    :param ticks:
+    :return: the time taken to update the universe ticks times [s], including the final synchronization of the chunks
+    """
+    universe.ENGINE = engine
+    start = time.perf_counter()
+    for _ in range(ticks):
+        universe.update_all()
+    universe.synchronize()
+    return time.perf_counter() - start
+
+
+def compare_engines(shape: tuple, ticks: int, *, seed: int = 0, periodic: bool = False, rtol: float = 1e-7,
+                    atol: float = 1e-6) -> EngineComparison:
+    """
+    Run both engines for the same number of ticks, from the same seeded universe, and compare the resulting states
+    field by field
+    :param shape: shape of the earth
+    :param ticks:
+    :param seed:
+    :param periodic:
+    :param rtol: relative tolerance, as in numpy.allclose
+    :param atol: absolute tolerance, as in numpy.allclose
+    :return:
+    """
+    states, seconds = {}, {}
+    for engine in ("object", "array"):
+        universe = seeded_universe(shape, seed=seed, periodic=periodic)
+        seconds[engine] = run_engine(universe, engine, ticks)
+        states[engine] = EarthState.from_earth(universe.earth)
+    comparison = EngineComparison(ticks, seconds["object"], seconds["array"])
+    for name in ("mass", "energy", "carbon_ppm", "active", "temperature"):
+        reference, value = getattr(states["object"], name), getattr(states["array"], name)
+        comparison.max_errors[name] = float(numpy.abs(value.astype(float) - reference).max(initial=0))
+        if not numpy.allclose(value, reference, rtol=rtol, atol=atol):
+            comparison.mismatches.append(name)
+    return comparison
+
+
+def assert_engines_agree(shape: tuple, ticks: int, **kwargs) -> EngineComparison:
+    """
+    Same as compare_engines, but raises an AssertionError when the engines disagree
+    """
+    comparison = compare_engines(shape, ticks, **kwargs)
+    if not comparison.equivalent:
+        raise AssertionError(f"The array engine does not match the object engine on {comparison.mismatches}\n"
+                             f"{comparison}")
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the object and array engines of the universe")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--periodic", action="store_true")
+    arguments = parser.parse_args()
+    print(compare_engines((arguments.width, arguments.height), arguments.ticks, seed=arguments.seed,
+                          periodic=arguments.periodic))
@@ -0,0 +1,29 @@
+import numpy
+
+from models.array_class.earth_state import EarthState
+
+
+def water_evaporation(state: EarthState, rate: float, time_delta: float, *, where: numpy.ndarray = None):
+    """
+    Array version of TickingGridChunk.water_evaporation: a fraction of the water of each cell becomes air. When a cell
+    had no air, the new air is created at the temperature of the cell
+    :param state:
+    :param rate: fraction of the water evaporated per second
+    :param time_delta:
+    :param where: cells on which the evaporation applies, all of them if None
+    :return:
+    """
+    water, air = state.component_index("WATER"), state.component_index("AIR")
+    evaporating = state.mass[water] > 0
+    if where is not None:
+        evaporating &= where
+    evaporated = numpy.where(evaporating, rate * time_delta * state.mass[water], 0)
+    state.mass[water] -= evaporated
+    state.modified()
+    new_air = evaporating & ~(state.mass[air] > 0)
+    if new_air.any():
+        temperature = state.temperature
+        state.energy[air] = numpy.where(new_air, state.SPECIFIC_HEAT_CAPACITY[air] * evaporated * temperature,
+                                        state.energy[air])
+    state.mass[air] += evaporated
+    state.modified()
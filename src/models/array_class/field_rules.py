@@ -0,0 +1,215 @@
+import ast
+from types import CodeType
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+
+
+class FieldNamespace(dict):
+    """
+    Values available to the expressions of a FieldRule, computed from the state the first time they are used
+    """
+    FUNCTIONS = {"exp": numpy.exp, "log": numpy.log, "sqrt": numpy.sqrt, "abs": numpy.abs, "minimum": numpy.minimum,
+                 "maximum": numpy.maximum, "clip": numpy.clip, "where": numpy.where}
+
+    def __init__(self, state: EarthState, constants: dict[str, float], *, periodic: bool = False):
+        super().__init__(constants)
+        self.state = state
+        self.periodic = periodic
+        self.update(self.FUNCTIONS)
+        self.update(neighbour_sum=self.neighbour_sum, neighbour_mean=self.neighbour_mean, laplacian=self.laplacian)
+
+    @classmethod
+    def field_names(cls) -> set[str]:
+        """
+        :return: the names of the fields that can be read by an expression
+        """
+        per_component = {f"{component.lower()}_{name}" for component in EarthState.COMPONENTS
+                         for name in ("mass", "energy")}
+        return per_component | {"mass", "energy", "temperature", "carbon_ppm", "volume", "surface", "active",
+                                "neighbour_count"}
+
+    def __missing__(self, name: str) -> numpy.ndarray:
+        state = self.state
+        if name == "mass":
+            value = state.total_mass
+        elif name == "energy":
+            value = state.energy.sum(axis=0)
+        elif name == "temperature":
+            value = state.temperature
+        elif name in ("carbon_ppm", "volume", "active"):
+            value = getattr(state, name)
+        elif name == "surface":
+            value = (state.volume ** (1 / 3)) ** 2
+        elif name == "neighbour_count":
+            value = self.neighbour_sum(numpy.ones(state.grid_shape, dtype=state.dtype))
+        elif name.endswith(("_mass", "_energy")) and name.rsplit("_", 1)[0].upper() in state.COMPONENTS:
+            component, field = name.rsplit("_", 1)
+            value = getattr(state, field)[state.component_index(component)]
+        else:
+            raise KeyError(name)
+        self[name] = value
+        return value
+
+    def neighbour_sum(self, field: numpy.ndarray) -> numpy.ndarray:
+        """
+        :param field:
+        :return: sum of the field over the existing neighbours of each cell
+        """
+        values = numpy.where(self.state.active, field, 0)
+        total = numpy.zeros(self.state.grid_shape, dtype=self.state.dtype)
+        for axis in range(len(self.state.grid_shape)):
+            if self.periodic:
+                before, after = numpy.roll(values, 1, axis=axis), numpy.roll(values, -1, axis=axis)
+            else:
+                # Same order of additions as when periodic, so that a tile gives exactly the same result
+                before, after = numpy.zeros_like(values), numpy.zeros_like(values)
+                axes = (slice(None),) * axis
+                before[axes + (slice(1, None),)] = values[axes + (slice(None, -1),)]
+                after[axes + (slice(None, -1),)] = values[axes + (slice(1, None),)]
+            total += before + after
+        return total
+
+    def neighbour_mean(self, field: numpy.ndarray) -> numpy.ndarray:
+        count = self["neighbour_count"]
+        return numpy.divide(self.neighbour_sum(field), count,
+                            out=numpy.zeros(self.state.grid_shape, dtype=self.state.dtype), where=count > 0)
+
+    def laplacian(self, field: numpy.ndarray) -> numpy.ndarray:
+        """
+        :param field:
+        :return: sum of the differences between the existing neighbours of each cell and the cell
+        """
+        return self.neighbour_sum(field) - self["neighbour_count"] * field
+
+
+class FieldRule:
+    """
+    An on_tick rule of the earth written as expressions over named fields, e.g.
+        {"carbon_ppm": "carbon_ppm + CARBON_DIFFUSIVITY * TIME_DELTA * laplacian(carbon_ppm)"}
+
+    The expressions can read the fields listed by FieldNamespace.field_names, call the functions of FieldNamespace
+    (neighbour_sum, neighbour_mean, laplacian, exp, where, ...) and use constants written in upper case, which are
+    read from the earth or from the universe on every tick. All the expressions are evaluated on the state before the
+    rule, then the fields are written in order:
+    - `<component>_mass`: the component keeps its temperature, or gets the one of the cell when it appears
+    - `energy`: the difference is added to the cell, as with GridChunk.add_energy
+    - `temperature`: every component of the cell is set to that temperature, as with the GridChunk.temperature setter
+    - `carbon_ppm`
+    Only the cells with a grid chunk are modified.
+    """
+    enabled: bool
+    compiled: bool = False
+
+    def __init__(self, name: str, updates: dict[str, str], *, module: str, enabled: bool = True, doc: str = None):
+        """
+        :param name: name of the rule, as shown in the interface
+        :param updates: expression of the new value of each field written
+        :param module: module of the model that runs the rule, see TickingModel.update
+        :param enabled:
+        :param doc:
+        """
+        self.__name__ = self.__qualname__ = name
+        self.__module__ = module
+        self.__doc__ = doc or "\n".join(f"{target} = {expression}" for target, expression in updates.items())
+        self.enabled = enabled
+        writable = {f"{component.lower()}_mass" for component in EarthState.COMPONENTS} | \
+                   {"energy", "temperature", "carbon_ppm"}
+        self.updates: dict[str, CodeType] = {}
+        self.constant_names: set[str] = set()
+        self.uses_neighbours = False
+        readable = FieldNamespace.field_names() | set(FieldNamespace.FUNCTIONS)
+        neighbour_functions = {"neighbour_sum", "neighbour_mean", "laplacian", "neighbour_count"}
+        for target, expression in updates.items():
+            if target not in writable:
+                raise ValueError(f"{name}: cannot write {target}, expected one of {sorted(writable)}")
+            tree = ast.parse(expression, mode="eval")
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Attribute):
+                    raise ValueError(f"{name}: attributes are not allowed in {expression}")
+                if not isinstance(node, ast.Name):
+                    continue
+                if node.id in neighbour_functions:
+                    self.uses_neighbours = True
+                elif node.id.isupper():
+                    self.constant_names.add(node.id)
+                elif node.id not in readable:
+                    raise ValueError(f"{name}: unknown field {node.id} in {expression}")
+            self.updates[target] = compile(tree, f"<field rule {name}: {target}>", "eval")
+
+    def __repr__(self):
+        return f"FieldRule({self.__name__})"
+
+    @property
+    def written_fields(self) -> frozenset[str]:
+        """
+        :return: the fields of EarthState modified by the rule
+        """
+        fields = set()
+        for target in self.updates:
+            if target == "carbon_ppm":
+                fields.add("carbon_ppm")
+            elif target in ("energy", "temperature"):
+                fields.add("energy")
+            else:
+                fields |= {"mass", "energy"}
+        return frozenset(fields)
+
+    def constants(self, earth) -> dict[str, float]:
+        """
+        :param earth:
+        :return: current value of the constants used by the expressions
+        """
+        values = {}
+        for name in self.constant_names:
+            for source in (earth, earth.get_universe()):
+                if hasattr(source, name):
+                    values[name] = getattr(source, name)
+                    break
+            else:
+                raise ValueError(f"{self.__name__}: unknown constant {name}")
+        return values
+
+    def apply(self, state: EarthState, constants: dict[str, float], *, periodic: bool = False):
+        """
+        Apply the rule on the state
+        :param state:
+        :param constants: see constants
+        :param periodic: if the borders of the state are linked
+        :return:
+        """
+        namespace = FieldNamespace(state, constants, periodic=periodic)
+        values = {target: numpy.broadcast_to(eval(code, {"__builtins__": {}}, namespace), state.grid_shape)
+                  for target, code in self.updates.items()}
+        active = state.active
+        shape = (-1,) + (1,) * len(state.grid_shape)
+        for target, value in values.items():
+            if target == "carbon_ppm":
+                state.carbon_ppm[...] = numpy.where(active, value, state.carbon_ppm)
+                state.modified()
+            elif target == "energy":
+                state.add_energy(numpy.where(active, value - state.energy.sum(axis=0), 0))
+            elif target == "temperature":
+                new_energy = state.SPECIFIC_HEAT_CAPACITY.reshape(shape) * state.mass * value
+                state.energy[...] = numpy.where(active & state.present, new_energy, state.energy)
+                state.modified()
+            else:
+                k = state.component_index(target[:-len("_mass")])
+                mass = numpy.where(active, numpy.maximum(value, 0), state.mass[k])
+                # The component keeps its temperature, a new component takes the temperature of its cell
+                temperature = numpy.divide(state.energy[k], state.SPECIFIC_HEAT_CAPACITY[k] * state.mass[k],
+                                           out=state.temperature.copy(), where=state.mass[k] > 0)
+                state.mass[k] = mass
+                state.energy[k] = state.SPECIFIC_HEAT_CAPACITY[k] * mass * temperature
+                state.modified()
+
+    def __call__(self, earth):
+        """
+        Apply the rule on the grid chunks of the earth, as any other on_tick method
+        :param earth:
+        :return:
+        """
+        state = EarthState.from_earth(earth)
+        self.apply(state, self.constants(earth), periodic=earth.periodic)
+        state.write_to(earth)
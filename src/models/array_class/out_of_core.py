@@ -0,0 +1,398 @@
+import argparse
+import itertools
+import json
+import mmap
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+import numpy
+from numpy.lib.format import open_memmap
+
+from models.array_class.diffusion import refresh_mixture
+from models.array_class.earth_state import EarthState
+from models.array_class.pipeline import Stage, TickPipeline
+from models.physical_class.component_registry import COMPONENT_REGISTRY
+
+
+class MemmapStore:
+    """
+    The fields of an EarthState in .npy files of a directory, mapped in memory so that the state can be far larger
+    than the RAM: the operating system only loads the pages that are read, and writes back the ones that are modified.
+    Each field written by the out-of-core pipeline has a second file: a tick is read from one file and written in the
+    other, then their roles are swapped. The layout file records which one holds the current value of each field.
+    """
+    LAYOUT = "layout.json"
+
+    def __init__(self, directory: str, shape: tuple, precision: str, current: dict[str, int], *, mode: str = "r+"):
+        """
+        Use create or open
+        :param directory:
+        :param shape: shape of the earth
+        :param precision: one of EarthState.PRECISIONS
+        :param current: field -> which of its two files holds its value
+        :param mode: mode of the memory maps, "r" for a read only store
+        """
+        self.directory = directory
+        self.shape = tuple(shape)
+        self.precision = precision
+        self.current = current
+        self.mode = mode
+        self.state = EarthState(shape=self.shape, precision=precision,
+                                **{name: self.__map(name, current[name]) for name in EarthState.FIELDS})
+        self.__next: dict[str, numpy.memmap] = {}  # Second file of the fields, opened when first written
+
+    @classmethod
+    def create(cls, directory: str, shape: tuple, *, precision: str = "float32") -> "MemmapStore":
+        """
+        Create the files of an empty earth, the files already in the directory are replaced
+        :param directory:
+        :param shape: shape of the earth
+        :param precision: one of EarthState.PRECISIONS
+        :return:
+        """
+        if precision not in EarthState.PRECISIONS:
+            raise ValueError(f"Unknown precision {precision}, expected one of {EarthState.PRECISIONS}")
+        os.makedirs(directory, exist_ok=True)
+        grid_shape = tuple(reversed(shape))
+        dtype = numpy.float64 if precision == "float64" else numpy.float32
+        for name in EarthState.FIELDS:
+            field_shape = ((len(EarthState.COMPONENTS),) if name in EarthState.COMPONENT_FIELDS else ()) + grid_shape
+            # The files are sparse, the pages of zeros take no room until they are written
+            open_memmap(cls.path(directory, name, 0), mode="w+", shape=field_shape,
+                        dtype=bool if name == "active" else dtype).flush()
+        store = cls(directory, shape, precision, {name: 0 for name in EarthState.FIELDS})
+        store.save_layout()
+        return store
+
+    @classmethod
+    def open(cls, directory: str, *, mode: str = "r+") -> "MemmapStore":
+        with open(os.path.join(directory, cls.LAYOUT)) as file:
+            layout = json.load(file)
+        if layout["components"] != list(EarthState.COMPONENTS):
+            raise ValueError(f"The store of {directory} was made with the components {layout['components']}")
+        return cls(directory, layout["shape"], layout["precision"], layout["current"], mode=mode)
+
+    @staticmethod
+    def path(directory: str, name: str, version: int) -> str:
+        return os.path.join(directory, f"{name}.{version}.npy")
+
+    def __map(self, name: str, version: int) -> numpy.memmap:
+        return open_memmap(self.path(self.directory, name, version), mode=self.mode)
+
+    def next(self, name: str) -> numpy.memmap:
+        """
+        :param name: a field
+        :return: the file in which the next value of the field is written, see swap
+        """
+        if name not in self.__next:
+            path = self.path(self.directory, name, 1 - self.current[name])
+            current = getattr(self.state, name)
+            if os.path.exists(path):
+                self.__next[name] = open_memmap(path, mode="r+")
+            else:
+                self.__next[name] = open_memmap(path, mode="w+", shape=current.shape, dtype=current.dtype)
+        return self.__next[name]
+
+    def swap(self, names: Iterator[str]):
+        """
+        The next values of the fields become their current values
+        :param names: fields whose next file was entirely written
+        :return:
+        """
+        for name in names:
+            current = getattr(self.state, name)
+            setattr(self.state, name, self.__next[name])
+            self.__next[name] = current
+            self.current[name] = 1 - self.current[name]
+        self.state.modified()
+
+    def save_layout(self):
+        with open(os.path.join(self.directory, self.LAYOUT), "w") as file:
+            json.dump({"shape": list(self.shape), "precision": self.precision, "current": self.current,
+                       "components": list(EarthState.COMPONENTS)}, file)
+
+    def maps(self) -> list[numpy.memmap]:
+        return [getattr(self.state, name) for name in EarthState.FIELDS] + list(self.__next.values())
+
+    def flush(self):
+        """
+        Write the modified pages in the files, and record which files are current
+        :return:
+        """
+        if self.mode == "r":
+            return
+        for array in self.maps():
+            array.flush()
+        self.save_layout()
+
+    def evict(self):
+        """
+        Drop the pages of the files from the memory of the process and from the page cache, as if they had been pushed
+        out by other files. The next reads come from the disk again
+        :return:
+        """
+        self.flush()
+        for array in self.maps():
+            if array._mmap is not None and hasattr(mmap, "MADV_DONTNEED"):
+                array._mmap.madvise(mmap.MADV_DONTNEED)
+            if hasattr(os, "posix_fadvise"):
+                with open(array.filename, "rb") as file:
+                    os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: size of the current value of the fields
+        """
+        return sum(getattr(self.state, name).nbytes for name in EarthState.FIELDS)
+
+    def tiles(self, tile_size: int) -> Iterator[EarthState]:
+        """
+        :param tile_size: side of the tiles [cells]
+        :return: the state, one tile after the other, as views on the files
+        """
+        for start in itertools.product(*(range(0, size, tile_size) for size in self.state.grid_shape)):
+            yield self.state.region(tuple(slice(axis_start, axis_start + tile_size) for axis_start in start))
+
+
+def seed_tile(tile: EarthState, generator: numpy.random.Generator, *, filling_density: float = 0.8):
+    """
+    Fill a state with random cells, drawn as in equivalence.seeded_universe: water, air and land each present with a
+    probability of 0.6, a mass between 100 and 1000 and a temperature between 250 and 350 K
+    :param tile: a state, or a region of one
+    :param generator:
+    :param filling_density: probability of each cell to contain a grid chunk
+    :return:
+    """
+    materials = [COMPONENT_REGISTRY.id(name) for name in ("WATER", "AIR", "LAND")]
+    grid_shape = tile.grid_shape
+    active = generator.uniform(0, 1, grid_shape) < filling_density
+    present = generator.uniform(0, 1, (len(materials),) + grid_shape) < 0.6
+    present[materials.index(COMPONENT_REGISTRY.id("WATER"))] |= ~present.any(axis=0)
+    present &= active
+    mass = numpy.where(present, generator.uniform(100, 1000, present.shape), 0)
+    temperature = generator.uniform(250, 350, present.shape)
+    tile.active[...] = active
+    tile.volume[...] = numpy.where(active, generator.uniform(1, 10, grid_shape), 0)
+    tile.carbon_ppm[...] = 0
+    tile.mass[...] = 0
+    tile.energy[...] = 0
+    tile.mixture_ratio[...] = 0
+    for k, component_id in enumerate(materials):
+        tile.mass[component_id] = mass[k]
+        tile.energy[component_id] = mass[k] * temperature[k] * COMPONENT_REGISTRY.specific_heat_capacity[component_id]
+    tile.modified()
+    refresh_mixture(tile, -1)
+
+
+def seed_store(store: MemmapStore, *, seed: int = 0, filling_density: float = 0.8, tile_size: int = 1024):
+    """
+    Fill the store with random cells, see seed_tile
+    :param store:
+    :param seed:
+    :param filling_density: probability of each cell to contain a grid chunk
+    :param tile_size: side of the tiles filled at once [cells]
+    :return:
+    """
+    generator = numpy.random.default_rng(seed)
+    for tile in store.tiles(tile_size):
+        seed_tile(tile, generator, filling_density=filling_density)
+    store.flush()
+
+
+@dataclass
+class OutOfCoreReport:
+    """
+    Work done by OutOfCorePipeline
+    """
+    ticks: int = 0
+    cells: int = 0  # Cells updated, summed over the ticks
+    seconds: float = 0
+    io_wait: float = 0  # [s] Time spent waiting for a tile to be read
+    bytes_read: int = 0
+    bytes_written: int = 0
+    evictions: int = 0  # Number of times the pages were evicted to stay within the cache budget
+    cache_bytes: Optional[int] = None  # Budget of the emulated page cache, None when only the system limits it
+
+    @property
+    def cells_per_second(self) -> float:
+        return self.cells / self.seconds if self.seconds else float("inf")
+
+    def add(self, other: "OutOfCoreReport"):
+        self.ticks += other.ticks
+        self.cells += other.cells
+        self.seconds += other.seconds
+        self.io_wait += other.io_wait
+        self.bytes_read += other.bytes_read
+        self.bytes_written += other.bytes_written
+        self.evictions += other.evictions
+
+    def __str__(self):
+        cache = "system" if self.cache_bytes is None else f"{self.cache_bytes / 1e6:.0f} MB"
+        return f"page cache {cache}: {self.ticks} ticks, {self.cells_per_second / 1e6:.3f} Mcells/s, read " \
+               f"{self.bytes_read / 1e6 / max(self.seconds, 1e-9):.1f} MB/s, wrote " \
+               f"{self.bytes_written / 1e6 / max(self.seconds, 1e-9):.1f} MB/s, waiting for reads " \
+               f"{self.io_wait / max(self.seconds, 1e-9):.0%} of the time, {self.evictions} evictions"
+
+
+class _Inline:
+    """
+    Executor running the tasks as soon as they are submitted, used when the tiles are not prefetched
+    """
+    @staticmethod
+    def submit(function: Callable, *args) -> Future:
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+    def __enter__(self) -> "_Inline":
+        return self
+
+    def __exit__(self, *exception):
+        pass
+
+
+class OutOfCorePipeline(TickPipeline):
+    """
+    TickPipeline for a state kept in a MemmapStore. Every group of stages is applied tile by tile as the fused pipeline
+    does, each tile and its halo being copied in memory, updated and written in the next files of the fields the group
+    modifies. The next tile is read by another thread while the current one is computed, and the tiles computed are
+    written back by that thread as well, so that at most three tiles are in memory.
+    All the stages must be fusable and streamable.
+    """
+    def __init__(self, stages: list[Stage], store: MemmapStore, *, tile_size: int = 512, periodic: bool = False,
+                 prefetch: bool = True, cache_bytes: int = None):
+        """
+        :param stages:
+        :param store:
+        :param tile_size: side of the tiles [cells]
+        :param periodic: if the borders of the state are linked
+        :param prefetch: read the next tile while computing the current one
+        :param cache_bytes: when given, the pages of the store are evicted every time this many bytes were read and
+        written, which emulates a page cache of that size
+        """
+        super().__init__(stages, fused=True, tile_size=tile_size, periodic=periodic)
+        self.store = store
+        self.prefetch = prefetch
+        self.cache_bytes = cache_bytes
+        self.report = OutOfCoreReport(cache_bytes=cache_bytes)
+        self.__cached = 0  # Bytes read and written since the last eviction
+
+    def run(self, state: EarthState = None):
+        """
+        :param state: ignored, the state of the store is updated
+        :return:
+        """
+        for stage in self.stages:
+            if not stage.fusable or not stage.streamable:
+                raise ValueError(f"{type(stage).__name__} needs the whole grid and cannot be applied out of core")
+        start = time.perf_counter()
+        for group in self.groups():
+            self.__run_group(group, self.store.state)
+        self.report.ticks += 1
+        self.report.cells += self.store.state.active.size
+        self.report.seconds += time.perf_counter() - start
+
+    def __run_group(self, group: list[Stage], state: EarthState):
+        for stage in group:
+            stage.prepare(state)
+        halo = self.margins(group)[0]
+        written = sorted(set().union(*(stage.writes for stage in group)))
+        targets = {name: self.store.next(name) for name in written}
+        starts = list(self.tile_starts(state.grid_shape))
+        with ThreadPoolExecutor(1) if self.prefetch else _Inline() as executor:
+            pending = executor.submit(self.__read, state, starts[0], halo)
+            for k, start in enumerate(starts):
+                waiting = time.perf_counter()
+                positions, tile, interior, local = pending.result()
+                self.report.io_wait += time.perf_counter() - waiting
+                if k + 1 < len(starts):
+                    pending = executor.submit(self.__read, state, starts[k + 1], halo)
+                index = numpy.ravel_multi_index(numpy.ix_(*positions), state.grid_shape)
+                self.apply_group(group, local, index, interior, start)
+                executor.submit(self.__write, targets, tile, local.region(interior))
+                if self.cache_bytes is not None and self.__cached > self.cache_bytes:
+                    self.__cached = 0
+                    self.report.evictions += 1
+                    executor.submit(self.store.evict)
+        self.store.swap(written)
+        for stage in group:
+            stage.finish(state)
+
+    def __read(self, state: EarthState, start: tuple, halo: int) -> tuple[tuple, tuple, tuple, EarthState]:
+        positions, tile, interior = self.window(start, state.grid_shape, halo)
+        if all(len(axis) < 2 or (numpy.diff(axis) == 1).all() for axis in positions):
+            # A plain copy of a view, the thread does not hold the GIL while the pages are read
+            local = state.region(tuple(slice(axis[0], axis[-1] + 1) for axis in positions)).copy()
+        else:
+            local = state.take(positions)
+        size = sum(getattr(local, name).nbytes for name in EarthState.FIELDS)
+        self.report.bytes_read += size
+        self.__cached += size
+        return positions, tile, interior, local
+
+    def __write(self, targets: dict[str, numpy.memmap], tile: tuple, local: EarthState):
+        for name, target in targets.items():
+            values = getattr(local, name)
+            target[((slice(None),) if name in EarthState.COMPONENT_FIELDS else ()) + tile] = values
+            self.report.bytes_written += values.nbytes
+            self.__cached += values.nbytes
+
+
+def measure_throughput(directory: str, shape: tuple, ticks: int, cache_sizes: list[Optional[int]], *,
+                       tile_size: int = 512, precision: str = "float32", seed: int = 0,
+                       prefetch: bool = True) -> list[OutOfCoreReport]:
+    """
+    Update a seeded out-of-core earth through Universe.update_all with pages caches of different sizes
+    :param directory: where the files of the earth are created
+    :param shape: shape of the earth
+    :param ticks: number of ticks for each cache size
+    :param cache_sizes: [bytes] budgets of the emulated page cache, None to leave it to the system
+    :param tile_size: side of the tiles [cells]
+    :param precision:
+    :param seed:
+    :param prefetch:
+    :return: the throughput obtained with each cache size
+    """
+    from models.physical_class.universe import Universe
+    from models.ticking_class.ticking_earth import OutOfCoreEarth
+    from models.ticking_class.ticking_sun import TickingSun
+
+    store = MemmapStore.create(directory, shape, precision=precision)
+    seed_store(store, seed=seed)
+    reports = []
+    for cache_bytes in cache_sizes:
+        store.evict()  # Every measure starts from the disk
+        universe = Universe()
+        universe.earth = OutOfCoreEarth(store, parent=universe)
+        universe.earth.TILE_SIZE, universe.earth.PREFETCH, universe.earth.cache_bytes = tile_size, prefetch, cache_bytes
+        universe.sun = TickingSun()
+        universe.discover_everything()
+        for _ in range(ticks):
+            universe.update_all()
+        universe.synchronize()
+        reports.append(universe.earth.report)
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the throughput of an out-of-core earth for several sizes of "
+                                                 "the page cache")
+    parser.add_argument("directory", help="where the files of the earth are created")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("--ticks", type=int, default=3)
+    parser.add_argument("--cache-mb", type=float, nargs="*", default=[],
+                        help="budgets of the emulated page cache, the system one is always measured first")
+    parser.add_argument("--tile-size", type=int, default=512)
+    parser.add_argument("--precision", default="float32", choices=EarthState.PRECISIONS)
+    parser.add_argument("--no-prefetch", action="store_true")
+    arguments = parser.parse_args()
+    for report in measure_throughput(arguments.directory, (arguments.width, arguments.height), arguments.ticks,
+                                     [None] + [int(size * 1e6) for size in arguments.cache_mb],
+                                     tile_size=arguments.tile_size, precision=arguments.precision,
+                                     prefetch=not arguments.no_prefetch):
+        print(report)
@@ -0,0 +1,170 @@
+import json
+from typing import Optional
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+
+# Color of each pure component when drawn, mixtures are drawn with the average of the colors weighted by the mass ratios
+COMPONENT_COLORS: dict[str, tuple[int, int, int]] = {
+    "WATER": (0, 0, 255),  # blue
+    "AIR": (255, 255, 255),  # white
+    "LAND": (165, 42, 42),  # brown
+    "ARGON": (238, 130, 238),  # violet
+    "NITROGEN": (176, 196, 222),  # lightsteelblue
+    "OXYGEN": (0, 255, 255),  # cyan
+}
+UNKNOWN_COLOR = (128, 128, 128)  # Components registered without a color
+EMPTY_COLOR = (0, 0, 0)  # Cells without grid chunk
+
+
+def component_colors() -> numpy.ndarray:
+    """
+    :return: (component, 3) color of each component of EarthState.COMPONENTS
+    """
+    return numpy.array([COMPONENT_COLORS.get(name, UNKNOWN_COLOR) for name in EarthState.COMPONENTS], dtype=numpy.int64)
+
+
+def mix_colors(ratios: numpy.ndarray) -> numpy.ndarray:
+    """
+    :param ratios: (..., component) mass ratios
+    :return: (..., 3) uint8 color of each composition, each component adding its color times its ratio, truncated
+    """
+    colors = component_colors()
+    return numpy.floor(ratios[..., :, None] * colors).astype(numpy.int64).sum(axis=-2).clip(0, 255).astype(numpy.uint8)
+
+
+def pack(colors: numpy.ndarray) -> numpy.ndarray:
+    """
+    :param colors: (..., 3) uint8
+    :return: (...) the colors as 0xRRGGBB integers
+    """
+    colors = numpy.asarray(colors).astype(numpy.uint32)
+    return (colors[..., 0] << 16) | (colors[..., 1] << 8) | colors[..., 2]
+
+
+class Palette:
+    """
+    Bounded set of compositions of grid chunks, each with its own color, to convert an earth to an image and back.
+    Converting an image looks up the palette entry of each distinct color once, the pixels are then mapped to their
+    entry with array operations. A color that is not in the palette is mapped to the entry with the nearest color.
+    The code of a pixel is its position in the palette, -1 for an empty cell (EMPTY_COLOR).
+    """
+    MAX_COLORS: int = 256
+    TEXT_KEY: str = "UndCliMo palette"  # Key of the text of the images in which the palette is saved
+
+    def __init__(self, ratios: numpy.ndarray, colors: numpy.ndarray = None):
+        """
+        :param ratios: (entry, component) mass ratios of each composition
+        :param colors: (entry, 3) uint8 color of each composition, mixed from the ratios by default
+        """
+        ratios = numpy.asarray(ratios, dtype=numpy.float64).reshape((-1, len(EarthState.COMPONENTS)))
+        if len(ratios) > self.MAX_COLORS:
+            raise ValueError(f"A palette has at most {self.MAX_COLORS} colors, got {len(ratios)}")
+        self.ratios = ratios
+        self.colors = self.__distinct(mix_colors(ratios) if colors is None else numpy.asarray(colors, numpy.uint8))
+        self.__keys = pack(self.colors)
+        self.__order = numpy.argsort(self.__keys)
+
+    def __len__(self):
+        return len(self.ratios)
+
+    @staticmethod
+    def __distinct(colors: numpy.ndarray) -> numpy.ndarray:
+        """
+        Two compositions may mix to the same color, the later ones are moved to the nearest free color
+        :param colors: (entry, 3) uint8
+        :return:
+        """
+        taken = {int(pack(EMPTY_COLOR))}
+        colors = colors.copy()
+        for color in colors:
+            step = 0
+            while int(pack(color)) in taken:
+                step += 1
+                color[2] = (int(color[2]) + (step if step % 2 else -step)) % 256  # Search around the blue channel
+            taken.add(int(pack(color)))
+        return colors
+
+    @classmethod
+    def default(cls) -> "Palette":
+        """
+        :return: the palette of the pure components
+        """
+        return cls(numpy.eye(len(EarthState.COMPONENTS)))
+
+    @classmethod
+    def from_state(cls, state: EarthState) -> tuple["Palette", numpy.ndarray]:
+        """
+        :param state:
+        :return: the palette of the compositions of the state and (*grid_shape) the code of each cell. Beyond
+            MAX_COLORS compositions, the least common ones get the code of the nearest kept composition
+        """
+        total_mass = state.mass.sum(axis=0)
+        ratios = numpy.divide(state.mass, total_mass, out=numpy.zeros(state.mass.shape), where=total_mass > 0)
+        ratios = state.flat(ratios).T[state.active.ravel()].round(6)  # Merges the compositions equal up to rounding
+        codes = numpy.full(state.active.size, -1, dtype=numpy.int64)
+        if not len(ratios):
+            return cls(numpy.zeros((0, len(EarthState.COMPONENTS)))), codes.reshape(state.active.shape)
+        compositions, inverse, counts = numpy.unique(ratios, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        if len(compositions) > cls.MAX_COLORS:
+            kept = numpy.argsort(-counts, kind="stable")[:cls.MAX_COLORS]
+            distance = ((compositions[:, None, :] - compositions[None, kept, :]) ** 2).sum(axis=2)
+            inverse = distance.argmin(axis=1)[inverse]
+            compositions = compositions[kept]
+        codes[state.active.ravel()] = inverse
+        return cls(compositions), codes.reshape(state.active.shape)
+
+    def pixels(self, codes: numpy.ndarray) -> numpy.ndarray:
+        """
+        :param codes: (...) codes of the cells
+        :return: (..., 3) uint8 color of the cells
+        """
+        colors = numpy.concatenate([self.colors, numpy.array([EMPTY_COLOR], dtype=numpy.uint8)])
+        return colors[codes]  # -1 is the last row, the empty color
+
+    def codes(self, pixels: numpy.ndarray) -> numpy.ndarray:
+        """
+        :param pixels: (..., 3) uint8 colors
+        :return: (...) code of the entry with the nearest color of each pixel, -1 when the empty color is the nearest
+        """
+        keys = pack(pixels)
+        codes = numpy.full(keys.shape, -1, dtype=numpy.int64)
+        if len(self):
+            # The colors of the palette are found by a binary search, without going through the distinct colors
+            sorted_keys = self.__keys[self.__order]
+            positions = numpy.searchsorted(sorted_keys, keys).clip(0, len(self) - 1)
+            exact = sorted_keys[positions] == keys
+            codes[exact] = self.__order[positions[exact]]
+        else:
+            exact = numpy.zeros(keys.shape, dtype=bool)
+        others = ~exact & (keys != pack(EMPTY_COLOR))
+        if others.any():
+            distinct, inverse = numpy.unique(keys[others], return_inverse=True)
+            colors = numpy.stack([distinct >> 16, (distinct >> 8) & 0xFF, distinct & 0xFF], axis=1).astype(numpy.int64)
+            candidates = numpy.concatenate([self.colors, numpy.array([EMPTY_COLOR], dtype=numpy.uint8)])
+            distance = ((colors[:, None, :] - candidates[None, :, :].astype(numpy.int64)) ** 2).sum(axis=2)
+            nearest = distance.argmin(axis=1)
+            codes[others] = numpy.where(nearest == len(self), -1, nearest)[inverse.ravel()]
+        return codes
+
+    def to_text(self) -> str:
+        return json.dumps({"components": list(EarthState.COMPONENTS), "ratios": self.ratios.tolist(),
+                           "colors": self.colors.tolist()})
+
+    @classmethod
+    def from_text(cls, text: Optional[str]) -> "Palette":
+        """
+        :param text: a palette saved by to_text, possibly with other components
+        :return: the palette, the default one when there is no text
+        """
+        if not text:
+            return cls.default()
+        saved = json.loads(text)
+        ratios = numpy.zeros((len(saved["ratios"]), len(EarthState.COMPONENTS)))
+        for position, name in enumerate(saved["components"]):
+            if name not in EarthState.COMPONENTS:
+                raise ValueError(f"Unknown component {name} in the palette")
+            ratios[:, EarthState.COMPONENTS.index(name)] = [entry[position] for entry in saved["ratios"]]
+        return cls(ratios, numpy.array(saved["colors"], dtype=numpy.uint8).reshape((-1, 3)))
@@ -0,0 +1,326 @@
+import argparse
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+import numpy
+
+from models.array_class.diffusion import refresh_mixture
+from models.array_class.earth_state import EarthState
+from models.physical_class.grid_chunk import GridChunk
+
+if TYPE_CHECKING:
+    from models.physical_class.universe import Universe
+
+
+@dataclass
+class UniverseSettings:
+    """
+    Everything needed to build, in another process, a universe that updates like the original one: the settings of
+    the universe and of its bodies, and the layout of the grid chunks of the earth. The state of the grid chunks is
+    given separately as an EarthState.
+    """
+    UNIVERSE_CONSTANTS = ("TIME_DELTA", "EVAPORATION_RATE", "ENGINE", "SYNC_INTERVAL", "TILE_SIZE",
+                          "DORMANT_THRESHOLD", "PRECISION")
+    EARTH_CONSTANTS = ("albedo", "CARBON_EMISSIONS_PER_TIME_DELTA", "CARBON_DIFFUSIVITY", "SPECTRAL_DIFFUSION")
+    SUN_CONSTANTS = ("total_energy", "energy_radiated_per_second", "radius")
+
+    universe_constants: dict
+    earth_class: type
+    earth_constants: dict
+    shape: tuple
+    radius: float
+    periodic: bool
+    wind: Optional[numpy.ndarray]  # Must be picklable when it is a function of the time
+    chunk_classes: list[Optional[type]]  # Class of the grid chunk at each index
+    sun_class: Optional[type]
+    sun_constants: dict
+    enabled_rules: dict[tuple[str, str], bool] = field(default_factory=dict)  # (module, name) -> enabled
+
+    @classmethod
+    def from_universe(cls, universe: "Universe") -> "UniverseSettings":
+        from models.ABC.ticking_model import TickingModel
+
+        earth, sun = universe.earth, universe.sun
+        return cls(universe_constants={name: getattr(universe, name) for name in cls.UNIVERSE_CONSTANTS},
+                   earth_class=type(earth),
+                   earth_constants={name: getattr(earth, name) for name in cls.EARTH_CONSTANTS if hasattr(earth, name)},
+                   shape=tuple(earth.shape), radius=earth.radius, periodic=earth.periodic, wind=earth.wind,
+                   chunk_classes=[None if chunk is None else type(chunk) for chunk in earth],
+                   sun_class=None if sun is None else type(sun),
+                   sun_constants={} if sun is None else {name: getattr(sun, name) for name in cls.SUN_CONSTANTS},
+                   enabled_rules={(method.__module__, method.__name__): method.enabled
+                                  for method in TickingModel.on_tick_methods})
+
+    def build(self, state: EarthState) -> "Universe":
+        """
+        :param state: state of the earth, only its layout (volume, carbon, active cells) is used
+        :return: a new universe with these settings, in which any earth state of the same layout can be written
+        """
+        from models.ABC.ticking_model import TickingModel
+        from models.physical_class.universe import Universe
+
+        for name, value in self.universe_constants.items():
+            setattr(Universe, name, value)
+        for method in TickingModel.on_tick_methods:
+            method.enabled = self.enabled_rules.get((method.__module__, method.__name__), method.enabled)
+        universe = Universe()
+        universe.earth = self.earth_class(shape=self.shape, radius=self.radius, parent=universe,
+                                          periodic=self.periodic)
+        for name, value in self.earth_constants.items():
+            setattr(universe.earth, name, value)
+        universe.earth.wind = self.wind
+        volume, carbon_ppm = state.volume.ravel(), state.carbon_ppm.ravel()
+        for index, chunk_class in enumerate(self.chunk_classes):
+            if chunk_class is not None:
+                universe.earth[index] = chunk_class([], volume=volume[index], carbon_ppm=carbon_ppm[index],
+                                                    index=index, earth=universe.earth)
+        if self.sun_class is not None:
+            universe.sun = self.sun_class()
+            for name, value in self.sun_constants.items():
+                setattr(universe.sun, name, value)
+        universe.discover_everything()
+        return universe
+
+
+@dataclass
+class PararealReport:
+    """
+    Result of Universe.run_parareal
+    """
+    ticks: int
+    slices: int
+    workers: int
+    iterations: int = 0
+    converged: bool = False
+    seconds: float = 0  # Wall clock time of the run
+    # Wall clock time of a serial run of the same ticks by one worker, when it was measured (see run_parareal)
+    serial_seconds: Optional[float] = None
+    serial_error: Optional[float] = None  # Largest relative difference between the result and the serial run
+    corrections: list[float] = field(default_factory=list)  # Largest relative change of the state at each iteration
+
+    @property
+    def speedup(self) -> float:
+        """
+        :return: how much faster than the serial run the run was, nan when the serial run was not measured
+        """
+        if self.serial_seconds is None:
+            return float("nan")
+        return self.serial_seconds / self.seconds if self.seconds else float("inf")
+
+    def __str__(self):
+        res = f"{self.ticks} ticks in {self.slices} slices on {self.workers} workers: {self.iterations} iterations " \
+              f"({'converged' if self.converged else 'not converged'}), {self.seconds:.3f} s"
+        if self.serial_seconds is not None:
+            res += f", serial run {self.serial_seconds:.3f} s, speedup x{self.speedup:.2f}, max relative difference " \
+                   f"with the serial run {self.serial_error:.3g}"
+        res += "\n"
+        res += "\n".join(f"- iteration {i + 1}: max relative change {change:.3g}"
+                         for i, change in enumerate(self.corrections))
+        return res
+
+
+_worker_universe: Optional["Universe"] = None  # Universe of the current worker process, see _start_worker
+
+
+def _start_worker(settings: UniverseSettings, state: EarthState):
+    global _worker_universe
+    _worker_universe = settings.build(state)
+
+
+def _propagate(state: EarthState, start_tick: int, ticks: int, coarse_factor: int) -> tuple[EarthState, float]:
+    """
+    Run the universe of the worker from the state
+    :param state: state of the earth at start_tick
+    :param start_tick:
+    :param ticks: number of ticks of TIME_DELTA to cover
+    :param coarse_factor: 1 for the fine propagator, else the number of ticks covered by each coarse step. The coarse
+        steps are taken by the array engine with the implicit diffusion, the explicit stencil being unstable with long
+        steps
+    :return: the state of the earth at start_tick + ticks and the time taken [s]
+    """
+    start = time.perf_counter()
+    universe = _worker_universe
+    earth = universe.earth
+    time_delta = universe.TIME_DELTA
+    coarse = coarse_factor > 1
+    universe.ENGINE = "array" if coarse else type(universe).ENGINE
+    earth.IMPLICIT_DIFFUSION = coarse
+    steps = max(1, round(ticks / coarse_factor))
+    if hasattr(earth, "release_array_state"):
+        earth.release_array_state()
+    state.write_to(earth)
+    earth.modified()
+    for body in universe:
+        if body is not None:
+            body._t = round(start_tick * steps / ticks) if ticks else start_tick
+    universe._t = earth._t
+    type(universe).TIME_DELTA = time_delta * ticks / steps
+    try:
+        for _ in range(steps):
+            universe.update_all()
+        universe.synchronize()
+    finally:
+        type(universe).TIME_DELTA = time_delta
+    return EarthState.from_earth(earth), time.perf_counter() - start
+
+
+def _correct(coarse: EarthState, fine: EarthState, previous_coarse: EarthState) -> EarthState:
+    """
+    Parareal update: fine + (coarse - previous_coarse), on the fields changed by the ticks
+    :param coarse: coarse propagation of the new start of the slice
+    :param fine: fine propagation of the previous start of the slice
+    :param previous_coarse: coarse propagation of the previous start of the slice
+    :return:
+    """
+    state = fine.copy()
+    state.mass[...] = numpy.maximum(0, fine.mass + (coarse.mass - previous_coarse.mass))
+    state.energy[...] = numpy.where(state.mass > 0, fine.energy + (coarse.energy - previous_coarse.energy), 0)
+    state.carbon_ppm[...] = fine.carbon_ppm + (coarse.carbon_ppm - previous_coarse.carbon_ppm)
+    state.modified()
+    refresh_mixture(state, GridChunk.MIXTURE_THRESHOLD)
+    return state
+
+
+def _relative_change(new: EarthState, old: EarthState) -> float:
+    change = 0
+    for name in ("mass", "energy", "carbon_ppm"):
+        scale = max(numpy.abs(getattr(old, name)).max(initial=0), 1e-300)
+        change = max(change, numpy.abs(getattr(new, name) - getattr(old, name)).max(initial=0) / scale)
+    return float(change)
+
+
+def best_speedup(slices: int, workers: int, *, coarse_factor: int = 10, cores: int = None) -> float:
+    """
+    Upper bound of the speedup of run_parareal over a serial run. At best the run stops after two iterations (the
+    corrections of the first one are only known at the second one), each running the fine propagator of the slices
+    on as many cores as are available, followed by the coarse propagator over the whole window, one slice after the
+    other, as costly as a fine step for every coarse_factor ticks
+    :param slices:
+    :param workers:
+    :param coarse_factor:
+    :param cores: defaults to the number of cores of the machine
+    :return: below 1, the Parareal run can only be slower than the serial run
+    """
+    parallel = max(1, min(slices, workers, cores or os.cpu_count() or 1))
+    iteration = math.ceil(slices / parallel) / slices + 1 / coarse_factor  # Fraction of the serial run
+    return 1 / (min(2, slices) * iteration)
+
+
+def run_parareal(universe: "Universe", ticks: int, *, slices: int = None, workers: int = None, coarse_factor: int = 10,
+                 tolerance: float = 1e-6, max_iterations: int = None, measure_serial: bool = False) -> PararealReport:
+    """
+    Advance the universe by ticks with the Parareal algorithm. The time window is split in slices. A coarse
+    propagator (implicit steps of coarse_factor * TIME_DELTA) gives a first guess of the state at the start of every
+    slice, then at each iteration the fine propagator (the usual update_all) runs every slice concurrently from these
+    guesses, and the guesses are corrected one after the other with the coarse propagator. The first k slices are exact
+    after k iterations, so the result is the one of a serial run at the latest after `slices` iterations (which is then
+    slower than the serial run and not reported as converged), and sooner when the corrections fall below the
+    tolerance.
+    Only the state of the grid chunks is propagated, the earth and the universe then continue from it. Only the time is
+    coarsened, so the run is faster than the serial one only with enough cores, see best_speedup.
+    :param universe:
+    :param ticks:
+    :param slices: number of slices of the time window, defaults to the number of workers
+    :param workers: number of processes, defaults to the number of cores
+    :param coarse_factor: number of ticks covered by each step of the coarse propagator
+    :param tolerance: largest relative change of the state between two iterations for which the run has converged
+    :param max_iterations: defaults to slices
+    :param measure_serial: before the Parareal run, time a serial run of the same ticks by one of the workers and
+        compare the results, see PararealReport.speedup
+    :return:
+    """
+    workers = workers or os.cpu_count() or 1
+    slices = max(1, min(slices or workers, ticks))
+    max_iterations = min(max_iterations or slices, slices)
+    report = PararealReport(ticks, slices, workers)
+    universe.synchronize()
+    initial = EarthState.from_earth(universe.earth)
+    bounds = [round(i * ticks / slices) for i in range(slices + 1)]
+    spans = [(bounds[i], bounds[i + 1] - bounds[i]) for i in range(slices)]
+
+    with ProcessPoolExecutor(workers, initializer=_start_worker,
+                             initargs=(UniverseSettings.from_universe(universe), initial)) as pool:
+        serial = None
+        if measure_serial:
+            serial, report.serial_seconds = pool.submit(_propagate, initial, 0, ticks, 1).result()
+        start = time.perf_counter()
+
+        def coarse(state: EarthState, i: int) -> EarthState:
+            return pool.submit(_propagate, state, *spans[i], coarse_factor).result()[0]
+
+        # First guess, U[i + 1] = G(U[i])
+        starts = [initial]
+        coarse_results = []
+        for i in range(slices):
+            coarse_results.append(coarse(starts[i], i))
+            starts.append(coarse_results[i])
+
+        exact = 0  # The starts of the slices up to this one are exact
+        while report.iterations < max_iterations:
+            futures = [pool.submit(_propagate, starts[i], *spans[i], 1) for i in range(exact, slices)]
+            fine_results = [None] * exact + [future.result()[0] for future in futures]
+            report.iterations += 1
+            # The fine result of the first slice that was not exact is exact, the others are corrected
+            new_starts = starts[:exact + 1] + [fine_results[exact]]
+            new_coarse_results = coarse_results[:exact + 1]
+            for i in range(exact + 1, slices):
+                new_coarse_results.append(coarse(new_starts[i], i))
+                new_starts.append(_correct(new_coarse_results[i], fine_results[i], coarse_results[i]))
+            change = max((_relative_change(new, old) for new, old in zip(new_starts[exact + 1:], starts[exact + 1:])),
+                         default=0)
+            report.corrections.append(change)
+            starts, coarse_results, exact = new_starts, new_coarse_results, exact + 1
+            if change <= tolerance:
+                report.converged = True
+                break
+            if exact == slices:
+                break  # Every slice was propagated by the fine propagator one after the other, as in a serial run
+        report.seconds = time.perf_counter() - start
+
+    earth = universe.earth
+    if hasattr(earth, "release_array_state"):
+        earth.release_array_state()
+    starts[-1].write_to(earth)
+    earth.modified()
+    for body in (*universe, universe):
+        if body is not None and hasattr(body, "_t"):
+            body._t += ticks
+    if serial is not None:
+        report.serial_error = _relative_change(starts[-1], serial)
+    return report
+
+
+if __name__ == "__main__":
+    from models.array_class.equivalence import seeded_universe
+
+    parser = argparse.ArgumentParser(description="Run a seeded universe with the Parareal algorithm")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--slices", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--coarse-factor", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=1e-6)
+    parser.add_argument("--engine", default="array")
+    parser.add_argument("--force", action="store_true", help="run even if it cannot be faster than a serial run")
+    arguments = parser.parse_args()
+    chosen_workers = arguments.workers or os.cpu_count() or 1
+    chosen_slices = max(1, min(arguments.slices or chosen_workers, arguments.ticks))
+    bound = best_speedup(chosen_slices, chosen_workers, coarse_factor=arguments.coarse_factor)
+    if bound < 1 and not arguments.force:
+        sys.exit(f"With {chosen_slices} slices on {min(chosen_workers, os.cpu_count() or 1)} cores, the Parareal run "
+                 f"is at best x{bound:.2f} the speed of a serial run, run the universe serially instead (or use "
+                 f"--force to measure it anyway)")
+    seeded = seeded_universe((arguments.width, arguments.height))
+    seeded.ENGINE = arguments.engine
+    report = run_parareal(seeded, arguments.ticks, slices=arguments.slices, workers=arguments.workers,
+                          coarse_factor=arguments.coarse_factor, tolerance=arguments.tolerance, measure_serial=True)
+    print(report)
+    if report.speedup < 1:
+        print(f"Warning: slower than the serial run (x{report.speedup:.2f})", file=sys.stderr)
+    print(seeded.summary)
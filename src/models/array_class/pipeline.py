@@ -0,0 +1,598 @@
+import itertools
+from abc import abstractmethod
+from typing import Iterable, Iterator, Optional
+
+import numpy
+
+from models.array_class import advection, carbon, diffusion, evaporation
+from models.array_class.carbon import CarbonBudget
+from models.array_class.cell_rules import CompiledCellRule
+from models.array_class.earth_state import EarthState
+from models.array_class.field_rules import FieldRule
+
+
+class Stage:
+    """
+    One step of a tick, applied on an EarthState.
+
+    A stage is element-wise when each cell only needs itself (halo = 0) and a stencil when it needs its neighbours up to
+    `halo` cells away. Those stages can be fused with their neighbouring stages and applied tile by tile. Stages that
+    need the whole grid at once (fusable = False) are barriers between the fused groups.
+    The values that depend on the whole grid (sums, counts, ...) must be computed in `prepare`, from the fields listed
+    in `reads`.
+    A stage is skippable when it changes nothing once the cells reached their equilibrium, in which case it is not
+    applied on the dormant tiles (see TileActivity). The other stages are forcings, applied everywhere on every tick.
+    A fusable stage is streamable when `prepare` and `finish` do not allocate arrays of the size of the grid, so that
+    it can be applied on a state larger than the memory (see models.array_class.out_of_core).
+    """
+    halo: int = 0
+    fusable: bool = True
+    skippable: bool = True
+    streamable: bool = True
+    reads: frozenset[str] = frozenset()  # Fields read by prepare
+    writes: frozenset[str] = frozenset()  # Fields modified by apply
+
+    def prepare(self, state: EarthState):
+        """
+        Called on the whole state before the stage is applied
+        :param state:
+        :return:
+        """
+
+    @abstractmethod
+    def apply(self, state: EarthState, index: numpy.ndarray, periodic: bool):
+        """
+        Apply the stage on the state, which can be only a part (tile) of the earth
+        :param state:
+        :param index: index in the Earth of each cell of the state
+        :param periodic: if the borders of the state are linked
+        :return:
+        """
+
+    def finish(self, state: EarthState):
+        """
+        Called on the whole state once the stage has been applied everywhere
+        :param state:
+        :return:
+        """
+
+    def forcing(self) -> tuple:
+        """
+        :return: the parameters of the stage, every tile is woken up when they change from one tick to the next
+        """
+        return ()
+
+
+class StencilDiffusionStage(Stage):
+    halo = 1
+    reads = frozenset({"active", "volume", "specific_heat_capacity", "heat_transfer_coefficient"})
+    writes = frozenset({"energy"})
+
+    def __init__(self, time_delta: float, *, cache: diffusion.ConductanceCache = None, cached: bool = True):
+        """
+        :param time_delta:
+        :param cache: conductances kept from the previous ticks
+        :param cached: if False, the conductances are computed on each tile instead of being kept for the whole grid
+        """
+        self.time_delta = time_delta
+        self.cache = None
+        if cached:
+            self.cache = cache if cache is not None else diffusion.ConductanceCache()
+        else:
+            self.reads = frozenset()
+
+    def prepare(self, state: EarthState):
+        if self.cache is not None:
+            self.cache.update(state)
+
+    def apply(self, state: EarthState, index: numpy.ndarray, periodic: bool):
+        diffusion.stencil_diffusion(state, self.time_delta, periodic=periodic, index=index, cache=self.cache)
+
+    def forcing(self) -> tuple:
+        return self.time_delta,
+
+
+class MixtureStage(Stage):
+    """
+    Refresh of the mixture properties of the cells whose composition changed, see diffusion.refresh_mixture
+    """
+    writes = frozenset({"specific_heat_capacity", "heat_transfer_coefficient", "mixture_ratio"})
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+
+    def apply(self, state: EarthState, index: numpy.ndarray, periodic: bool):
+        diffusion.refresh_mixture(state, self.threshold)
+
+    def forcing(self) -> tuple:
+        return self.threshold,
+
+
+class SpectralDiffusionStage(Stage):
+    fusable = False
+    writes = frozenset({"energy"})
+
+    def __init__(self, time_delta: float):
+        self.time_delta = time_delta
+
+    def apply(self, state: EarthState, index: numpy.ndarray, periodic: bool):
+        diffusion.spectral_diffusion(state, self.time_delta)
+
+    def forcing(self) -> tuple:
+        return self.time_delta,
+
+
+class ImplicitDiffusionStage(Stage):
+    """
+    Diffusion stable for any time_delta, see diffusion.implicit_diffusion
+    """
+    fusable = False
+    writes = frozenset({"energy"})
+
+    def __init__(self, time_delta: float, *, cache: diffusion.ConductanceCache = None):
+        self.time_delta = time_delta
+        self.cache = cache if cache is not None else diffusion.ConductanceCache()
+
+    def prepare(self, state: EarthState):
+        self.cache.update(state)
+
+    def apply(self, state: EarthState, index: numpy.ndarray, periodic: bool):
+        diffusion.implicit_diffusion(state, self.time_delta, periodic=periodic, cache=self.cache)
+
+    def forcing(self) -> tuple:
+        return self.time_delta,
+
+
+class AdvectionStage(Stage):
+    fusable = False
+    writes = frozenset({"mass", "energy", "carbon_ppm"})
+
+    def __init__(self, wind: numpy.ndarray, time_delta: float):
+        self.wind = wind
+        self.time_delta = time_delta
+
+    def apply(self, state: EarthState, index: numpy.ndarray, periodic: bool):
+        advection.semi_lagrangian_advection(state, self.wind, self.time_delta, periodic=periodic)
+
+    def forcing(self) -> tuple:
+        return self.time_delta, hash(numpy.ascontiguousarray(self.wind).tobytes())
+
+
+class CarbonStage(Stage):
+    skippable = False  # The emissions and the flows are spread over the whole earth
+    streamable = False  # The flows of every cell are kept for the budget
+    reads = frozenset({"mass", "active"})
+    writes = frozenset({"carbon_ppm"})
+    budget: Optional[CarbonBudget] = None
+
+    def __init__(self, **flows: float):
+        self.flows = flows
+        self.total_weights = {}
+        self.cell_flows = {}
+
+    def prepare(self, state: EarthState):
+        self.total_weights = {name: state.total(weights) for name, weights in carbon.carbon_weights(state).items()}
+        self.cell_flows = {name: numpy.zeros(state.grid_shape, dtype=state.dtype) for name in carbon.FLOWS}
+
+    def apply(self, state: EarthState, index: numpy.ndarray, periodic: bool):
+        for name, flow in carbon.apply_carbon_flows(state, self.flows, self.total_weights).items():
+            self.cell_flows[name].flat[index] = flow
+
+    def finish(self, state: EarthState):
+        self.budget = CarbonBudget(**{name: state.total(flow) for name, flow in self.cell_flows.items()},
+                                   total=state.total(state.carbon_ppm[state.active]))
+
+    def forcing(self) -> tuple:
+        return tuple(sorted(self.flows.items()))
+
+
+class EvaporationStage(Stage):
+    writes = frozenset({"mass", "energy"})
+
+    def __init__(self, rate: float, time_delta: float, *, where: numpy.ndarray = None):
+        self.rate = rate
+        self.time_delta = time_delta
+        self.where = where
+
+    def apply(self, state: EarthState, index: numpy.ndarray, periodic: bool):
+        where = None if self.where is None else self.where.flat[index]
+        evaporation.water_evaporation(state, self.rate, self.time_delta, where=where)
+
+    def forcing(self) -> tuple:
+        return self.rate, self.time_delta
+
+
+class CellRuleStage(Stage):
+    """
+    A per cell rule of the grid chunks, compiled into a loop over the arrays
+    """
+    def __init__(self, rule: CompiledCellRule, *, where: numpy.ndarray = None):
+        self.rule = rule
+        self.where = where
+        self.writes = rule.writes
+
+    def apply(self, state: EarthState, index: numpy.ndarray, periodic: bool):
+        where = None if self.where is None else self.where.flat[index]
+        if all(getattr(state, name).flags.c_contiguous for name in self.rule.fields):
+            self.rule(state, where=where)
+            return
+        # The compiled loop works on flat arrays, the fields it uses are copied when the state is a part of the earth
+        key = tuple(slice(None) for _ in state.grid_shape)
+        contiguous = state.window(key, self.rule.fields)
+        self.rule(contiguous, where=where)
+        state.assign(key, contiguous, self.writes)
+
+    def forcing(self) -> tuple:
+        return self.rule.function.__qualname__, *self.rule.external_values()
+
+
+class FieldRuleStage(Stage):
+    """
+    A rule written as expressions over the fields of the earth
+    """
+    def __init__(self, rule: FieldRule, constants: dict[str, float]):
+        self.rule = rule
+        self.constants = constants
+        self.halo = 1 if rule.uses_neighbours else 0
+        self.writes = rule.written_fields
+
+    def apply(self, state: EarthState, index: numpy.ndarray, periodic: bool):
+        self.rule.apply(state, self.constants, periodic=periodic)
+
+    def forcing(self) -> tuple:
+        return self.rule.__name__, tuple(sorted(self.constants.items()))
+
+
+class DepositStage(Stage):
+    """
+    Array version of Earth.add_energy: the energy is split evenly between the chunks
+    """
+    skippable = False
+    reads = frozenset({"active"})
+    writes = frozenset({"energy"})
+
+    def __init__(self, energy: float):
+        self.energy = energy
+        self.energy_each = 0
+
+    def prepare(self, state: EarthState):
+        self.energy_each = self.energy / (int(state.active.sum()) or 1)
+
+    def apply(self, state: EarthState, index: numpy.ndarray, periodic: bool):
+        if self.energy_each:
+            state.add_energy(numpy.where(state.active, self.energy_each, 0))
+
+    def forcing(self) -> tuple:
+        return self.energy,
+
+
+class TileActivity:
+    """
+    Tracks which tiles of a pipeline are still changing.
+    A tile is awake on a tick when, on the previous tick, the skippable stages changed its own cells or the cells of a
+    neighbouring tile by more than the threshold (largest relative change of mass, energy or carbon). The skippable
+    stages are not applied on the dormant tiles, the forcings still are. Without fusion, the skippable stages are
+    applied on the box around the awake tiles (see awake_box) instead of tile by tile.
+    Every tile is woken up when the forcings of the stages change, when wake is called (edited chunks) and every
+    recheck_interval ticks, so that the slow changes brought by the forcings are not missed.
+    """
+    FIELDS = ("mass", "energy", "carbon_ppm")
+
+    def __init__(self, grid_shape: tuple, tile_size: int, threshold: float, *, recheck_interval: int = 16):
+        """
+        :param grid_shape:
+        :param tile_size: side of the tiles [cells], as used by the pipeline
+        :param threshold: relative change below which a tile is dormant
+        :param recheck_interval: [ticks]
+        """
+        self.grid_shape = grid_shape
+        self.tile_size = tile_size
+        self.threshold = threshold
+        self.recheck_interval = recheck_interval
+        self.shape = tuple(-(-size // tile_size) for size in grid_shape)  # Number of tiles along each axis
+        self.awake = numpy.ones(self.shape, dtype=bool)
+        self.changed = numpy.zeros(self.shape, dtype=bool)  # Tiles that changed during the current tick
+        self.forcings: Optional[list] = None
+        self.ticks = 0
+
+    def wake(self, index: int = None):
+        """
+        :param index: index in the Earth of an edited cell, its tile and the neighbouring ones are woken up. Every tile
+        when None
+        :return:
+        """
+        if index is None:
+            self.awake[...] = True
+            return
+        edited = numpy.zeros(self.shape, dtype=bool)
+        edited[self.tile_position(numpy.unravel_index(index, self.grid_shape))] = True
+        self.awake |= self.__neighbourhood(edited, periodic=True)
+
+    def start_tick(self, stages: list[Stage]):
+        forcings = [(type(stage), stage.forcing()) for stage in stages]
+        if forcings != self.forcings or self.ticks % max(1, self.recheck_interval) == 0:
+            self.awake[...] = True
+        self.forcings = forcings
+        self.changed[...] = False
+
+    def end_tick(self, periodic: bool):
+        self.awake = self.__neighbourhood(self.changed, periodic)
+        self.ticks += 1
+
+    def tile_position(self, start: tuple) -> tuple:
+        return tuple(axis_start // self.tile_size for axis_start in start)
+
+    def record(self, position: tuple, before: dict[str, numpy.ndarray], after: EarthState):
+        """
+        :param position: position of the tile
+        :param before: the fields of the tile before a skippable stage
+        :param after: the tile after the stage
+        :return:
+        """
+        if not self.changed[position]:
+            self.changed[position] = any(self.exceeds(value, getattr(after, name)) for name, value in before.items())
+
+    def record_grid(self, before: dict[str, numpy.ndarray], after: EarthState):
+        """
+        Same as record, for a stage applied on the whole grid
+        """
+        self.record_box(before, after, tuple(slice(0, size) for size in self.grid_shape))
+
+    def record_box(self, before: dict[str, numpy.ndarray], after: EarthState, box: tuple):
+        """
+        Same as record, for a stage applied on a box of cells, the changes of every tile are reduced at once
+        :param before: the fields of the box before a skippable stage
+        :param after: the box after the stage
+        :param box: one slice per axis of the grid
+        :return:
+        """
+        changed = numpy.zeros(after.grid_shape, dtype=bool)
+        for name, value in before.items():
+            exceeded = numpy.abs(getattr(after, name) - value) > self.threshold * numpy.abs(value)
+            changed |= exceeded.reshape((-1,) + after.grid_shape).any(axis=0)
+        for axis, key in enumerate(box):
+            tiles = numpy.arange(key.start, key.stop) // self.tile_size
+            changed = numpy.logical_or.reduceat(changed, numpy.flatnonzero(numpy.diff(tiles, prepend=-1)), axis=axis)
+        first = self.tile_position(tuple(key.start for key in box))
+        self.changed[tuple(slice(start, start + size) for start, size in zip(first, changed.shape))] |= changed
+
+    def awake_box(self, halo: int = 0) -> Optional[tuple]:
+        """
+        :param halo: number of cells added around the awake tiles
+        :return: one slice per axis of the grid, the smallest box holding every awake tile, None if they all are dormant
+        """
+        if not self.awake.any():
+            return None
+        box = []
+        for axis, size in enumerate(self.grid_shape):
+            tiles = numpy.flatnonzero(self.awake.any(axis=tuple(other for other in range(self.awake.ndim)
+                                                               if other != axis)))
+            box.append(slice(max(0, tiles[0] * self.tile_size - halo),
+                             min(size, (tiles[-1] + 1) * self.tile_size + halo)))
+        return tuple(box)
+
+    def exceeds(self, before: numpy.ndarray, after: numpy.ndarray) -> bool:
+        change = numpy.abs(after - before)
+        return bool((change > self.threshold * numpy.abs(before)).any())
+
+    @classmethod
+    def snapshot(cls, state: EarthState, stage: Stage) -> dict[str, numpy.ndarray]:
+        return {name: getattr(state, name).copy() for name in cls.FIELDS if name in stage.writes}
+
+    def __neighbourhood(self, tiles: numpy.ndarray, periodic: bool) -> numpy.ndarray:
+        """
+        :return: the tiles and their neighbours, diagonals included
+        """
+        result = tiles.copy()
+        for axis in range(tiles.ndim):
+            grown = result.copy()
+            if periodic:
+                grown |= numpy.roll(result, 1, axis=axis) | numpy.roll(result, -1, axis=axis)
+            else:
+                before = (slice(None),) * axis
+                grown[before + (slice(1, None),)] |= result[before + (slice(None, -1),)]
+                grown[before + (slice(None, -1),)] |= result[before + (slice(1, None),)]
+            result = grown
+        return result
+
+    @property
+    def dormant_fraction(self) -> float:
+        return 1 - self.awake.mean()
+
+
+class TickPipeline:
+    """
+    Applies a sequence of stages on an EarthState, one after the other on the whole state.
+    When fused, consecutive compatible stages are grouped and applied together tile by tile instead, so that only a
+    tile and its halo are needed at a time: OutOfCorePipeline streams the tiles of a state larger than the memory. The
+    result is exactly the same. In memory the numpy kernels gain nothing from the tiles and fusing is slower (see
+    pipeline_benchmark), so the earths never fuse their stages.
+    """
+    def __init__(self, stages: list[Stage], *, fused: bool = False, tile_size: int = 64, periodic: bool = False,
+                 activity: TileActivity = None):
+        """
+        :param stages:
+        :param fused: apply the compatible stages tile by tile
+        :param tile_size: side of the tiles [cells]
+        :param periodic: if the borders of the state are linked
+        :param activity: when given, the skippable stages are not applied on the dormant tiles. Its tiles must have
+        the same size as the ones of the pipeline
+        """
+        self.stages = stages
+        self.fused = fused
+        self.tile_size = tile_size
+        self.periodic = periodic
+        self.activity = activity
+
+    def groups(self) -> list[list[Stage]]:
+        """
+        Split the stages in groups that can be applied in a single pass. A stage starts a new group when it needs the
+        whole grid or when its global values depend on a field modified earlier in the current group.
+        :return:
+        """
+        groups, current, written = [], [], set()
+        for stage in self.stages:
+            if not stage.fusable or stage.reads & written:
+                if current:
+                    groups.append(current)
+                current, written = [], set()
+            if not stage.fusable:
+                groups.append([stage])
+                continue
+            current.append(stage)
+            written |= stage.writes
+        if current:
+            groups.append(current)
+        return groups
+
+    def run(self, state: EarthState):
+        index = numpy.arange(state.active.size).reshape(state.grid_shape)
+        activity = self.activity
+        if activity is not None:
+            activity.start_tick(self.stages)
+        for group in self.groups():
+            if self.fused and group[0].fusable:
+                self.__run_fused(group, state, index)
+                continue
+            for stage in group:
+                stage.prepare(state)
+                if activity is not None and stage.skippable:
+                    self.apply_awake(stage, state, index)
+                else:
+                    stage.apply(state, index, self.periodic)
+                stage.finish(state)
+        if activity is not None:
+            activity.end_tick(self.periodic)
+
+    def apply_awake(self, stage: Stage, state: EarthState, index: numpy.ndarray):
+        """
+        Apply a skippable stage on the box around the awake tiles, and on their halo so that they exchange with their
+        dormant neighbours. The stages that need the whole grid are applied on it unless every tile is dormant
+        :param stage:
+        :param state: the whole earth
+        :param index: index in the Earth of each cell of the state
+        :return:
+        """
+        activity = self.activity
+        box = activity.awake_box(stage.halo)
+        if box is None:
+            return
+        whole = not stage.fusable or all(key.start == 0 and key.stop == size
+                                         for key, size in zip(box, state.grid_shape))
+        if whole:
+            box = tuple(slice(0, size) for size in state.grid_shape)
+        region = state if whole else state.region(box)
+        before = activity.snapshot(region, stage)
+        stage.apply(region, index[box], self.periodic and whole)
+        if region is not state:
+            state.modified()
+        if before:
+            activity.record_box(before, region, box)
+
+    def tile_starts(self, grid_shape: tuple) -> Iterator[tuple]:
+        """
+        :param grid_shape:
+        :return: the first cell of every tile
+        """
+        return itertools.product(*(range(0, size, self.tile_size) for size in grid_shape))
+
+    def window(self, start: tuple, grid_shape: tuple, halo: int) -> tuple[tuple, tuple, tuple]:
+        """
+        :param start: first cell of the tile
+        :param grid_shape:
+        :param halo: number of cells needed around the tile
+        :return: the positions of the cells of the tile and its halo along each axis, the tile in the grid and the tile
+        in the window
+        """
+        positions, offsets, tile = [], [], []
+        for axis_start, size in zip(start, grid_shape):
+            axis_stop = min(size, axis_start + self.tile_size)
+            if self.periodic:
+                positions.append(numpy.arange(axis_start - halo, axis_stop + halo) % size)
+                offsets.append(halo)
+            else:
+                positions.append(numpy.arange(max(0, axis_start - halo), min(size, axis_stop + halo)))
+                offsets.append(axis_start - max(0, axis_start - halo))
+            tile.append(slice(axis_start, axis_stop))
+        interior = tuple(slice(offset, offset + axis.stop - axis.start) for offset, axis in zip(offsets, tile))
+        return tuple(positions), tuple(tile), interior
+
+    @staticmethod
+    def margins(group: list[Stage]) -> list[int]:
+        """
+        :param group:
+        :return: how far around the tile each stage must be computed for the stencils that follow it
+        """
+        margins, halo = [], 0
+        for stage in reversed(group):
+            halo += stage.halo
+            margins.insert(0, halo)
+        return margins
+
+    def apply_group(self, group: list[Stage], local: EarthState, local_index: numpy.ndarray, interior: tuple,
+                    start: tuple):
+        """
+        Apply the stages of a group on a tile and its halo
+        :param group:
+        :param local: the window of the tile, see window
+        :param local_index: index in the Earth of each cell of the window
+        :param interior: the tile in the window
+        :param start: first cell of the tile
+        :return:
+        """
+        activity = self.activity
+        for stage, margin in zip(group, self.margins(group)):
+            key = tuple(slice(max(0, axis.start - margin), axis.stop + margin) for axis in interior)
+            before = activity.snapshot(local.region(interior), stage) \
+                if activity is not None and stage.skippable else None
+            stage.apply(local.region(key), local_index[key], False)
+            if before:
+                activity.record(activity.tile_position(start), before, local.region(interior))
+
+    def read_window(self, state: EarthState, positions: tuple, written: Iterable[str]) -> EarthState:
+        """
+        :param state:
+        :param positions: the positions of the cells of the window along each axis, see window
+        :param written: fields modified by the stages applied on the window
+        :return: a copy of the written fields of the window, and read only views on the other fields unless the window
+        wraps around a border
+        """
+        if all(len(axis) < 2 or (numpy.diff(axis) == 1).all() for axis in positions):
+            return state.window(tuple(slice(axis[0], axis[-1] + 1) for axis in positions), written)
+        return state.take(positions)
+
+    def __run_fused(self, group: list[Stage], state: EarthState, index: numpy.ndarray):
+        for stage in group:
+            stage.prepare(state)
+        halo = self.margins(group)[0]
+        written = sorted(set().union(*(stage.writes for stage in group)))
+        # The tiles read the state as it was before the group, their results are kept aside until every tile is done
+        result = {name: numpy.empty_like(getattr(state, name)) for name in written}
+        activity = self.activity
+        # The forcings are applied alone on the dormant tiles, which needs them to be element-wise
+        skipping = activity is not None and any(stage.skippable for stage in group) and \
+            all(stage.skippable or not stage.halo for stage in group)
+        for start in self.tile_starts(state.grid_shape):
+            if skipping and not activity.awake[activity.tile_position(start)]:
+                tile = tuple(slice(axis_start, min(size, axis_start + self.tile_size))
+                             for axis_start, size in zip(start, state.grid_shape))
+                local = state.window(tile, written)
+                for stage in group:
+                    if not stage.skippable:
+                        stage.apply(local, index[tile], False)
+                self.__keep(result, tile, local)
+                continue
+            positions, tile, interior = self.window(start, state.grid_shape, halo)
+            local = self.read_window(state, positions, written)
+            self.apply_group(group, local, index[numpy.ix_(*positions)], interior, start)
+            self.__keep(result, tile, local.region(interior))
+        for name, value in result.items():
+            numpy.copyto(getattr(state, name), value)
+        state.modified()
+        for stage in group:
+            stage.finish(state)
+
+    @staticmethod
+    def __keep(result: dict[str, numpy.ndarray], tile: tuple, local: EarthState):
+        for name, value in result.items():
+            value[((slice(None),) if name in EarthState.COMPONENT_FIELDS else ()) + tile] = getattr(local, name)
@@ -0,0 +1,133 @@
+import argparse
+import time
+from dataclasses import dataclass, field
+
+import numpy
+
+from models.array_class.diffusion import ConductanceCache, refresh_mixture
+from models.array_class.earth_state import EarthState
+from models.array_class.out_of_core import seed_tile
+from models.array_class.pipeline import CarbonStage, DepositStage, EvaporationStage, Stage, StencilDiffusionStage, \
+    TickPipeline, TileActivity
+from models.physical_class.component_registry import COMPONENT_REGISTRY
+
+
+def seeded_state(shape: tuple, *, seed: int = 0, precision: str = "float64") -> EarthState:
+    """
+    :param shape: shape of the earth
+    :param seed:
+    :param precision: one of EarthState.PRECISIONS
+    :return: a state filled with random cells (see out_of_core.seed_tile), built without any grid chunk
+    """
+    state = EarthState.empty(shape, precision=precision)
+    seed_tile(state, numpy.random.default_rng(seed))
+    return state
+
+
+def settled_state(shape: tuple, *, seed: int = 0, precision: str = "float64", hot_spot: int = 8) -> EarthState:
+    """
+    :param shape: shape of the earth
+    :param seed:
+    :param precision: one of EarthState.PRECISIONS
+    :param hot_spot: side of the square of hot cells [cells]
+    :return: a seeded state (see seeded_state) whose water is turned into land, so that nothing evaporates, at 300 K
+    everywhere but in a square of cells at 400 K in a corner, so that only the tiles around the corner change (see
+    TileActivity)
+    """
+    state = seeded_state(shape, seed=seed, precision=precision)
+    water, land = COMPONENT_REGISTRY.id("WATER"), COMPONENT_REGISTRY.id("LAND")
+    state.mass[land] += state.mass[water]
+    state.mass[water] = 0
+    temperature = numpy.full(state.grid_shape, 300.)
+    temperature[:hot_spot, :hot_spot] = 400
+    capacity = COMPONENT_REGISTRY.specific_heat_capacity[:state.mass.shape[0], None, None]
+    state.energy[...] = state.mass * capacity * temperature
+    state.modified()
+    refresh_mixture(state, -1)
+    return state
+
+
+def tick_stages(cache: ConductanceCache, time_delta: float = 0.01) -> list[Stage]:
+    """
+    :param cache: conductances kept from one tick to the next
+    :param time_delta:
+    :return: the stages of a tick of TickingEarth with its default rules
+    """
+    return [StencilDiffusionStage(time_delta, cache=cache),
+            CarbonStage(emissions=1000, ocean_uptake=100, land_decay=330, biosphere_absorption=300),
+            EvaporationStage(0.0001, time_delta),
+            DepositStage(1e6)]
+
+
+@dataclass
+class PipelineTiming:
+    """
+    Time taken by a tick of each mode of TickPipeline on the same state
+    """
+    shape: tuple
+    ticks: int
+    tile_size: int
+    seconds: dict[str, float] = field(default_factory=dict)  # [s] Per tick, for each mode
+    dormant: dict[str, float] = field(default_factory=dict)  # Average fraction of dormant tiles, for each mode
+
+    def speedup(self, mode: str) -> float:
+        """
+        :param mode:
+        :return: how much faster the mode is than the unfused pipeline
+        """
+        return self.seconds["unfused"] / self.seconds[mode]
+
+    def __str__(self):
+        return f"{self.shape[0]}x{self.shape[1]}, tiles of {self.tile_size}: " + ", ".join(
+            f"{mode} {seconds * 1000:.1f} ms/tick (x{self.speedup(mode):.2f}"
+            + (f", {self.dormant[mode]:.0%} dormant)" if mode in self.dormant else ")")
+            for mode, seconds in self.seconds.items())
+
+
+def measure_pipeline(state: EarthState, ticks: int, *, tile_size: int = 64,
+                     dormant_threshold: float = 0) -> PipelineTiming:
+    """
+    Run the default stages on copies of the state with the unfused and the fused pipeline, and with the dormant tiles
+    skipped when a threshold is given. Each mode starts with a tick that is not measured, which fills the conductance
+    cache
+    :param state:
+    :param ticks: number of ticks measured for each mode
+    :param tile_size: side of the tiles [cells]
+    :param dormant_threshold: see TileActivity
+    :return:
+    """
+    timing = PipelineTiming(state.shape, ticks, tile_size)
+    modes = [("unfused", False, 0), ("fused", True, 0)]
+    if dormant_threshold > 0:
+        modes += [("unfused dormant", False, dormant_threshold), ("fused dormant", True, dormant_threshold)]
+    for mode, fused, threshold in modes:
+        current, cache = state.copy(), ConductanceCache()
+        activity = TileActivity(state.grid_shape, tile_size, threshold) if threshold > 0 else None
+        seconds, dormant = 0, 0
+        for tick in range(ticks + 1):
+            pipeline = TickPipeline(tick_stages(cache), fused=fused, tile_size=tile_size, activity=activity)
+            start = time.perf_counter()
+            pipeline.run(current)
+            if tick:
+                seconds += time.perf_counter() - start
+                dormant += activity.dormant_fraction if activity is not None else 0
+        timing.seconds[mode] = seconds / max(1, ticks)
+        if activity is not None:
+            timing.dormant[mode] = dormant / max(1, ticks)
+    return timing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the time of a tick of the fused and unfused pipelines")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("--ticks", type=int, default=5)
+    parser.add_argument("--tile-sizes", type=int, nargs="+", default=[64])
+    parser.add_argument("--precision", default="float64", choices=EarthState.PRECISIONS)
+    parser.add_argument("--dormant-threshold", type=float, default=0,
+                        help="also measure the modes skipping the dormant tiles, on a settled earth with a hot corner")
+    arguments = parser.parse_args()
+    seeded = (settled_state if arguments.dormant_threshold > 0 else seeded_state)(
+        (arguments.width, arguments.height), precision=arguments.precision)
+    for size in arguments.tile_sizes:
+        print(measure_pipeline(seeded, arguments.ticks, tile_size=size, dormant_threshold=arguments.dormant_threshold))
@@ -0,0 +1,103 @@
+import argparse
+import time
+from dataclasses import dataclass, field
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.array_class.equivalence import seeded_universe
+
+
+@dataclass
+class PrecisionDrift:
+    """
+    Difference between a run of the array engine in a reduced precision and the same run in float64
+    """
+    precision: str
+    ticks: int
+    seconds: float
+    state_bytes: int  # Size of the arrays of the state
+    max_temperature_error: float = 0  # [K] Largest difference of the temperature of a cell
+    relative_temperature_error: float = 0  # Largest difference of the temperature of a cell relative to float64
+    mean_temperature_error: float = 0  # [K] Difference of the mean temperature of the earth
+    energy_drift: float = 0  # Relative difference of the total energy of the earth
+    mass_drift: float = 0  # Relative difference of the total mass of the earth
+    temperature_errors: list[float] = field(default_factory=list)  # Largest temperature error [K] after each tick
+
+    def __str__(self):
+        return f"{self.precision}: {self.state_bytes / 1e6:.2f} MB, {self.seconds:.3f} s, max temperature error " \
+               f"{self.max_temperature_error:.3g} K ({self.relative_temperature_error:.3g}), mean temperature error " \
+               f"{self.mean_temperature_error:.3g} K, " \
+               f"energy drift {self.energy_drift:.3g}, mass drift {self.mass_drift:.3g}"
+
+
+def state_bytes(state: EarthState) -> int:
+    return sum(getattr(state, name).nbytes for name in state.FIELDS)
+
+
+def run_precision(shape: tuple, ticks: int, precision: str, *, seed: int = 0,
+                  periodic: bool = False) -> tuple[list[EarthState], float, int]:
+    """
+    :param shape: shape of the earth
+    :param ticks:
+    :param precision: one of EarthState.PRECISIONS
+    :param seed: see seeded_universe
+    :param periodic:
+    :return: the state after each tick (in float64), the time taken by the ticks [s] and the size of the state
+    """
+    universe = seeded_universe(shape, seed=seed, periodic=periodic)
+    universe.ENGINE, universe.PRECISION, universe.SYNC_INTERVAL = "array", precision, ticks + 1
+    states, seconds = [], 0
+    for _ in range(ticks):
+        start = time.perf_counter()
+        universe.update_all()
+        seconds += time.perf_counter() - start
+        states.append(universe.earth.array_state.with_precision("float64").copy())
+    return states, seconds, state_bytes(universe.earth.array_state)
+
+
+def compare_precisions(shape: tuple, ticks: int, *, precisions: tuple[str, ...] = ("float32", "mixed"), seed: int = 0,
+                       periodic: bool = False) -> list[PrecisionDrift]:
+    """
+    Run the array engine in each precision and in float64 from the same seeded universe, and measure how far the
+    reduced precisions drift from float64 over the ticks
+    :param shape: shape of the earth
+    :param ticks:
+    :param precisions:
+    :param seed:
+    :param periodic:
+    :return: the drift of each precision
+    """
+    reference, _, _ = run_precision(shape, ticks, "float64", seed=seed, periodic=periodic)
+    result = []
+    for precision in precisions:
+        states, seconds, size = run_precision(shape, ticks, precision, seed=seed, periodic=periodic)
+        drift = PrecisionDrift(precision, ticks, seconds, size)
+        for state, expected in zip(states, reference):
+            active = expected.active
+            error = numpy.abs(state.temperature - expected.temperature)[active]
+            drift.temperature_errors.append(float(error.max(initial=0)))
+            drift.relative_temperature_error = max(
+                drift.relative_temperature_error,
+                float((error / numpy.maximum(numpy.abs(expected.temperature[active]), 1)).max(initial=0)))
+        final, expected = states[-1], reference[-1]
+        drift.max_temperature_error = max(drift.temperature_errors, default=0)
+        drift.mean_temperature_error = float(abs(final.temperature[final.active].mean() -
+                                                 expected.temperature[expected.active].mean()))
+        drift.energy_drift = float(abs(final.energy.sum() / expected.energy.sum() - 1))
+        drift.mass_drift = float(abs(final.mass.sum() / expected.mass.sum() - 1))
+        result.append(drift)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the drift of the reduced precisions of the array engine")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--periodic", action="store_true")
+    arguments = parser.parse_args()
+    for reduced in compare_precisions((arguments.width, arguments.height), arguments.ticks, seed=arguments.seed,
+                                      periodic=arguments.periodic):
+        print(reduced)
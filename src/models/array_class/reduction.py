@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+
+
+@dataclass(frozen=True)
+class EarthTotals:
+    """
+    Statistics of an earth, as sums that can be added over the parts of the earth
+    """
+    component_mass: numpy.ndarray  # (component,) [kg] Mass of each component over the earth
+    energy: float  # [J]
+    temperature: float  # Sum of the temperatures of the active cells
+    active: int  # Number of active cells
+
+    @property
+    def total_mass(self) -> float:
+        return float(self.component_mass.sum())
+
+    @property
+    def average_temperature(self) -> float:
+        return self.temperature / max(1, self.active)
+
+    @property
+    def composition(self) -> dict[str, float]:
+        """
+        Same definition as Earth.composition
+        """
+        total_mass = self.total_mass
+        return {component_type: float(mass) / total_mass
+                for component_type, mass in zip(EarthState.COMPONENTS, self.component_mass) if mass > 0}
+
+    def __add__(self, other: "EarthTotals") -> "EarthTotals":
+        return EarthTotals(self.component_mass + other.component_mass, self.energy + other.energy,
+                           self.temperature + other.temperature, self.active + other.active)
+
+    def __str__(self):
+        composition = f"{chr(10) + chr(9)} ".join(str(round(value * 100, 2)) + "% " + key
+                                                  for key, value in self.composition.items())
+        return f"Earth : \n" \
+               f"- Mass {self.total_mass}\n" \
+               f"- Average temperature: {self.average_temperature}\n" \
+               f"- Composition: \n\t{composition}"
+
+
+def reduce_state(state: EarthState, *, band: int = 64) -> EarthTotals:
+    """
+    Compute every statistic of EarthTotals in a single pass over the state, by bands of rows small enough for their
+    temporaries (temperature, ...) to stay in the cache. Each field is read once, instead of once per statistic.
+    The sums are in float64 except in float32 precision, like EarthState.total
+    :param state:
+    :param band: number of rows (indices along the first axis of the grid) of each band
+    :return:
+    """
+    dtype = numpy.float32 if state.precision == "float32" else numpy.float64
+    component_mass = numpy.zeros(len(state.COMPONENTS), dtype=dtype)
+    energy = temperature = dtype(0)
+    active = 0
+    rows = state.grid_shape[0] if state.grid_shape else 0
+    for start in range(0, rows, max(1, band)):
+        region = state.region((slice(start, start + band),) + (slice(None),) * (len(state.grid_shape) - 1))
+        component_mass += region.flat(region.mass).sum(axis=1, dtype=dtype)
+        energy += region.energy.sum(dtype=dtype)
+        temperature += region.temperature[region.active].sum(dtype=dtype)
+        active += int(numpy.count_nonzero(region.active))
+    return EarthTotals(component_mass.astype(numpy.float64), float(energy), float(temperature), active)
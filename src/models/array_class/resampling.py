@@ -0,0 +1,46 @@
+import numpy
+
+
+def overlap_weights(size_in: int, size_out: int) -> numpy.ndarray:
+    """
+    Both axes cover the same length, cut in size_in and size_out equal intervals
+    :param size_in:
+    :param size_out:
+    :return: (size_out, size_in) fraction of each output interval covered by each input interval, each row sums to 1
+    """
+    edges_in = numpy.arange(size_in + 1) / size_in
+    edges_out = numpy.arange(size_out + 1) / size_out
+    overlap = (numpy.minimum(edges_out[1:, None], edges_in[None, 1:])
+               - numpy.maximum(edges_out[:-1, None], edges_in[None, :-1]))
+    return numpy.clip(overlap, 0, None) * size_out
+
+
+def resample_area(field: numpy.ndarray, shape: tuple[int, int]) -> numpy.ndarray:
+    """
+    Resample a 2D field covering the same area with another number of cells, each new cell taking the average of the
+    field weighted by the area it shares with each cell of the field. A boolean mask becomes the fraction of each new
+    cell that it covers
+    :param field: (height, width)
+    :param shape: (height, width) of the result
+    :return:
+    """
+    if field.shape == tuple(shape):
+        return field.astype(numpy.float64)
+    rows = overlap_weights(field.shape[0], shape[0])
+    columns = overlap_weights(field.shape[1], shape[1])
+    return rows @ field.astype(numpy.float64) @ columns.T
+
+
+def resample_nearest(field: numpy.ndarray, shape: tuple[int, int]) -> numpy.ndarray:
+    """
+    Resample a 2D field covering the same area with another number of cells, each new cell taking the value of the cell
+    of the field under its center. For the fields whose values cannot be averaged, such as codes
+    :param field: (height, width)
+    :param shape: (height, width) of the result
+    :return:
+    """
+    if field.shape == tuple(shape):
+        return field
+    rows, columns = ((numpy.arange(size_out) + 0.5) * size_in // size_out
+                     for size_in, size_out in zip(field.shape, shape))
+    return field[numpy.ix_(rows.astype(numpy.int64), columns.astype(numpy.int64))]
@@ -0,0 +1,338 @@
+import contextlib
+import multiprocessing
+import traceback
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any, Iterator, Optional
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.array_class.parareal import UniverseSettings
+from models.physical_class.snapshot import Snapshot
+from models.physical_class.summary import UniverseSummary
+
+if TYPE_CHECKING:
+    from models.physical_class.universe import Universe
+
+Layout = list[tuple[str, tuple, str]]  # (field, shape, dtype) of each field of EarthState.FIELDS
+
+
+class SharedSlot:
+    """
+    The fields of an EarthState in one block of shared memory, after a header holding the tick of the state.
+    The process creating the slot owns it and unlinks it, the other processes attach to it by its name
+    """
+    HEADER: int = 64  # [bytes] The arrays start aligned on a cache line
+    ALIGNMENT: int = 64
+
+    def __init__(self, memory: SharedMemory, shape: tuple, layout: Layout, precision: str, *, owner: bool,
+                 writeable: bool):
+        self.memory = memory
+        self.owner = owner
+        self.__header = numpy.ndarray((1,), dtype=numpy.int64, buffer=memory.buf)
+        arrays, offset = {}, self.HEADER
+        for name, field_shape, dtype in layout:
+            array = numpy.ndarray(field_shape, dtype=dtype, buffer=memory.buf, offset=offset)
+            array.flags.writeable = writeable
+            arrays[name] = array
+            offset += -(-array.nbytes // self.ALIGNMENT) * self.ALIGNMENT
+        self.state = EarthState(shape=tuple(shape), precision=precision, **arrays)
+
+    @staticmethod
+    def layout_of(state: EarthState) -> Layout:
+        return [(name, getattr(state, name).shape, getattr(state, name).dtype.str) for name in EarthState.FIELDS]
+
+    @classmethod
+    def nbytes(cls, layout: Layout) -> int:
+        return cls.HEADER + sum(-(-int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize // cls.ALIGNMENT)
+                                * cls.ALIGNMENT for _, shape, dtype in layout)
+
+    @classmethod
+    def create(cls, shape: tuple, layout: Layout, precision: str) -> "SharedSlot":
+        memory = SharedMemory(create=True, size=cls.nbytes(layout))
+        return cls(memory, shape, layout, precision, owner=True, writeable=False)
+
+    @classmethod
+    def attach(cls, name: str, shape: tuple, layout: Layout, precision: str) -> "SharedSlot":
+        memory = SharedMemory(name=name)
+        return cls(memory, shape, layout, precision, owner=False, writeable=True)
+
+    @property
+    def tick(self) -> int:
+        return int(self.__header[0])
+
+    def write(self, state: EarthState, tick: int):
+        for name in EarthState.FIELDS:
+            numpy.copyto(getattr(self.state, name), getattr(state, name), casting="unsafe")
+        self.__header[0] = tick
+
+    def close(self):
+        self.state = self.__header = None  # The arrays must be released before the memory is closed
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def _load(universe: "Universe", state: EarthState, tick: int):
+    """
+    Write the state in the earth of the universe and set the tick of every body, as run_parareal does
+    """
+    earth = universe.earth
+    if hasattr(earth, "release_array_state"):
+        earth.release_array_state()
+    state.write_to(earth)
+    earth.modified()
+    for body in (*universe, universe):
+        if body is not None and hasattr(body, "_t"):
+            body._t = tick
+
+
+def _target(universe: "Universe", target: str) -> Any:
+    return universe if target == "universe" else getattr(universe, target)
+
+
+def _serve(settings: UniverseSettings, state: EarthState, tick: int, connection: Connection, names: list[str],
+           layout: Layout, locks: list, interval: int):
+    """
+    Main function of the simulation process: runs the universe and answers the messages of SimulationProcess
+    """
+    try:
+        universe = settings.build(state)
+        _load(universe, state, tick)
+        slots = [SharedSlot.attach(name, state.shape, layout, state.precision) for name in names]
+        front = 1
+        pending: Optional[tuple[int, UniverseSummary]] = None  # Publication not sent yet
+        received = True  # If the last publication sent was read by the views
+
+        def send_pending(*, force: bool = False):
+            """
+            A single publication is sent until the views read it, so that the pipe never fills up and blocks the
+            simulation while the views do not poll: the next ones replace each other in `pending` meanwhile
+            """
+            nonlocal pending, received
+            if pending is not None and (received or force):
+                connection.send(("published", *pending))
+                pending, received = None, False
+
+        def publish(*, wait: bool = False):
+            nonlocal front, pending
+            back = 1 - front
+            if not locks[back].acquire(block=wait):
+                return  # The views are reading the back slot, the next tick is published instead
+            try:
+                slots[back].write(universe.earth.fields, universe.get_time())
+            finally:
+                locks[back].release()
+            front, pending = back, (back, universe.summary)
+            send_pending(force=wait)
+
+        def idle():
+            publish(wait=True)
+            sun = universe.sun
+            connection.send(("idle", {} if sun is None else {name: getattr(sun, name)
+                                                             for name in UniverseSettings.SUN_CONSTANTS}))
+
+        running = False
+        while True:
+            if not running or connection.poll():
+                message, *arguments = connection.recv()  # Waits for the next message while paused
+                if message == "close":
+                    break
+                elif message == "received":
+                    received = True
+                    send_pending()
+                elif message == "resume":
+                    running = True
+                elif message == "pause":
+                    running = False
+                    idle()
+                elif message == "step":
+                    universe.update_all()
+                    idle()
+                elif message == "set":
+                    target, name, value = arguments
+                    setattr(_target(universe, target), name, value)
+                elif message == "load":
+                    _load(universe, *arguments)
+                continue
+            universe.update_all()
+            if universe.get_time() % max(1, interval) == 0:
+                publish()
+        for slot in slots:
+            slot.close()
+    except BaseException:
+        connection.send(("error", traceback.format_exc()))
+        raise
+
+
+class SimulationProcess:
+    """
+    Runs a copy of a universe in a child process, so that the simulation and the views each get their own core (and
+    interpreter lock).
+    Messages (resume, pause, step, set, load, close) go to the child through a pipe. The child publishes the state of
+    its earth every `interval` ticks in one of two slots of shared memory, which the views map read only: a slot is
+    locked while it is written or read, and the child skips the publication rather than waiting for the views, as
+    SnapshotBuffer does. The summary of each publication comes back through the pipe, one at a time: until the views
+    poll it, the next publications replace each other in the child instead of piling up in the pipe.
+    While the child runs, the universe given is left as it was. Pausing writes the state of the child back into it, and
+    resuming sends it again to the child if it was modified meanwhile.
+    """
+    TIMEOUT: float = 60  # [s] Longest wait for the child to pause or close
+
+    def __init__(self, universe: "Universe", *, interval: int = None):
+        """
+        :param universe: universe to simulate, the child process starts from its current state
+        :param interval: [ticks] how often the child publishes its state, SNAPSHOT_INTERVAL by default
+        """
+        self.universe = universe
+        universe.synchronize()
+        state = EarthState.from_earth(universe.earth, precision=universe.PRECISION)
+        layout = SharedSlot.layout_of(state)
+        self.__slots = [SharedSlot.create(state.shape, layout, state.precision) for _ in range(2)]
+        # Spawned rather than forked, a fork would copy the threads and locks of the GUI in an unusable state
+        context = multiprocessing.get_context("spawn")
+        self.__locks = [context.Lock(), context.Lock()]
+        self.__connection, child = context.Pipe()
+        self.process = context.Process(target=_serve, daemon=True,
+                                       args=(UniverseSettings.from_universe(universe), state, universe.get_time(),
+                                             child, [slot.memory.name for slot in self.__slots], layout,
+                                             self.__locks, universe.SNAPSHOT_INTERVAL if interval is None else interval))
+        self.process.start()
+        child.close()
+        self.running = False
+        self.__published = 0  # Number of publications received
+        self.__front: Optional[tuple[int, UniverseSummary]] = None  # Slot and summary of the last publication
+        self.__snapshot: Optional[Snapshot] = None  # Snapshot of the last publication, once read
+        self.__sun_constants: Optional[dict] = None  # Of the sun of the child, when it last became idle
+        self.__version = universe.earth.version  # Of the earth when it was last the same as in the child
+
+    def __send(self, *message):
+        self.__connection.send(message)
+
+    def __load_if_modified(self):
+        """
+        Send the universe to the child if it was modified since it was last the same as the child (painted while
+        paused, ...)
+        """
+        if self.universe.earth.version != self.__version:
+            self.__send("load", EarthState.from_earth(self.universe.earth, precision=self.universe.PRECISION),
+                        self.universe.get_time())
+            self.__version = self.universe.earth.version
+
+    def resume(self):
+        self.__load_if_modified()
+        self.__send("resume")
+        self.running = True
+
+    def pause(self):
+        """
+        Stop the child and write its state in the universe
+        :return:
+        """
+        self.__send("pause")
+        self.running = False
+        self.__wait_idle()
+
+    def step(self):
+        """
+        One tick of the paused child, written in the universe
+        :return:
+        """
+        self.__load_if_modified()
+        self.__send("step")
+        self.__wait_idle()
+
+    def set(self, target: str, name: str, value: Any):
+        """
+        setattr in the child
+        :param target: "universe", "earth" or "sun"
+        :param name:
+        :param value:
+        :return:
+        """
+        self.__send("set", target, name, value)
+
+    @property
+    def published(self) -> int:
+        """
+        :return: the number of publications received, after reading the messages of the child
+        """
+        self.poll()
+        return self.__published
+
+    def poll(self, *, timeout: float = 0) -> Optional[str]:
+        """
+        Read the messages of the child
+        :param timeout: [s] how long to wait for the first one
+        :return: the last message read, None if there was none
+        """
+        message = None
+        if self.__connection.closed:
+            return message
+        while self.__connection.poll(timeout):
+            timeout = 0
+            message, *arguments = self.__connection.recv()
+            if message == "published":
+                self.__front, self.__snapshot = tuple(arguments), None
+                self.__published += 1
+                with contextlib.suppress(BrokenPipeError):  # The child failed, its error is the next message
+                    self.__send("received")
+            elif message == "idle":
+                self.__sun_constants = arguments[0]
+            elif message == "error":
+                self.running = False
+                raise RuntimeError(f"The simulation process failed:\n{arguments[0]}")
+        return message
+
+    def __wait_idle(self):
+        while self.poll(timeout=self.TIMEOUT) != "idle":
+            if not self.process.is_alive():
+                raise RuntimeError("The simulation process stopped")
+        with self.latest() as snapshot:
+            _load(self.universe, self.__slots[self.__front[0]].state, snapshot.tick)
+        for name, value in self.__sun_constants.items():
+            setattr(self.universe.sun, name, value)
+        self.__version = self.universe.earth.version
+
+    @contextlib.contextmanager
+    def latest(self) -> Iterator[Optional[Snapshot]]:
+        """
+        The slot of the snapshot is not written by the child while it is read in this context, see SnapshotBuffer
+        :return: the last snapshot published by the child, None if there is none yet
+        """
+        self.poll()
+        while self.__front is not None:
+            slot, summary = self.__front
+            lock = self.__locks[slot]
+            lock.acquire()
+            if self.__slots[slot].tick != summary.tick:
+                lock.release()  # Written again since this publication was received, the next one is on its way
+                self.poll(timeout=self.TIMEOUT)
+                continue
+            try:
+                if self.__snapshot is None:
+                    state = self.__slots[slot].state
+                    state.modified()  # The derived fields of the previous publication in this slot are outdated
+                    self.__snapshot = Snapshot(tick=summary.tick, time=summary.time, temperature=state.temperature,
+                                               active=state.active, summary=summary)
+                yield self.__snapshot
+            finally:
+                lock.release()
+            return
+        yield None
+
+    def close(self):
+        """
+        Stop the child without writing its state in the universe, see pause
+        :return:
+        """
+        if self.process.is_alive():
+            self.__send("close")
+            self.process.join(self.TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.__connection.close()
+        self.__snapshot = None
+        for slot in self.__slots:
+            slot.close()
@@ -1,4 +1,4 @@
-from typing import Optional, Iterator
+from typing import Iterable, Iterator, Optional
 
 import numpy
 
@@ -12,12 +12,18 @@ class EarthBase(list[Optional[GridChunk]]):
     There should be no reference to the physical properties of the Earth since it is taken care of in the second layer.
     """
     nb_active_grid_chunks: int = 0
+    version: int = 0  # Incremented every time the earth is modified, see modified
+    HOLDS_CHUNKS: bool = True  # False for the earths whose state is kept elsewhere, which then have no grid chunks
 
-    def __init__(self, shape: tuple, *, parent=None):
+    def __init__(self, shape: tuple, *, parent=None, periodic: bool = False):
         super().__init__()
+        if periodic and len(shape) > 2:
+            raise ValueError("Only the 1D and 2D earths can be periodic, the neighbours of a 3D grid do not wrap around")
         self.shape = shape
         self.parent = parent
-        self.extend(None for _ in range(numpy.product(self.shape)))
+        self.periodic = periodic  # If the borders of the grid wrap around (only for 1D and 2D grids)
+        if self.HOLDS_CHUNKS:
+            self.extend(None for _ in range(numpy.product(self.shape)))
 
     def __len__(self):
         """
@@ -38,12 +44,41 @@ class EarthBase(list[Optional[GridChunk]]):
         elif self[key] is not None and value is None:
             self.nb_active_grid_chunks -= 1
         super().__setitem__(key, value)
+        self.modified()
         if value is not None:
             # If we insert an element, we need to recompute its neighbors
             value.neighbours = self.neighbours(value.index)
             for n in value.neighbours:
                 n.neighbours = self.neighbours(n.index)
 
+    def set_chunks(self, indices: Iterable[int], chunks: Iterable[Optional[GridChunk]]):
+        """
+        Same as setting the chunks one after the other, but the neighbours of the cells around them are computed once
+        :param indices:
+        :param chunks: the chunk (or None) to put at each index
+        :return:
+        """
+        changed = []
+        for index, chunk in zip(indices, chunks):
+            self.nb_active_grid_chunks += (chunk is not None) - (self[index] is not None)
+            list.__setitem__(self, index, chunk)
+            changed.append(index)
+        neighbours = {index: self.neighbours(index) for index in changed}
+        around = {neighbour.index for cells in neighbours.values() for neighbour in cells}.difference(neighbours)
+        neighbours.update((index, self.neighbours(index)) for index in around)
+        for index, cells in neighbours.items():
+            if self[index] is not None:
+                self[index].neighbours = cells
+        self.modified()
+
+    def modified(self):
+        """
+        Must be called after changing the grid chunks, so that the values derived from them are computed again on their
+        next read
+        :return:
+        """
+        self.version += 1
+
     def not_nones(self) -> Iterator[GridChunk]:
         """
         :return: Iterator containing all the items that are not none
@@ -66,6 +101,8 @@ class EarthBase(list[Optional[GridChunk]]):
         :return:
         """
         res = []
+        if self.periodic and len(self.shape) <= 2:
+            return self.__periodic_neighbours(index)
         # 1D
         if len(self.shape) == 1:
             if index >= 1 and self[index - 1] is not None:  # Left
@@ -105,3 +142,17 @@ class EarthBase(list[Optional[GridChunk]]):
                     self[index + self.shape[0] * self.shape[1]] is not None:
                 res.append(self[index + self.shape[0] * self.shape[1]])
         return res
+
+    def __periodic_neighbours(self, index: int) -> list[GridChunk]:
+        """
+        Same as neighbours, but the left border is linked to the right border and the top border to the bottom one
+        :param index:
+        :return:
+        """
+        width = self.shape[0]
+        height = len(self) // width
+        x, y = index % width, index // width
+        candidates = [(x - 1) % width + y * width, (x + 1) % width + y * width]  # Left, Right
+        if len(self.shape) == 2:
+            candidates = [x + ((y - 1) % height) * width] + candidates + [x + ((y + 1) % height) * width]  # Top, Bot
+        return [self[i] for i in candidates if self[i] is not None]
@@ -2,17 +2,25 @@ from collections.abc import Collection, Iterator
 from typing import Optional
 
 from models.physical_class.chunk_component import ChunkComponent
+from models.physical_class.component_registry import COMPONENT_REGISTRY
+
+
+def component_accessor(component_id: int) -> property:
+    """
+    :param component_id:
+    :return: a property reading and writing the component of that id of a grid chunk
+    """
+    return property(lambda self: self.get_by_id(component_id), lambda self, value: self.set_by_id(component_id, value))
 
 
 class GridChunkBase(list[ChunkComponent]):
     """
     First layer of the grid chunk model.
     This class takes care of the aggregation of the different Chunk Components.
+    The components are stored by the id of their material in the COMPONENT_REGISTRY, each material also has an
+    attribute `<material>_component` (water_component, air_component, ...).
     """
-    COMPONENTS = "WATER", "AIR", "LAND"
-    water_component: ChunkComponent = None
-    air_component: ChunkComponent = None
-    land_component: ChunkComponent = None
+    components: list[Optional[ChunkComponent]]  # The component of each material id, None when absent
 
     def reindex(self):
         """
@@ -23,6 +31,7 @@ class GridChunkBase(list[ChunkComponent]):
 
     def __init__(self, components: Collection[ChunkComponent], *, index: int = None, earth=None):
         super().__init__()
+        self.components = [None] * len(COMPONENT_REGISTRY)
         self.earth = earth
         self.index = index
         if self.index is None and self.earth is not None and self in self.earth:
@@ -35,33 +44,42 @@ class GridChunkBase(list[ChunkComponent]):
             if not component.is_empty():
                 # Link the component's reference to the chunk to self
                 component.chunk = self
-                # Link the water/air/land _component object variable to the component of the corresponding type
-                self[component.type.upper()] = component
+                self.components[component.id] = component
 
     def __len__(self) -> int:
         """
         :return: the size of the grid chunk, that is equal to the amount of different components it contain
         """
-        return sum(self[x] is not None for x in GridChunkBase.COMPONENTS)
+        return sum(x is not None for x in self.components)
 
     def __iter__(self) -> Iterator[ChunkComponent]:
-        return (x for x in (self.water_component, self.air_component, self.land_component) if x is not None)
+        return (x for x in self.components if x is not None)
 
     def __contains__(self, __x: object) -> bool:
         if isinstance(__x, ChunkComponent):
-            return any(__x == self[x] for x in GridChunkBase.COMPONENTS if self[x] is not None)
+            return any(__x == x for x in self)
         return super().__contains__(__x)
 
+    def get_by_id(self, component_id: int) -> Optional[ChunkComponent]:
+        return self.components[component_id] if component_id < len(self.components) else None
+
+    def set_by_id(self, component_id: int, value: Optional[ChunkComponent]):
+        if component_id >= len(self.components):  # Material registered after the creation of the chunk
+            self.components.extend([None] * (component_id + 1 - len(self.components)))
+        self.components[component_id] = value
+
     def __setitem__(self, key: str, value: Optional[ChunkComponent]):
-        if key.upper() not in GridChunkBase.COMPONENTS:
-            raise NotImplementedError(f"Component {key} is not a valid component type")
-        self.__setattr__(f"{key.lower()}_component", value)
+        self.set_by_id(COMPONENT_REGISTRY.id(key), value)
 
     def __getitem__(self, item: str):
-        return self.__getattribute__(f"{item.lower()}_component")
+        return self.get_by_id(COMPONENT_REGISTRY.id(item))
 
     def __eq__(self, other: object):
-        return isinstance(other, GridChunkBase) and all(self[x] == other[x] for x in GridChunkBase.COMPONENTS)
+        return isinstance(other, GridChunkBase) and all(self[x] == other[x] for x in COMPONENT_REGISTRY)
 
     def __ne__(self, other: "GridChunkBase"):
         return not self.__eq__(other)
+
+
+COMPONENT_REGISTRY.on_register(
+    lambda name, component_id: setattr(GridChunkBase, f"{name.lower()}_component", component_accessor(component_id)))
@@ -3,7 +3,7 @@ from typing import Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from models.physical_class.grid_chunk import GridChunk
-import constants
+from models.physical_class.component_registry import COMPONENT_REGISTRY
 
 
 class ChunkComponent:
@@ -27,6 +27,8 @@ class ChunkComponent:
         Coefficient for Newton's law of Cooling
         See https://en.wikipedia.org/wiki/Heat_transfer_coefficient
         Expressed in Watt per Meter squared per Kelvin
+    id: int
+        The id of the material of the component in the COMPONENT_REGISTRY
     energy: float
         The molecular kinetic energy of the component. It is used to store and compute the temperature of the
         component
@@ -40,12 +42,13 @@ class ChunkComponent:
     def __init__(self, mass: float, temperature: float, component_type: str):
         # Information on the component
         self.type = component_type.upper()
+        self.id = COMPONENT_REGISTRY.id(self.type)
 
         # Physical properties
         self.mass = mass
 
-        self.specific_heat_capacity = constants.SPECIFIC_HEAT_CAPACITY[self.type]
-        self.heat_transfer_coefficient = constants.HEAT_TRANSFER_COEFFICIENT[self.type]
+        self.specific_heat_capacity = float(COMPONENT_REGISTRY.specific_heat_capacity[self.id])
+        self.heat_transfer_coefficient = float(COMPONENT_REGISTRY.heat_transfer_coefficient[self.id])
         self.__set_temperature(temperature)
 
     def __eq__(self, other: Optional["ChunkComponent"]):
@@ -82,5 +85,15 @@ class ChunkComponent:
     def deep_copy(self):
         return ChunkComponent(self.mass, self.__get_temperature(), component_type=self.type)
 
+    def clone(self, chunk: "GridChunk" = None) -> "ChunkComponent":
+        """
+        :param chunk: the chunk of the copy
+        :return: a copy of the component, with the same energy
+        """
+        component = ChunkComponent.__new__(ChunkComponent)
+        component.__dict__.update(self.__dict__)
+        component.chunk = chunk
+        return component
+
     def is_empty(self):
         return math.isclose(self.mass, 0)
@@ -0,0 +1,78 @@
+from typing import Callable, Iterator
+
+import numpy
+
+import constants
+
+
+class ComponentRegistry:
+    """
+    The materials a grid chunk can be made of.
+    Each material gets an integer id, its position along the component axis: the components of a GridChunk and the
+    per component fields of an EarthState are indexed by it, and the physical properties of the materials are stored as
+    arrays along that axis so that the mixture properties are dot products with the mass ratios.
+    """
+    def __init__(self):
+        self.names: list[str] = []
+        self.ids: dict[str, int] = {}
+        self.specific_heat_capacity = numpy.zeros(0)  # [J kg^-1 C^-1] by id
+        self.heat_transfer_coefficient = numpy.zeros(0)  # [W m^-2 K^-1] by id
+        self.__listeners: list[Callable[[str, int], None]] = []
+
+    def register(self, name: str, specific_heat_capacity: float, heat_transfer_coefficient: float) -> int:
+        """
+        Add a material. It must be registered before building the earths that contain it
+        :param name:
+        :param specific_heat_capacity: [J kg^-1 C^-1]
+        :param heat_transfer_coefficient: [W m^-2 K^-1]
+        :return: the id of the material
+        """
+        name = name.upper()
+        if name in self.ids:
+            raise ValueError(f"Component {name} is already registered")
+        component_id = len(self.names)
+        self.names.append(name)
+        self.ids[name] = component_id
+        self.specific_heat_capacity = numpy.append(self.specific_heat_capacity, specific_heat_capacity)
+        self.heat_transfer_coefficient = numpy.append(self.heat_transfer_coefficient, heat_transfer_coefficient)
+        for listener in self.__listeners:
+            listener(name, component_id)
+        return component_id
+
+    def on_register(self, listener: Callable[[str, int], None]):
+        """
+        :param listener: called with the name and id of every material, the ones already registered included
+        :return:
+        """
+        self.__listeners.append(listener)
+        for component_id, name in enumerate(self.names):
+            listener(name, component_id)
+
+    def id(self, name: str) -> int:
+        try:
+            return self.ids[name.upper()]
+        except KeyError:
+            raise NotImplementedError(f"Component {name} is not a valid component type") from None
+
+    def mixture(self, ratios: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        :param ratios: mass ratios, with the component axis first
+        :return: the ratio weighted sums of the specific heat capacity and of the heat transfer coefficient
+        """
+        return (numpy.tensordot(self.specific_heat_capacity, ratios, axes=1),
+                numpy.tensordot(self.heat_transfer_coefficient, ratios, axes=1))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and name.upper() in self.ids
+
+
+COMPONENT_REGISTRY = ComponentRegistry()
+for _name in constants.COMPONENTS:
+    COMPONENT_REGISTRY.register(_name, constants.SPECIFIC_HEAT_CAPACITY[_name],
+                                constants.HEAT_TRANSFER_COEFFICIENT[_name])
@@ -1,4 +1,10 @@
+from typing import Callable, Optional, Union
+
+import numpy
+
 from models.ABC.celestial_body import CelestialBody
+from models.array_class.earth_state import EarthState
+from models.array_class.reduction import EarthTotals, reduce_state
 from models.base_class.earth_base import EarthBase
 from models.physical_class.grid_chunk import GridChunk
 
@@ -11,33 +17,50 @@ class Earth(EarthBase, CelestialBody):
     """
     albedo: float = 0.3
     CARBON_EMISSIONS_PER_TIME_DELTA: float = 1_000_000  # ppm
+    CARBON_DIFFUSIVITY: float = 0.1  # [s^-1] Fraction of the carbon difference exchanged with each neighbour
+    # Wind velocity [grid cells s^-1] of shape (len(shape), *reversed(shape)), either static or a function of the time
+    wind: Optional[Union[numpy.ndarray, Callable[[float], numpy.ndarray]]] = None
+    pending_energy: Optional[float] = None  # When not None, the energy received is accumulated here to be added later
 
-    def __init__(self, shape: tuple, radius: float = 6.3781e6, *, parent=None):
-        EarthBase.__init__(self, shape, parent=parent)
+    def __init__(self, shape: tuple, radius: float = 6.3781e6, *, parent=None, periodic: bool = False):
+        EarthBase.__init__(self, shape, parent=parent, periodic=periodic)
         CelestialBody.__init__(self,
                                radius)  # The default radius of the earth was found here https://arxiv.org/abs/1510.07674
         self.get_universe().earth = self
         self.get_universe().discover_everything()
 
+    @property
+    def live_fields(self) -> Optional[EarthState]:
+        """
+        :return: the arrays in which the state of the earth is kept and updated, None when it is only in its grid chunks
+        """
+        return None
+
+    @property
+    def fields(self) -> EarthState:
+        """
+        The state of the earth as arrays. When it is only in the grid chunks, it is gathered from them on every read,
+        since the chunks and their components can be modified without the earth knowing: read it once per computation
+        :return:
+        """
+        fields = self.live_fields
+        return EarthState.from_earth(self) if fields is None else fields
+
     @property
     def average_temperature(self) -> float:
-        return sum(x.temperature for x in self.not_nones()) / max(1, self.nb_active_grid_chunks)
+        return self.compute_average_temperature()
 
     @property
     def total_mass(self):
-        return sum(x.total_mass for x in self.not_nones())
+        return self.fields.total_mass.sum()
 
     @property
     def composition(self):
-        composition_mass_dict = dict()
-        total_mass = self.total_mass
-        chunk: GridChunk
-        for chunk in self.not_nones():
-            for component in chunk:
-                composition_mass_dict[component.type] = composition_mass_dict.get(component.type,
-                                                                                  0) + component.mass / total_mass
-
-        return composition_mass_dict
+        fields = self.fields
+        total_mass = fields.total_mass.sum()
+        component_mass = fields.flat(fields.mass).sum(axis=1)
+        return {component_type: mass / total_mass for component_type, mass in zip(fields.COMPONENTS, component_mass)
+                if mass > 0}
 
     @property
     def carbon_flux_to_ocean(self):
@@ -64,11 +87,13 @@ class Earth(EarthBase, CelestialBody):
         return 300_000
 
     def __str__(self):
-        res = f"Earth : \n" \
-              f"- Mass {self.total_mass}\n" \
-              f"- Average temperature: {self.compute_average_temperature()}\n" \
-              f"- Composition: \n\t{f'{chr(10) + chr(9)} '.join(str(round(value * 100, 2)) + '% ' + key for key, value in self.composition.items())}"
-        return res
+        return str(self.totals())
+
+    def totals(self) -> EarthTotals:
+        """
+        :return: the mass, composition, energy and average temperature of the earth, from a single pass over its fields
+        """
+        return reduce_state(self.fields)
 
     def add_energy(self, input_energy: float):
         """
@@ -76,10 +101,58 @@ class Earth(EarthBase, CelestialBody):
         :param input_energy:
         :return:
         """
+        if self.pending_energy is not None:
+            self.pending_energy += input_energy
+            return
         energy_each = input_energy / (self.nb_active_grid_chunks or 1)
         if energy_each:
             for elem in self.not_nones():
                 elem.add_energy(energy_each)
+            self.modified()
+
+    def paint(self, mask: numpy.ndarray, chunk: Optional[GridChunk]):
+        """
+        Fill the cells of the mask with copies of the chunk, in one assignment
+        :param mask: (*reversed(shape)) True on the cells to paint
+        :param chunk: the chunk to copy, None to empty the cells
+        :return:
+        """
+        indices = numpy.flatnonzero(mask).tolist()
+        self.set_chunks(indices, (None if chunk is None else chunk.clone(index, self) for index in indices))
+
+    def cells(self, indices: numpy.ndarray) -> EarthState:
+        """
+        :param indices: flat indices of grid chunks of the earth
+        :return: the state of these grid chunks, as a state of shape (len(indices),)
+        """
+        return EarthState.from_chunks((self[index] for index in indices.tolist()), (len(indices),))
+
+    def restore(self, indices: numpy.ndarray, chunk_classes: list[Optional[type]], cells: EarthState):
+        """
+        Replace the grid chunks at the indices by new ones built from their state, in one assignment
+        :param indices: flat indices of grid chunks of the earth
+        :param chunk_classes: class of the new grid chunk at each index, None to empty the cell
+        :param cells: state of the new grid chunks, one cell for each class that is not None, in order
+        :return:
+        """
+        volume, carbon_ppm = iter(cells.volume.tolist()), iter(cells.carbon_ppm.tolist())
+        chunks = [None if chunk_class is None else chunk_class([], volume=next(volume), carbon_ppm=next(carbon_ppm),
+                                                               index=index)
+                  for index, chunk_class in zip(indices.tolist(), chunk_classes)]
+        for chunk in chunks:
+            if chunk is not None:
+                chunk.earth = self  # After building the chunks, their neighbours are found by set_chunks
+        cells.write_to(chunk for chunk in chunks if chunk is not None)
+        self.set_chunks(indices.tolist(), chunks)
+
+    def wind_at(self, time: float) -> Optional[numpy.ndarray]:
+        """
+        :param time: time of the simulation in seconds
+        :return: the wind velocity at that time, None if there is no wind
+        """
+        if callable(self.wind):
+            return self.wind(time)
+        return self.wind
 
     def compute_total_energy(self):
         return sum(elem.energy for elem in self.not_nones())
@@ -88,4 +161,5 @@ class Earth(EarthBase, CelestialBody):
         self.add_energy(energy * (1 - self.albedo))
 
     def compute_average_temperature(self):
-        return sum(x.temperature for x in self.not_nones()) / max(1, self.nb_active_grid_chunks)
+        fields = self.fields
+        return fields.temperature[fields.active].sum() / max(1, self.nb_active_grid_chunks)
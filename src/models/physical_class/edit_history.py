@@ -0,0 +1,204 @@
+import contextlib
+import sys
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Iterator, Optional, Union
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.base_class.earth_base import EarthBase
+
+if TYPE_CHECKING:
+    from models.physical_class.earth import Earth
+    from models.physical_class.grid_chunk import GridChunk
+
+
+def set_attribute(target: Any, name: str, value: Any):
+    """
+    setattr, and EarthBase.modified when the target is an earth, so that the values derived from it are computed again
+    """
+    setattr(target, name, value)
+    if isinstance(target, EarthBase):
+        target.modified()
+
+
+@dataclass
+class CellsEdit:
+    """
+    The grid chunks of some cells of an earth before an edit, as arrays: their flat indices, the class of their chunk
+    (as a code in `chunk_classes`, 0 for no chunk) and the state of the cells that have a chunk. Painting over empty
+    cells thus costs 9 bytes per cell.
+    """
+    earth: "Earth"
+    indices: numpy.ndarray  # (n,) Flat indices of the cells
+    chunk_classes: tuple[Optional[type], ...]  # Classes of the chunks, the first one is None
+    codes: numpy.ndarray  # (n,) uint8 Position of the class of the chunk of each cell in chunk_classes
+    cells: EarthState  # State of the cells whose code is not 0, in order
+
+    @classmethod
+    def capture(cls, earth: "Earth", indices: numpy.ndarray) -> "CellsEdit":
+        """
+        :param earth:
+        :param indices: flat indices of the cells to keep
+        :return: the current state of the cells
+        """
+        indices = numpy.asarray(indices, dtype=numpy.int64)
+        chunk_classes = {None: 0}
+        codes = numpy.fromiter((chunk_classes.setdefault(None if earth[index] is None else type(earth[index]),
+                                                         len(chunk_classes)) for index in indices.tolist()),
+                               dtype=numpy.uint8, count=len(indices))
+        return cls(earth, indices, tuple(chunk_classes), codes, earth.cells(indices[codes > 0]))
+
+    @property
+    def nbytes(self) -> int:
+        return self.indices.nbytes + self.codes.nbytes + sum(getattr(self.cells, name).nbytes
+                                                             for name in EarthState.FIELDS)
+
+    def restore(self) -> "CellsEdit":
+        """
+        Put the cells back in the earth, in O(number of cells)
+        :return: the edit that puts back the cells as they were before the restore
+        """
+        inverse = self.capture(self.earth, self.indices)
+        self.earth.restore(self.indices, [self.chunk_classes[code] for code in self.codes.tolist()], self.cells)
+        return inverse
+
+
+@dataclass
+class AttributeEdit:
+    """
+    The value of an attribute of an object (albedo of the earth, TIME_DELTA of the universe, ...) before an edit
+    """
+    target: Any
+    name: str
+    value: Any
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.value)
+
+    def restore(self) -> "AttributeEdit":
+        inverse = AttributeEdit(self.target, self.name, getattr(self.target, self.name))
+        set_attribute(self.target, self.name, self.value)
+        return inverse
+
+
+@dataclass
+class EditGroup:
+    """
+    Edits undone and redone together, such as the properties confirmed in one popup
+    """
+    edits: list[Union[CellsEdit, AttributeEdit]]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(edit.nbytes for edit in self.edits)
+
+    def restore(self) -> "EditGroup":
+        return EditGroup([edit.restore() for edit in reversed(self.edits)])
+
+
+Edit = Union[CellsEdit, AttributeEdit, EditGroup]
+
+
+class EditHistory:
+    """
+    Undo and redo stacks of the edits of a universe. Each entry only keeps what an edit changed (see CellsEdit,
+    AttributeEdit), undoing it stores the current values in the redo stack and the other way around.
+    The memory used by both stacks is kept under the budget by forgetting the oldest edits.
+    """
+    BUDGET: int = 64 * 2 ** 20  # [bytes]
+
+    def __init__(self, budget: int = None):
+        self.budget = self.BUDGET if budget is None else budget
+        self.undo_stack: deque[Edit] = deque()
+        self.redo_stack: list[Edit] = []
+        self.nbytes = 0
+        self.__group: Optional[list[Edit]] = None  # Edits of the current group, see group
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+
+    def record(self, edit: Edit):
+        """
+        Add an edit that was just done, the edits that were undone cannot be redone anymore
+        :param edit: the values before the edit
+        :return:
+        """
+        if self.__group is not None:
+            self.__group.append(edit)
+            return
+        self.nbytes -= sum(redo.nbytes for redo in self.redo_stack)
+        self.redo_stack.clear()
+        self.undo_stack.append(edit)
+        self.nbytes += edit.nbytes
+        self.__evict()
+
+    def __evict(self):
+        while self.nbytes > self.budget and self.undo_stack:
+            self.nbytes -= self.undo_stack.popleft().nbytes
+
+    @contextlib.contextmanager
+    def group(self) -> Iterator[None]:
+        """
+        The edits recorded in this context are undone and redone together
+        """
+        if self.__group is not None:
+            yield
+            return
+        self.__group = []
+        try:
+            yield
+        finally:
+            edits, self.__group = self.__group, None
+            if edits:
+                self.record(edits[0] if len(edits) == 1 else EditGroup(edits))
+
+    def paint(self, earth: "Earth", mask: numpy.ndarray, chunk: Optional["GridChunk"]):
+        """
+        Earth.paint, recorded
+        """
+        self.record(CellsEdit.capture(earth, numpy.flatnonzero(mask)))
+        earth.paint(mask, chunk)
+
+    def set(self, target: Any, name: str, value: Any):
+        """
+        setattr, recorded when the value changes
+        """
+        if getattr(target, name) == value:
+            return
+        self.record(AttributeEdit(target, name, getattr(target, name)))
+        set_attribute(target, name, value)
+
+    def undo(self) -> Optional[Edit]:
+        """
+        :return: the edit done to undo the last one, None if there was nothing to undo
+        """
+        return self.__move(self.undo_stack, self.redo_stack)
+
+    def redo(self) -> Optional[Edit]:
+        """
+        :return: the edit done to redo the last undone one, None if there was nothing to redo
+        """
+        return self.__move(self.redo_stack, self.undo_stack)
+
+    def __move(self, source: Union[deque, list], destination: Union[deque, list]) -> Optional[Edit]:
+        if not source:
+            return None
+        edit = source.pop()
+        inverse = edit.restore()
+        destination.append(inverse)
+        self.nbytes += inverse.nbytes - edit.nbytes
+        self.__evict()
+        return edit
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.nbytes = 0
@@ -1,7 +1,10 @@
 from typing import Collection, Union
 
+import numpy
+
 from models.base_class.grid_chunk_base import GridChunkBase
 from models.physical_class.chunk_component import ChunkComponent
+from models.physical_class.component_registry import COMPONENT_REGISTRY
 
 
 class GridChunk(GridChunkBase):
@@ -9,8 +12,11 @@ class GridChunk(GridChunkBase):
     Second Layer of the GridChunk model
     The physical properties aspect of the GridChunk
     """
+    MIXTURE_THRESHOLD: float = 0.01  # Change of a mass ratio above which the mixture properties are computed again
     specific_heat_capacity: float
     heat_transfer_coefficient: float
+    mixture_ratio: dict[str, float]  # Mass ratios for which the two mixture properties above were computed
+    conductance: float  # [J K^-1 s^-1] Energy exchanged with a neighbour per degree of difference and per second
     total_mass: float  # [kg]
     volume: float  # [m3]
     carbon_ppm: float  # [ppm]
@@ -25,21 +31,15 @@ class GridChunk(GridChunkBase):
 
         if not len(self):
             return  # Do not compute specific heat capacity of empty Grid Chunk
-        self.specific_heat_capacity = sum(
-            component.specific_heat_capacity * self.get_ratio_of_component(component.type)
-            for i, component in enumerate(self)) / len(self)
-
-        self.heat_transfer_coefficient = sum(
-            component.heat_transfer_coefficient * self.get_ratio_of_component(component.type)
-            for i, component in enumerate(self)) / len(self)
+        self.update_mixture_properties(force=True)
 
     def __str__(self):
         res = f"Chunk" + (f" {str(self.index)}\n" if self.index is not None else "\n") + \
               f"Temperature {self.temperature}°C\n" + \
               f"Mass {self.total_mass}kg\n" + \
               f"Composition (mass ratio)\n"
-        for component in self:
-            res += f"{round(self.get_ratio_of_component(component) * 100, 2)}% {component.type}\n"
+        for component_type, ratio in self.get_mass_ratio().items():
+            res += f"{round(ratio * 100, 2)}% {component_type}\n"
         if self.carbon_ppm:
             res += f"Carbon PPM {self.carbon_ppm}\n"
         return res
@@ -49,8 +49,43 @@ class GridChunk(GridChunkBase):
             component_type = component_type.type
         return self[component_type].mass / self.total_mass
 
+    def update_mixture_properties(self, *, force: bool = False) -> bool:
+        """
+        Compute again the specific heat capacity and heat transfer coefficient of the mixture if the mass ratios of the
+        components changed by more than MIXTURE_THRESHOLD since they were last computed
+        :param force: compute them whatever the change
+        :return: if they were computed again
+        """
+        if not len(self):
+            return False
+        ratios = self.get_mass_ratio()
+        if not force and all(abs(ratios.get(component_type, 0) - self.mixture_ratio.get(component_type, 0)) <=
+                             self.MIXTURE_THRESHOLD for component_type in ratios.keys() | self.mixture_ratio.keys()):
+            return False
+        weights = numpy.zeros(len(COMPONENT_REGISTRY))
+        for component in self:
+            weights[component.id] = ratios[component.type]
+        specific_heat_capacity, heat_transfer_coefficient = COMPONENT_REGISTRY.mixture(weights)
+        self.set_mixture_properties(float(specific_heat_capacity) / len(self),
+                                    float(heat_transfer_coefficient) / len(self), ratios)
+        return True
+
+    def set_mixture_properties(self, specific_heat_capacity: float, heat_transfer_coefficient: float,
+                               ratios: dict[str, float]):
+        """
+        :param specific_heat_capacity:
+        :param heat_transfer_coefficient:
+        :param ratios: the mass ratios for which they were computed
+        :return:
+        """
+        self.specific_heat_capacity = specific_heat_capacity
+        self.heat_transfer_coefficient = heat_transfer_coefficient
+        self.mixture_ratio = ratios
+        self.conductance = heat_transfer_coefficient / self.surface * specific_heat_capacity
+
     def get_mass_ratio(self):
-        return {c.type: c.mass / self.total_mass for c in self}
+        total_mass = self.total_mass
+        return {c.type: c.mass / total_mass for c in self}
 
     @property
     def total_mass(self):
@@ -78,6 +113,21 @@ class GridChunk(GridChunkBase):
         return self.__class__(tuple(component.deep_copy() for component in self), self.volume, index=new_index,
                               earth=new_parent, carbon_ppm=self.carbon_ppm)
 
+    def clone(self, index: int = None, earth=None) -> "GridChunk":
+        """
+        Same as deep_copy, but the mixture properties are copied instead of being computed again, and the neighbours
+        are left to the earth (see EarthBase.set_chunks). Used to paint many copies of a chunk at once
+        :param index:
+        :param earth:
+        :return:
+        """
+        chunk = self.__class__.__new__(self.__class__)
+        chunk.__dict__.update(self.__dict__)
+        chunk.index, chunk.earth, chunk.neighbours = index, earth, None
+        chunk.components = [None if component is None else component.clone(chunk) for component in self.components]
+        chunk.mixture_ratio = dict(self.mixture_ratio)
+        return chunk
+
     def add_energy(self, value: float):
         for component in self:
             component.energy += value * self.get_ratio_of_component(component)
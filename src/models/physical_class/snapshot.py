@@ -0,0 +1,96 @@
+import contextlib
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator, Optional
+
+import numpy
+
+from models.physical_class.summary import UniverseSummary
+
+if TYPE_CHECKING:
+    from models.physical_class.universe import Universe
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    State of a universe at the end of a tick, as published for the views. Its arrays are read only
+    """
+    tick: int
+    time: float  # [s]
+    temperature: numpy.ndarray  # (*reversed(earth.shape)) Temperature of each cell
+    active: numpy.ndarray  # (*reversed(earth.shape)) False where the earth has no grid chunk
+    summary: UniverseSummary
+
+
+class SnapshotBuffer:
+    """
+    Double buffer of the snapshots of a universe, between the thread updating it and the views.
+    A snapshot is written in the back buffer (reusing its arrays), which then becomes the front one. The views read the
+    front buffer through `latest`. Publishing never waits for the views: when they still read the back buffer (the
+    front one before the last publication), the publication is skipped.
+    """
+    def __init__(self):
+        self.__buffers: list[Optional[Snapshot]] = [None, None]
+        self.__readers = [0, 0]  # Number of views reading each buffer
+        self.__front = 0
+        self.__lock = threading.Lock()  # Only held to read or change the indices above, never while copying
+        self.published = 0
+        self.skipped = 0
+
+    def publish(self, universe: "Universe") -> bool:
+        """
+        Must be called by the thread updating the universe, between two ticks
+        :param universe:
+        :return: if the snapshot was published
+        """
+        summary = universe.summary
+        with self.__lock:
+            front, back = self.__buffers[self.__front], 1 - self.__front
+            if front is not None and front.summary.key == summary.key:
+                return True  # Nothing changed since the last publication
+            if self.__readers[back]:
+                self.skipped += 1
+                return False
+        snapshot = self.__capture(universe, summary, self.__buffers[back])
+        with self.__lock:
+            self.__buffers[back] = snapshot
+            self.__front = back
+            self.published += 1
+        return True
+
+    @staticmethod
+    def __capture(universe: "Universe", summary: UniverseSummary, previous: Optional[Snapshot]) -> Snapshot:
+        """
+        :param universe:
+        :param summary: summary of the universe now
+        :param previous: the snapshot of the back buffer, whose arrays are reused when they have the right shape
+        :return:
+        """
+        fields = universe.earth.fields
+        arrays = {}
+        for name in ("temperature", "active"):
+            value = getattr(fields, name)
+            array = None if previous is None else getattr(previous, name)
+            if array is None or array.shape != value.shape or array.dtype != value.dtype:
+                array = numpy.empty_like(value)
+            array.flags.writeable = True
+            numpy.copyto(array, value)
+            array.flags.writeable = False
+            arrays[name] = array
+        return Snapshot(tick=summary.tick, time=summary.time, **arrays, summary=summary)
+
+    @contextlib.contextmanager
+    def latest(self) -> Iterator[Optional[Snapshot]]:
+        """
+        The snapshot is not overwritten while it is read in this context
+        :return: the last snapshot published, None if there is none
+        """
+        with self.__lock:
+            front = self.__front
+            self.__readers[front] += 1
+        try:
+            yield self.__buffers[front]
+        finally:
+            with self.__lock:
+                self.__readers[front] -= 1
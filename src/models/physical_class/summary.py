@@ -0,0 +1,47 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+from models.array_class.reduction import EarthTotals
+
+if TYPE_CHECKING:
+    from models.physical_class.universe import Universe
+
+
+@dataclass(frozen=True)
+class UniverseSummary:
+    """
+    Statistics of a universe at one tick, from which the views and the command lines describe it without reading the
+    model again. Built by Universe.summary once per tick and state of the earth
+    """
+    tick: int
+    time: float  # [s]
+    earth: Optional[EarthTotals]
+    sun: Optional[str]  # Description of the sun, it reads no grid chunk
+    key: tuple = field(repr=False, compare=False)  # Version of the universe it was built from, see key_of
+
+    @staticmethod
+    def key_of(universe: "Universe") -> tuple:
+        """
+        :param universe:
+        :return: a value that changes when the summary of the universe must be built again: the tick, the version of the
+            earth (see EarthBase.modified) and of its arrays when it has some, and the parameters of the sun
+        """
+        earth, sun = universe.earth, universe.sun
+        fields = None if earth is None else earth.live_fields
+        return (universe.get_time(), universe.TIME_DELTA, None if earth is None else earth.version,
+                None if fields is None else (id(fields), fields.version), None if sun is None else str(sun))
+
+    @classmethod
+    def from_universe(cls, universe: "Universe", key: tuple = None) -> "UniverseSummary":
+        key = cls.key_of(universe) if key is None else key
+        earth = None if universe.earth is None else universe.earth.totals()
+        return cls(tick=universe.get_time(), time=universe.get_time() * universe.TIME_DELTA, earth=earth,
+                   sun=None if universe.sun is None else str(universe.sun), key=key)
+
+    def __str__(self):
+        res = ""
+        if self.sun is not None:
+            res += f"{self.sun}\n"
+        if self.earth is not None:
+            res += f"{self.earth}\n"
+        return res
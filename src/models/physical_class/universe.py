@@ -1,15 +1,25 @@
 import math
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional, Protocol
 
 from models.ABC.ticking_model import TickingModel
+from models.physical_class.snapshot import SnapshotBuffer
+from models.physical_class.summary import UniverseSummary
 from models.physical_class.sun import Sun
 
 if TYPE_CHECKING:
     from models.ABC.celestial_body import CelestialBody
+    from models.array_class.parareal import PararealReport
 from models.base_class.universe_base import UniverseBase
 from models.physical_class.earth import Earth
 
 
+class Recorder(Protocol):
+    def record(self, universe: "Universe"):
+        """
+        Called after each tick of the universe, in the thread updating it
+        """
+
+
 class Universe(UniverseBase, TickingModel):
     """
     Special case of the second layer of the model. This is a special case because it is a Singleton and contains all the
@@ -21,17 +31,40 @@ class Universe(UniverseBase, TickingModel):
     """
     TIME_DELTA: float = 0.01
     EVAPORATION_RATE: float = 0.0001
+    # The object engine updates the earth chunk per chunk and is the reference. The array engine keeps the state of the
+    # earth in arrays between the ticks and updates it with array stages
+    ENGINES: tuple[str, ...] = ("object", "array")
+    ENGINE: str = "object"
+    SYNC_INTERVAL: int = 1  # [ticks] With the array engine, how often the grid chunks are updated from the arrays
+    TILE_SIZE: int = 64  # [cells] Side of the tiles that can be dormant, see DORMANT_THRESHOLD
+    # Relative change per tick under which a tile of TILE_SIZE cells is dormant and no longer updated by the rules (the
+    # energy received is still deposited). 0 updates every tile and keeps the array engine exact
+    DORMANT_THRESHOLD: float = 0
+    # Precision of the arrays of the array engine: float64, float32 (half the memory and bandwidth) or mixed (float32
+    # arrays with float64 sums over the earth), see models.array_class.precision to measure the drift
+    PRECISION: str = "float64"
+    SNAPSHOT_INTERVAL: int = 10  # [ticks] How often the running simulation publishes a snapshot for the views
 
     def __init__(self):
         super().__init__()
+        self.snapshots = SnapshotBuffer()  # Read by the views while the simulation runs in another thread
+        self.recorders: list[Recorder] = []  # Exporters of the frames of the simulation, see attach
+        self.__summary: Optional[UniverseSummary] = None
 
     def __str__(self):
-        res = ""
-        if self.sun is not None:
-            res += f"{self.sun.__str__()}\n"
-        if self.earth is not None:
-            res += f"{self.earth.__str__()}\n"
-        return res
+        return str(self.summary)
+
+    @property
+    def summary(self) -> UniverseSummary:
+        """
+        The statistics of the universe, built again only when the tick or the state of the earth changed, see
+        UniverseSummary.key_of
+        :return:
+        """
+        key = UniverseSummary.key_of(self)
+        if self.__summary is None or self.__summary.key != key:
+            self.__summary = UniverseSummary.from_universe(self, key)
+        return self.__summary
 
     def discover_everything(self):
         """
@@ -61,17 +94,74 @@ class Universe(UniverseBase, TickingModel):
             return 1.496e11
 
     def update_all(self):
+        if self.ENGINE not in self.ENGINES:
+            raise ValueError(f"Unknown engine {self.ENGINE}, expected one of {self.ENGINES}")
+        if hasattr(self.earth, "update_with_pipeline") and (self.ENGINE == "array" or self.earth.ARRAYS_ONLY):
+            self.__update_all_with_arrays()
+        else:
+            for elem in self:
+                if isinstance(elem, TickingModel):
+                    elem.update()
+            self.update()
+        for recorder in self.recorders:
+            recorder.record(self)
+
+    def attach(self, recorder: Recorder):
+        """
+        :param recorder: called after each tick, such as other.animation.AnimationExporter
+        :return:
+        """
+        self.recorders.append(recorder)
+
+    def detach(self, recorder: Recorder):
+        self.recorders.remove(recorder)
+
+    def __update_all_with_arrays(self):
+        """
+        Same as update_all, but the energy radiated towards the earth is collected while the other objects are updated
+        and deposited by the last stage of the earth pipeline
+        :return:
+        """
+        self.earth.pending_energy = 0
         for elem in self:
-            if isinstance(elem, TickingModel):
+            if elem is not self.earth and isinstance(elem, TickingModel):
                 elem.update()
+        received_energy, self.earth.pending_energy = self.earth.pending_energy, None
+        synchronize = (self.get_time() + 1) % max(1, self.SYNC_INTERVAL) == 0
+        if not self.earth.update_with_pipeline(received_energy, tile_size=self.TILE_SIZE, synchronize=synchronize,
+                                               dormant_threshold=self.DORMANT_THRESHOLD, precision=self.PRECISION):
+            self.earth.update()
+            self.earth.add_energy(received_energy)
         self.update()
 
+    def synchronize(self):
+        """
+        Update the grid chunks of the earth with the arrays of the array engine, if they are behind
+        :return:
+        """
+        if hasattr(self.earth, "synchronize"):
+            self.earth.synchronize()
+
+    def run_parareal(self, ticks: int, **kwargs) -> "PararealReport":
+        """
+        Advance the universe by ticks with the Parareal algorithm, the slices of the time window being updated
+        concurrently by a pool of processes. See models.array_class.parareal.run_parareal for the parameters
+        :param ticks:
+        :return: the number of iterations and the speedup achieved
+        """
+        from models.array_class.parareal import run_parareal
+        return run_parareal(self, ticks, **kwargs)
+
     def __update_loop(self):
         while True:
             if not self.__running:
                 break
             print(f"Simulating t={self._t}")
             self.update_all()
+            if self._t % max(1, self.SNAPSHOT_INTERVAL) == 0:
+                self.snapshots.publish(self)
+        self.synchronize()
+        self.snapshots.publish(self)
         print("done")
 
     def start_simulation(self):
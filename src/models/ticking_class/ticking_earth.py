@@ -1,7 +1,20 @@
 import math
+from typing import Optional
+
+import numpy
 
 from models.ABC.ticking_model import TickingModel
+from models.array_class import advection, carbon, cell_rules, diffusion
+from models.array_class.carbon import CarbonBudget
+from models.array_class.cell_rules import CompiledCellRule
+from models.array_class.earth_state import EarthState
+from models.array_class.field_rules import FieldRule
+from models.array_class.out_of_core import MemmapStore, OutOfCorePipeline, OutOfCoreReport
+from models.array_class.pipeline import AdvectionStage, CarbonStage, CellRuleStage, DepositStage, EvaporationStage, \
+    FieldRuleStage, ImplicitDiffusionStage, MixtureStage, SpectralDiffusionStage, Stage, StencilDiffusionStage, \
+    TickPipeline, TileActivity
 from models.physical_class.earth import Earth
+from models.physical_class.grid_chunk import GridChunk
 from models.ticking_class.ticking_grid_chunk import TickingGridChunk
 
 
@@ -12,8 +25,21 @@ class TickingEarth(Earth, TickingModel):
 
     /!\ Those methods for update must be marked with @TickingModel.on_tick(enabled=True)
     """
-    def __init__(self, shape: tuple, radius: float = 6.3781e6, *, parent=None):
-        Earth.__init__(self, shape, radius, parent=parent)
+    SPECTRAL_DIFFUSION: bool = True  # Solve the diffusion in Fourier space when the earth is periodic and uniform
+    # Solve the diffusion of the array engine with implicit steps, stable for any TIME_DELTA (used by the coarse
+    # propagator of run_parareal). The object engine always uses the explicit stencil
+    IMPLICIT_DIFFUSION: bool = False
+    ARRAYS_ONLY: bool = False  # Updated by update_with_pipeline whatever the engine of the universe
+    carbon_budget: Optional[CarbonBudget] = None  # Carbon exchanged during the last carbon cycle
+    # State kept between the ticks of the array engine. The grid chunks are behind it until synchronize is called, they
+    # must be replaced through the earth (earth[i] = chunk) or modified after release_array_state
+    array_state: Optional[EarthState] = None
+    conductance_cache: Optional[diffusion.ConductanceCache] = None  # Kept between the ticks by the array stages
+    tile_activity: Optional[TileActivity] = None  # Dormant tiles of the array state, when they are skipped
+    chunks_outdated: bool = False
+
+    def __init__(self, shape: tuple, radius: float = 6.3781e6, *, parent=None, periodic: bool = False):
+        Earth.__init__(self, shape, radius, parent=parent, periodic=periodic)
         TickingModel.__init__(self)
 
     def update(self):
@@ -23,10 +49,256 @@ class TickingEarth(Earth, TickingModel):
         -------
 
         """
+        self.release_array_state()
         super().update()
+        # With a JIT, the compiled rules of the grid chunks are applied on the arrays of the whole earth at once
+        compiled_rules = self.compiled_cell_rules() if cell_rules.JIT_AVAILABLE else []
+        if compiled_rules:
+            state = EarthState.from_earth(self)
+            where = self.ticking_chunks(state.grid_shape)
+            for rule in compiled_rules:
+                rule(state, where=where)
+            state.write_to(self)
+        compiled_methods = [rule.function for rule in compiled_rules]
         for elem in self.not_nones():
             if isinstance(elem, TickingGridChunk):
-                elem.update()
+                elem.update(exclude=compiled_methods if type(elem) is TickingGridChunk else ())
+        self.modified()
+
+    @property
+    def live_fields(self) -> Optional[EarthState]:
+        """
+        With the array engine, the state it updates, which is ahead of the grid chunks
+        :return:
+        """
+        return self.array_state
+
+    def ticking_chunks(self, grid_shape: tuple) -> Optional[numpy.ndarray]:
+        """
+        :param grid_shape:
+        :return: mask of the chunks that follow the TickingGridChunk rules, None if all the chunks do
+        """
+        ticking = [type(chunk) is TickingGridChunk for chunk in self.not_nones()]
+        if all(ticking):
+            return None
+        return numpy.array([type(chunk) is TickingGridChunk for chunk in self]).reshape(grid_shape)
+
+    def compiled_cell_rules(self) -> list[CompiledCellRule]:
+        """
+        :return: the compiled versions of the enabled grid chunk rules. Empty if one of them cannot be compiled, since
+        the rules must be applied in order
+        """
+        rules = []
+        for method in self.on_tick_methods:
+            if not method.enabled or method.__module__ != TickingGridChunk.__module__:
+                continue
+            rule = cell_rules.compiled_rule(method)
+            if rule is None or not rule.verify(chunk for chunk in self.not_nones() if type(chunk) is TickingGridChunk):
+                return []
+            rules.append(rule)
+        return rules
+
+    def __setitem__(self, key, value):
+        self.release_array_state()
+        super().__setitem__(key, value)
+
+    def paint(self, mask: numpy.ndarray, chunk: Optional[GridChunk]):
+        """
+        With the array engine, the chunk is painted in its state as well, instead of the state being gathered again
+        from the grid chunks
+        """
+        super().paint(mask, chunk)
+        if self.array_state is not None:
+            cell = EarthState.empty((1,)) if chunk is None else EarthState.from_chunks([chunk], (1,))
+            self.array_state.fill(mask, cell)
+            if self.tile_activity is not None:
+                self.tile_activity.wake()
+
+    def cells(self, indices: numpy.ndarray) -> EarthState:
+        """
+        With the array engine, the cells of its state, which is ahead of the grid chunks
+        """
+        if self.array_state is not None:
+            return self.array_state.cells(indices)
+        return super().cells(indices)
+
+    def restore(self, indices: numpy.ndarray, chunk_classes: list[Optional[type]], cells: EarthState):
+        """
+        With the array engine, the cells are written in its state as well
+        """
+        super().restore(indices, chunk_classes, cells)
+        if self.array_state is not None:
+            active = numpy.array([chunk_class is not None for chunk_class in chunk_classes], dtype=bool)
+            self.array_state.put(indices[active], cells)
+            self.array_state.put(indices[~active], EarthState.empty((int((~active).sum()),)))
+            if self.tile_activity is not None:
+                self.tile_activity.wake()
+
+    def synchronize(self):
+        """
+        Write the state of the array engine into the grid chunks if they are behind
+        :return:
+        """
+        if self.array_state is not None and self.chunks_outdated:
+            self.array_state.write_to(self)
+            self.modified()
+        self.chunks_outdated = False
+
+    def release_array_state(self):
+        """
+        Go back to the grid chunks as the only state of the earth
+        :return:
+        """
+        self.synchronize()
+        self.array_state = None
+        self.tile_activity = None
+
+    @classmethod
+    def field_rule(cls, name: str, updates: dict[str, str], *, enabled: bool = True, doc: str = None) -> FieldRule:
+        """
+        Register a rule of the earth written as expressions over its fields, see FieldRule. The rule is then updated
+        with the other on_tick methods, by both engines
+        :param name:
+        :param updates: expression of the new value of each field written
+        :param enabled:
+        :param doc:
+        :return: the rule, that can be removed from on_tick_methods
+        """
+        if any(method.__name__ == name and method.__module__ == cls.__module__ for method in cls.on_tick_methods):
+            raise ValueError(f"The earth already has an update method called {name}")
+        rule = FieldRule(name, updates, module=cls.__module__, enabled=enabled, doc=doc)
+        cls.on_tick_methods.append(rule)
+        return rule
+
+    def update_with_pipeline(self, received_energy: float, *, tile_size: int = 64, synchronize: bool = True,
+                             dormant_threshold: float = 0, precision: str = "float64") -> bool:
+        """
+        Same as update followed by add_energy, but the rules are applied as array stages on the state of the earth.
+        The state is gathered from the grid chunks on the first call and then kept in array_state for the next ones.
+        :param received_energy: energy received by the earth during the tick
+        :param tile_size: side of the tiles that can be dormant [cells]
+        :param synchronize: write the state back into the grid chunks after the tick
+        :param dormant_threshold: relative change under which a tile is dormant and skipped (see TileActivity), 0 to
+        update every tile
+        :param precision: precision of the arrays, one of EarthState.PRECISIONS
+        :return: False if some enabled rules have no array equivalent, in which case nothing was done
+        """
+        if self.array_state is None:
+            state = EarthState.from_earth(self, precision=precision)
+        else:
+            state = self.array_state.with_precision(precision)
+        stages = self.pipeline_stages(state, received_energy)
+        if stages is None:
+            self.release_array_state()
+            return False
+        if dormant_threshold <= 0:
+            self.tile_activity = None
+        elif self.tile_activity is None or self.tile_activity.grid_shape != state.grid_shape or \
+                self.tile_activity.tile_size != tile_size:
+            self.tile_activity = TileActivity(state.grid_shape, tile_size, dormant_threshold)
+        else:
+            self.tile_activity.threshold = dormant_threshold
+        TickPipeline(stages, tile_size=tile_size, periodic=self.periodic, activity=self.tile_activity).run(state)
+        self.array_state, self.chunks_outdated = state, True
+        self.modified()
+        if synchronize:
+            self.synchronize()
+        for stage in stages:
+            if isinstance(stage, CarbonStage):
+                self.carbon_budget = stage.budget
+        self._t += 1
+        return True
+
+    def pipeline_stages(self, state: EarthState, received_energy: float) -> Optional[list[Stage]]:
+        """
+        :param state: the state of the earth before the tick
+        :param received_energy: energy received by the earth during the tick
+        :return: the array stages equivalent to the enabled rules of the earth and its grid chunks, followed by the
+        deposit of the energy received. None if some enabled rules have no array equivalent
+        """
+        chunk_types = self.chunk_types()
+        if not chunk_types <= {GridChunk, TickingGridChunk}:
+            return None
+        time_delta = self.get_universe().TIME_DELTA
+        stages = []
+        for method in self.on_tick_methods:
+            if not method.enabled or method.__module__ != self.__module__:
+                continue
+            if method is TickingEarth.average_temperature:
+                stages.extend(self.diffusion_stages(state, time_delta))
+            elif method is TickingEarth.carbon_cycle:
+                stages.append(CarbonStage(emissions=self.CARBON_EMISSIONS_PER_TIME_DELTA,
+                                          ocean_uptake=self.carbon_flux_to_ocean, land_decay=self.land_carbon_decay,
+                                          biosphere_absorption=self.biosphere_carbon_absorption))
+            elif method is TickingEarth.wind_advection:
+                wind = self.wind_at(self.get_time() * time_delta)
+                if wind is not None:
+                    stages.append(AdvectionStage(wind, time_delta))
+            elif isinstance(method, FieldRule):
+                stages.append(FieldRuleStage(method, method.constants(self)))
+            else:
+                return None
+        if TickingGridChunk in chunk_types:
+            # Only the TickingGridChunk follow the grid chunk rules
+            ticking = self.ticking_chunks(state.grid_shape)
+            for method in self.on_tick_methods:
+                if not method.enabled or method.__module__ != TickingGridChunk.__module__:
+                    continue
+                if method is TickingGridChunk.water_evaporation:
+                    stages.append(EvaporationStage(self.get_universe().EVAPORATION_RATE, time_delta, where=ticking))
+                    continue
+                rule = cell_rules.compiled_rule(method)
+                if rule is None or not rule.verify(chunk for chunk in self.not_nones()
+                                                   if type(chunk) is TickingGridChunk):
+                    return None
+                stages.append(CellRuleStage(rule, where=ticking))
+        stages.append(DepositStage(received_energy))
+        return stages
+
+    def chunk_types(self) -> set[type]:
+        """
+        :return: the classes of the grid chunks of the earth
+        """
+        return {type(chunk) for chunk in self.not_nones()}
+
+    def diffusion_stages(self, state: EarthState, time_delta: float) -> list[Stage]:
+        """
+        :param state: the state of the earth before the tick
+        :param time_delta:
+        :return: the array stages equivalent to average_temperature
+        """
+        # As average_temperature, the mixture properties are refreshed before choosing the method
+        diffusion.refresh_mixture(state, GridChunk.MIXTURE_THRESHOLD)
+        if self.SPECTRAL_DIFFUSION and self.periodic and diffusion.is_uniform(state):
+            return [SpectralDiffusionStage(time_delta)]
+        if self.conductance_cache is None:
+            self.conductance_cache = diffusion.ConductanceCache()
+        if self.IMPLICIT_DIFFUSION:
+            return [ImplicitDiffusionStage(time_delta, cache=self.conductance_cache)]
+        return [StencilDiffusionStage(time_delta, cache=self.conductance_cache)]
+
+    def uniform_chunks(self) -> bool:
+        """
+        Same as diffusion.is_uniform, checked on the grid chunks: a mixed earth is found out from its first chunks
+        without gathering its state
+        :return:
+        """
+        if self.nb_active_grid_chunks != len(self):
+            return False
+
+        def properties(chunk: GridChunk) -> tuple:
+            return (chunk.volume, getattr(chunk, "specific_heat_capacity", 0),
+                    getattr(chunk, "heat_transfer_coefficient", 0), *(component.mass for component in chunk))
+
+        first = self[0]
+        types = [component.type for component in first]
+        reference = properties(first)
+        for chunk in self.not_nones():
+            if [component.type for component in chunk] != types or \
+                    not all(math.isclose(value, expected, rel_tol=1e-9, abs_tol=0)
+                            for value, expected in zip(properties(chunk), reference)):
+                return False
+        return True
 
     @TickingModel.on_tick(enabled=True)
     def average_temperature(self):
@@ -34,29 +306,165 @@ class TickingEarth(Earth, TickingModel):
         Balances the temperature of each point on the earth
         :return:
         """
+        for elem in self.not_nones():
+            elem.update_mixture_properties()
+        if self.SPECTRAL_DIFFUSION and self.periodic and self.uniform_chunks():
+            state = EarthState.from_earth(self)
+            diffusion.spectral_diffusion(state, self.get_universe().TIME_DELTA)
+            state.write_to(self)
+            return
+        # Heterogeneous composition, each pair of neighbours exchange energy
         temperature_gradiant = {}
+        temperature = {elem.index: elem.temperature for elem in self.not_nones()}  # Computed once per chunk
         # First sweep of finding the temperature difference
         for elem in self.not_nones():
             for neighbour in elem.neighbours:
-                if neighbour.index < elem.index or math.isclose(neighbour.temperature - elem.temperature, 0):
+                difference = temperature[neighbour.index] - temperature[elem.index]
+                if neighbour.index < elem.index or math.isclose(difference, 0):
                     continue  # Already computed the other way around
-                temperature_gradiant[(elem.index, neighbour.index)] = neighbour.temperature - elem.temperature
+                temperature_gradiant[(elem.index, neighbour.index)] = difference
         # Second sweep to apply the difference
         for elem in self.not_nones():
             for neighbour in elem.neighbours:
                 if neighbour.index < elem.index or (elem.index, neighbour.index) not in temperature_gradiant:
                     continue  # Already computed the other way around
-                energy_exchanged = temperature_gradiant[(elem.index,
-                                                         neighbour.index)] * elem.heat_transfer_coefficient * self.get_universe().TIME_DELTA / elem.surface
-                elem.add_energy(energy_exchanged * elem.specific_heat_capacity)
-                neighbour.add_energy(-energy_exchanged * elem.specific_heat_capacity)
+                energy_exchanged = temperature_gradiant[(elem.index, neighbour.index)] * \
+                    (elem.conductance * self.get_universe().TIME_DELTA)
+                elem.add_energy(energy_exchanged)
+                neighbour.add_energy(-energy_exchanged)
 
     @TickingModel.on_tick(enabled=False)
     def carbon_cycle(self):
         """
-        Globally computes carbon flow to be applied to each grid chunk
+        Computes the carbon flow of each grid chunk: the ocean absorbs with respect to the water in the chunk while the
+        biomass decays and grows with respect to the land in the chunk
         :return:
         """
-        carbon = self.CARBON_EMISSIONS_PER_TIME_DELTA - self.carbon_flux_to_ocean + self.land_carbon_decay - self.biosphere_carbon_absorption
-        for chunk in self.not_nones():
-            chunk.carbon_ppm += carbon / self.nb_active_grid_chunks
+        state = EarthState.from_earth(self)
+        self.carbon_budget = carbon.carbon_cycle(state, emissions=self.CARBON_EMISSIONS_PER_TIME_DELTA,
+                                                 ocean_uptake=self.carbon_flux_to_ocean,
+                                                 land_decay=self.land_carbon_decay,
+                                                 biosphere_absorption=self.biosphere_carbon_absorption)
+        state.write_to(self, components=False)
+
+    @TickingModel.on_tick(enabled=True)
+    def wind_advection(self):
+        """
+        Moves the air, the heat it carries and the carbon along the wind with a semi-Lagrangian scheme
+        :return:
+        """
+        time_delta = self.get_universe().TIME_DELTA
+        wind = self.wind_at(self.get_time() * time_delta)
+        if wind is None:
+            return
+        state = EarthState.from_earth(self)
+        advection.semi_lagrangian_advection(state, wind, time_delta, periodic=self.periodic)
+        state.write_to(self)
+
+
+TickingEarth.carbon_diffusion = TickingEarth.field_rule(
+    "carbon_diffusion", {"carbon_ppm": "carbon_ppm + CARBON_DIFFUSIVITY * TIME_DELTA * laplacian(carbon_ppm)"},
+    enabled=False, doc="Spreads the carbon between neighbouring grid chunks")
+
+
+class OutOfCoreEarth(TickingEarth):
+    """
+    Earth whose state lives in the files of a MemmapStore instead of grid chunks, for planets larger than the memory.
+    Every cell follows the rules of the TickingGridChunk. The earth is updated by the array stages, tile by tile (see
+    OutOfCorePipeline), whatever the engine of the universe, and synchronizing it writes the files.
+    The precision of the arrays is the one of the store.
+    """
+    HOLDS_CHUNKS = False
+    ARRAYS_ONLY = True
+    SPECTRAL_DIFFUSION = False
+    TILE_SIZE: int = 512  # [cells] The tiles are read and written as a whole, larger than the ones of TickPipeline
+    PREFETCH: bool = True  # Read the next tile while computing the current one
+    cache_bytes: Optional[int] = None  # Budget of the emulated page cache, see OutOfCorePipeline
+    report: Optional[OutOfCoreReport] = None  # Work done since the earth was created
+
+    def __init__(self, store: MemmapStore, radius: float = 6.3781e6, *, parent=None, periodic: bool = False):
+        self.store = store
+        super().__init__(store.shape, radius, parent=parent, periodic=periodic)
+        self.array_state = store.state
+        self.nb_active_grid_chunks = sum(int(tile.active.sum()) for tile in store.tiles(self.TILE_SIZE))
+
+    def update(self):
+        """
+        A tick of the rules, without received energy, applied by the pipeline as there are no grid chunks to update
+        :return:
+        """
+        self.update_with_pipeline(0)
+
+    def synchronize(self):
+        """
+        Write the modified pages of the state in the files
+        :return:
+        """
+        self.store.flush()
+        self.chunks_outdated = False
+
+    def release_array_state(self):
+        """
+        The state stays in the store
+        :return:
+        """
+        self.synchronize()
+
+    def chunk_types(self) -> set[type]:
+        return {TickingGridChunk}
+
+    def ticking_chunks(self, grid_shape: tuple) -> Optional[numpy.ndarray]:
+        return None
+
+    def diffusion_stages(self, state: EarthState, time_delta: float) -> list[Stage]:
+        """
+        The mixture properties are refreshed tile by tile, and the conductances computed on each tile instead of being
+        kept for the whole grid
+        """
+        return [MixtureStage(GridChunk.MIXTURE_THRESHOLD), StencilDiffusionStage(time_delta, cached=False)]
+
+    def update_with_pipeline(self, received_energy: float, *, tile_size: int = 64, synchronize: bool = True,
+                             dormant_threshold: float = 0, precision: str = "float64") -> bool:
+        """
+        Same as TickingEarth.update_with_pipeline, on the store. The stages are applied tile by tile, of TILE_SIZE (see
+        OutOfCorePipeline), none of them is dormant and the precision is the one of the store, so the other parameters are ignored
+        :param received_energy: energy received by the earth during the tick
+        :param synchronize: write the files after the tick
+        :return:
+        """
+        stages = self.pipeline_stages(self.store.state, received_energy)
+        if stages is None:
+            raise ValueError("Some enabled rules have no array equivalent, they cannot be applied out of core")
+        pipeline = OutOfCorePipeline(stages, self.store, tile_size=self.TILE_SIZE, periodic=self.periodic,
+                                     prefetch=self.PREFETCH, cache_bytes=self.cache_bytes)
+        pipeline.run()
+        if self.report is None:
+            self.report = OutOfCoreReport(cache_bytes=self.cache_bytes)
+        self.report.add(pipeline.report)
+        self.array_state, self.chunks_outdated = self.store.state, True
+        self.modified()
+        if synchronize:
+            self.synchronize()
+        self._t += 1
+        return True
+
+    @property
+    def total_mass(self):
+        return sum(float(tile.mass.sum(dtype=numpy.float64)) for tile in self.store.tiles(self.TILE_SIZE))
+
+    @property
+    def composition(self):
+        component_mass = numpy.zeros(len(EarthState.COMPONENTS))
+        for tile in self.store.tiles(self.TILE_SIZE):
+            component_mass += tile.flat(tile.mass).sum(axis=1, dtype=numpy.float64)
+        total_mass = component_mass.sum()
+        return {component_type: mass / total_mass for component_type, mass in zip(EarthState.COMPONENTS, component_mass)
+                if mass > 0}
+
+    def compute_total_energy(self):
+        return sum(float(tile.energy.sum(dtype=numpy.float64)) for tile in self.store.tiles(self.TILE_SIZE))
+
+    def compute_average_temperature(self):
+        temperature = sum(float(tile.temperature[tile.active].sum(dtype=numpy.float64))
+                          for tile in self.store.tiles(self.TILE_SIZE))
+        return temperature / max(1, self.nb_active_grid_chunks)
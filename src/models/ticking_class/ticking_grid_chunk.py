@@ -18,7 +18,7 @@ class TickingGridChunk(TickingModel, GridChunk):
         GridChunk.__init__(self, components, volume, index=index, earth=earth, carbon_ppm=carbon_ppm)
         TickingModel.__init__(self)
 
-    @TickingModel.on_tick(enabled=True)
+    @TickingModel.on_tick(enabled=True, compiled=True)
     def water_evaporation(self):
         if self.water_component is None:
             return
@@ -0,0 +1,183 @@
+import argparse
+import os
+import queue
+import threading
+from typing import TYPE_CHECKING, Optional
+
+import numpy
+
+from other.heatmap import COOLWARM, colormap_lut, heatmap_pixels, unpack_rgb
+from other.png import write_png
+
+if TYPE_CHECKING:
+    from models.physical_class.universe import Universe
+
+
+class AnimationExporter:
+    """
+    Write heatmaps of fields of the earth as numbered PNG frames, every `interval` ticks of a universe it is attached to
+    (see Universe.attach). Several fields are tiled side by side in each frame.
+    The simulation thread only copies the fields into a bounded queue; a pool of worker threads colors them with the
+    lut and encodes the frames. When the queue is full the frame is dropped (or, with `block`, the simulation waits),
+    so encoding never holds more than `queue_size` frames nor slows the simulation by more than a copy of the fields.
+    """
+    BACKGROUND = 0xff000000  # Color of the cells without grid chunk and of the gaps between the fields
+
+    def __init__(self, directory: str, fields: tuple[str, ...] = ("temperature",), *, interval: int = 10,
+                 workers: int = 2, queue_size: int = 8, block: bool = False, lut: numpy.ndarray = None,
+                 ranges: dict[str, tuple[float, float]] = None, scale: int = 1, gap: int = 4, level: int = 6,
+                 prefix: str = "frame"):
+        """
+        :param directory: where the frames are written, created if needed
+        :param fields: names of 2D fields of EarthState (temperature, carbon_ppm, total_mass, ...), from left to right
+        :param interval: [ticks] a frame is recorded when the tick is a multiple of it
+        :param workers: number of threads encoding the frames
+        :param queue_size: number of frames waiting to be encoded at most
+        :param block: when the queue is full, wait for a worker instead of dropping the frame
+        :param lut: see other.heatmap.colormap_lut, coolwarm by default
+        :param ranges: (lowest, highest) value of the colors of each field, by default the range of the field in the
+            first frame, kept for the next ones so that the colors of the frames can be compared
+        :param scale: side of the square of pixels of each cell
+        :param gap: [pixels] between two fields
+        :param level: zlib compression level of the frames
+        :param prefix: of the names of the frames
+        """
+        if not fields:
+            raise ValueError("At least one field is needed")
+        self.directory = directory
+        self.fields = tuple(fields)
+        self.interval = max(1, interval)
+        self.block = block
+        self.lut = colormap_lut(COOLWARM) if lut is None else lut
+        self.ranges = dict(ranges or {})
+        self.scale, self.gap, self.level, self.prefix = max(1, scale), gap, level, prefix
+        self.recorded = 0  # Frames queued
+        self.written = 0  # Frames encoded and written
+        self.dropped = 0  # Frames dropped because the queue was full
+        self.__queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self.__lock = threading.Lock()
+        self.__error: Optional[BaseException] = None
+        self.__closed = False
+        os.makedirs(directory, exist_ok=True)
+        self.__workers = [threading.Thread(target=self.__work, daemon=True) for _ in range(max(1, workers))]
+        for worker in self.__workers:
+            worker.start()
+
+    def __enter__(self) -> "AnimationExporter":
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def path(self, frame: int) -> str:
+        return os.path.join(self.directory, f"{self.prefix}{frame:06d}.png")
+
+    def record(self, universe: "Universe"):
+        """
+        Called by the universe after each tick, in the thread updating it
+        :param universe:
+        :return:
+        """
+        if universe.get_time() % self.interval:
+            return
+        self.capture(universe)
+
+    def capture(self, universe: "Universe") -> bool:
+        """
+        Queue a frame of the universe as it is now
+        :param universe:
+        :return: if the frame was queued, False if it was dropped
+        """
+        if self.__error is not None:
+            raise RuntimeError("Encoding a frame failed") from self.__error
+        state = universe.earth.fields
+        values = []
+        for name in self.fields:
+            value = getattr(state, name)
+            if numpy.ndim(value) != 2:
+                raise ValueError(f"{name} is not a 2D field of the earth")
+            values.append(numpy.array(value, dtype=numpy.float64))
+        active = numpy.array(state.active)
+        for name, value in zip(self.fields, values):
+            if name not in self.ranges:
+                shown = value[active] if active.any() else value
+                self.ranges[name] = (float(shown.min()), float(shown.max())) if shown.size else (0., 1.)
+        try:
+            self.__queue.put((self.recorded, values, active), block=self.block)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.recorded += 1
+        return True
+
+    def frame(self, values: list[numpy.ndarray], active: numpy.ndarray) -> numpy.ndarray:
+        """
+        :param values: (height, width) each field
+        :param active: (height, width) False where there is no grid chunk
+        :return: (height * scale, ((width + gap) * len(values) - gap) * scale, 3) uint8 RGB pixels of the frame
+        """
+        height, width = active.shape
+        pixels = numpy.full((height, (width + self.gap) * len(values) - self.gap), self.BACKGROUND, dtype=numpy.uint32)
+        for position, (name, value) in enumerate(zip(self.fields, values)):
+            start = position * (width + self.gap)
+            pixels[:, start:start + width] = heatmap_pixels(value, *self.ranges[name], self.lut, mask=active,
+                                                            background=self.BACKGROUND)
+        if self.scale > 1:
+            pixels = pixels.repeat(self.scale, axis=0).repeat(self.scale, axis=1)
+        return unpack_rgb(pixels)
+
+    def __work(self):
+        while True:
+            task = self.__queue.get()
+            try:
+                if task is None:
+                    return
+                frame, values, active = task
+                write_png(self.path(frame), self.frame(values, active), level=self.level)
+                with self.__lock:
+                    self.written += 1
+            except BaseException as error:
+                self.__error = error
+            finally:
+                self.__queue.task_done()
+
+    def close(self):
+        """
+        Wait for the queued frames to be written and stop the workers
+        :return:
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        for _ in self.__workers:
+            self.__queue.put(None)
+        for worker in self.__workers:
+            worker.join()
+        if self.__error is not None:
+            raise RuntimeError("Encoding a frame failed") from self.__error
+
+
+if __name__ == "__main__":
+    from models.array_class.equivalence import seeded_universe
+
+    parser = argparse.ArgumentParser(description="Run a seeded universe and write heatmaps of its fields as frames")
+    parser.add_argument("directory")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--interval", type=int, default=1)
+    parser.add_argument("--fields", nargs="+", default=["temperature"])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--engine", default="array")
+    arguments = parser.parse_args()
+    seeded = seeded_universe((arguments.width, arguments.height))
+    seeded.ENGINE = arguments.engine
+    with AnimationExporter(arguments.directory, tuple(arguments.fields), interval=arguments.interval,
+                           workers=arguments.workers, scale=arguments.scale, block=True) as exporter:
+        seeded.attach(exporter)
+        exporter.capture(seeded)
+        for _ in range(arguments.ticks):
+            seeded.update_all()
+        seeded.detach(exporter)
+    print(f"{exporter.written} frames written in {arguments.directory}")
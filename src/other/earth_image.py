@@ -0,0 +1,57 @@
+from typing import Optional
+
+import numpy
+from PyQt5 import QtGui
+
+from models.array_class.palette import Palette
+
+
+def image_to_pixels(image: QtGui.QImage) -> numpy.ndarray:
+    """
+    :param image:
+    :return: (height, width, 3) uint8 colors of the image, read from its buffer at once
+    """
+    image = image.convertToFormat(QtGui.QImage.Format_RGB32)
+    height, width = image.height(), image.width()
+    buffer = numpy.frombuffer(image.constBits().asstring(image.bytesPerLine() * height), dtype=numpy.uint8)
+    # Format_RGB32 stores each pixel as the 32 bits integer 0xFFRRGGBB, that is B, G, R, 255 in memory
+    return buffer.reshape((height, image.bytesPerLine() // 4, 4))[:, :width, 2::-1].copy()
+
+
+def pixels_to_image(pixels: numpy.ndarray) -> QtGui.QImage:
+    """
+    :param pixels: (height, width, 3) uint8 colors
+    :return: an image owning a copy of the colors
+    """
+    height, width = pixels.shape[:2]
+    buffer = numpy.empty((height, width, 4), dtype=numpy.uint8)
+    buffer[..., 2::-1] = pixels
+    buffer[..., 3] = 255
+    return QtGui.QImage(buffer.tobytes(), width, height, 4 * width, QtGui.QImage.Format_RGB32).copy()
+
+
+def save_earth_image(path: str, palette: Palette, codes: numpy.ndarray) -> bool:
+    """
+    Save the composition of an earth as an image, with its palette in the text of the image so that it is loaded back
+    with the same compositions
+    :param path: a PNG file
+    :param palette:
+    :param codes: (height, width) code of each cell in the palette
+    :return: if the image was saved
+    """
+    image = pixels_to_image(palette.pixels(codes))
+    image.setText(Palette.TEXT_KEY, palette.to_text())
+    return image.save(path, "PNG")
+
+
+def load_earth_image(path: str) -> Optional[tuple[Palette, numpy.ndarray]]:
+    """
+    :param path: an image, saved by save_earth_image or any other
+    :return: the palette saved in the image (the default one when there is none) and (height, width) the code of each
+        pixel in it, None if the image could not be read
+    """
+    image = QtGui.QImage(path)
+    if image.isNull():
+        return None
+    palette = Palette.from_text(image.text(Palette.TEXT_KEY))
+    return palette, palette.codes(image_to_pixels(image))
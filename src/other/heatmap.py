@@ -0,0 +1,61 @@
+from typing import Callable, Optional
+
+import numpy
+
+
+def colormap_lut(colormap: Callable[[numpy.ndarray], numpy.ndarray], size: int = 256) -> numpy.ndarray:
+    """
+    Sample a colormap once, so that the colors of a whole image are then a single indexing
+    :param colormap: a matplotlib colormap, or any function from values in [0, 1] to RGBA values in [0, 1]
+    :param size: number of colors
+    :return: (size,) the colors packed as 0xffRRGGBB, the layout of the pixels of QImage.Format_RGB32
+    """
+    rgb = (numpy.asarray(colormap(numpy.linspace(0, 1, size)))[:, :3] * 255).astype(numpy.uint32)
+    return 0xff000000 | rgb[:, 0] << 16 | rgb[:, 1] << 8 | rgb[:, 2]
+
+
+def heatmap_pixels(values: numpy.ndarray, low: float, high: float, lut: numpy.ndarray, *,
+                   mask: Optional[numpy.ndarray] = None, background: int = 0xff000000) -> numpy.ndarray:
+    """
+    :param values: (height, width) the values to show
+    :param low: value shown with the first color of the lut
+    :param high: value shown with the last color of the lut, the values outside of [low, high] get the closest color
+    :param lut: see colormap_lut
+    :param mask: (height, width) False where there is nothing to show
+    :param background: color of the pixels outside of the mask, as 0xffRRGGBB
+    :return: (height, width) contiguous uint32 pixels, that a QImage can use as its buffer
+    """
+    ratio = (values - low) / (high - low) if high != low else numpy.zeros(values.shape)
+    index = numpy.clip(numpy.nan_to_num(ratio) * len(lut), 0, len(lut) - 1).astype(numpy.intp)
+    pixels = lut[index]
+    if mask is not None:
+        pixels[~mask] = background
+    return numpy.ascontiguousarray(pixels, dtype=numpy.uint32)
+
+
+def gradient_colormap(colors: list[tuple[int, int, int]]) -> Callable[[numpy.ndarray], numpy.ndarray]:
+    """
+    A colormap without matplotlib, for the runs without display
+    :param colors: RGB colors in [0, 255] evenly spaced over [0, 1], linearly interpolated in between
+    :return: a function from values in [0, 1] to RGBA values in [0, 1], see colormap_lut
+    """
+    anchors = numpy.asarray(colors, dtype=numpy.float64) / 255
+    positions = numpy.linspace(0, 1, len(anchors))
+
+    def colormap(values: numpy.ndarray) -> numpy.ndarray:
+        rgb = [numpy.interp(values, positions, anchors[:, channel]) for channel in range(3)]
+        return numpy.stack(rgb + [numpy.ones(numpy.shape(values))], axis=-1)
+
+    return colormap
+
+
+COOLWARM = gradient_colormap([(59, 76, 192), (221, 221, 221), (180, 4, 38)])  # Close to matplotlib's coolwarm
+
+
+def unpack_rgb(pixels: numpy.ndarray) -> numpy.ndarray:
+    """
+    :param pixels: (...) uint32 colors packed as 0xffRRGGBB, see heatmap_pixels
+    :return: (..., 3) uint8 RGB colors
+    """
+    pixels = numpy.asarray(pixels, dtype=numpy.uint32)
+    return numpy.stack([pixels >> 16, pixels >> 8, pixels], axis=-1).astype(numpy.uint8)
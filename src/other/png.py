@@ -0,0 +1,43 @@
+import struct
+import zlib
+
+import numpy
+
+SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def encode_png(pixels: numpy.ndarray, *, level: int = 6) -> bytes:
+    """
+    Encode an image as a PNG file with the standard library only, so that frames are written without a display.
+    Each row is stored with the Up filter (its difference with the row above), computed for the whole image at once
+    :param pixels: (height, width, 3) uint8 RGB colors
+    :param level: zlib compression level, from 0 (fastest) to 9 (smallest)
+    :return: the content of the PNG file
+    """
+    pixels = numpy.ascontiguousarray(pixels, dtype=numpy.uint8)
+    height, width, channels = pixels.shape
+    if channels != 3:
+        raise ValueError(f"Expected RGB pixels, got {channels} channels")
+    rows = pixels.reshape((height, width * 3))
+    filtered = numpy.empty((height, width * 3 + 1), dtype=numpy.uint8)
+    filtered[:, 0] = 2  # Up filter
+    filtered[0, 1:] = rows[0]
+    numpy.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])  # Wraps around modulo 256 as the filter expects
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)  # 8 bits RGB, no interlacing
+    return (SIGNATURE + _chunk(b"IHDR", header) + _chunk(b"IDAT", zlib.compress(filtered.tobytes(), level))
+            + _chunk(b"IEND", b""))
+
+
+def write_png(path: str, pixels: numpy.ndarray, *, level: int = 6):
+    """
+    :param path:
+    :param pixels: see encode_png
+    :param level: see encode_png
+    :return:
+    """
+    with open(path, "wb") as file:
+        file.write(encode_png(pixels, level=level))
@@ -0,0 +1,141 @@
+import math
+from typing import Optional
+
+import numpy
+
+from other.viewport import Viewport
+
+
+class FieldPyramid:
+    """
+    Min, mean and max of a 2D field over blocks of 2^level x 2^level cells, for every level until the whole field is a
+    single block, so that a view shows any zoom of the field by reading only its visible blocks at one level.
+    Updating the pyramid with a new field compares it with the previous one and computes again the blocks above the
+    cells that changed only.
+    The arrays of every level are padded to an even shape with cells that have no value (count 0).
+    """
+    STATISTICS = ("min", "mean", "max")
+    # Above this ratio of changed blocks, a level is computed again as a whole, which is faster than by positions
+    DENSE_RATIO: float = 0.25
+
+    def __init__(self, shape: tuple[int, int]):
+        """
+        :param shape: (height, width) of the field
+        """
+        self.shapes = [tuple(shape)]  # Unpadded shape of each level
+        while max(self.shapes[-1]) > 1:
+            self.shapes.append(tuple(math.ceil(size / 2) for size in self.shapes[-1]))
+        padded = [tuple(size + size % 2 for size in level_shape) for level_shape in self.shapes]
+        self.minimum = [numpy.full(level_shape, numpy.inf) for level_shape in padded]
+        self.maximum = [numpy.full(level_shape, -numpy.inf) for level_shape in padded]
+        self.total = [numpy.zeros(level_shape) for level_shape in padded]
+        self.count = [numpy.zeros(level_shape, dtype=numpy.int64) for level_shape in padded]
+        self.field: Optional[numpy.ndarray] = None  # The last field given, where the mask is True
+        self.mask: Optional[numpy.ndarray] = None
+
+    @property
+    def levels(self) -> int:
+        return len(self.shapes)
+
+    def update(self, field: numpy.ndarray, mask: numpy.ndarray = None) -> int:
+        """
+        :param field: (height, width) the new values of the field
+        :param mask: (height, width) False on the cells without value
+        :return: the number of cells that changed
+        """
+        mask = numpy.ones(field.shape, dtype=bool) if mask is None else mask
+        field = numpy.where(mask, field, 0).astype(numpy.float64)
+        if self.field is None:
+            changed = numpy.ones(field.shape, dtype=bool)
+        else:
+            changed = (field != self.field) | (mask != self.mask)
+        self.field, self.mask = field, mask.copy()
+        count = int(changed.sum())
+        if not count:
+            return 0
+        height, width = self.shapes[0]
+        dense = count > self.DENSE_RATIO * height * width
+        if dense:
+            key = (slice(0, height), slice(0, width))
+        else:
+            key = rows, columns = numpy.nonzero(changed)
+        self.minimum[0][key] = numpy.where(mask[key], field[key], numpy.inf)
+        self.maximum[0][key] = numpy.where(mask[key], field[key], -numpy.inf)
+        self.total[0][key] = field[key]
+        self.count[0][key] = mask[key]
+        for level in range(1, self.levels):
+            height, width = self.shapes[level]
+            if not dense:
+                positions = numpy.unique((rows // 2) * width + columns // 2)
+                rows, columns = positions // width, positions % width
+                dense = len(positions) > self.DENSE_RATIO * height * width
+            if dense:
+                self.__reduce_dense(level)
+            else:
+                self.__reduce_positions(level, rows, columns)
+        return count
+
+    def __reduce_dense(self, level: int):
+        height, width = self.shapes[level]
+        for arrays, reduce in ((self.minimum, numpy.minimum), (self.maximum, numpy.maximum), (self.total, numpy.add),
+                               (self.count, numpy.add)):
+            below = arrays[level - 1]
+            rows = reduce(below[0::2], below[1::2])
+            reduce(rows[:, 0::2], rows[:, 1::2], out=arrays[level][:height, :width])
+
+    def __reduce_positions(self, level: int, rows: numpy.ndarray, columns: numpy.ndarray):
+        children = [(2 * rows + row, 2 * columns + column) for row in (0, 1) for column in (0, 1)]
+        for arrays, reduce in ((self.minimum, numpy.minimum.reduce), (self.maximum, numpy.maximum.reduce),
+                               (self.total, sum), (self.count, sum)):
+            below = arrays[level - 1]
+            arrays[level][rows, columns] = reduce([below[child] for child in children])
+
+    def level_for(self, cells_per_pixel: float) -> int:
+        """
+        :param cells_per_pixel: zoom of the view, along each axis
+        :return: the finest level whose blocks are not smaller than a pixel
+        """
+        if cells_per_pixel <= 1:
+            return 0
+        return min(self.levels - 1, int(math.floor(math.log2(cells_per_pixel))))
+
+    def region(self, level: int, rows: slice, columns: slice, statistic: str = "mean") -> tuple[numpy.ndarray,
+                                                                                               numpy.ndarray]:
+        """
+        :param level:
+        :param rows: rows of blocks of the level
+        :param columns: columns of blocks of the level
+        :param statistic: one of STATISTICS
+        :return: the statistic of the blocks, and the mask of the blocks that have a value
+        """
+        if statistic not in self.STATISTICS:
+            raise ValueError(f"Unknown statistic {statistic}, expected one of {self.STATISTICS}")
+        height, width = self.shapes[level]
+        key = (slice(*rows.indices(height)[:2]), slice(*columns.indices(width)[:2]))
+        count = self.count[level][key]
+        if statistic == "min":
+            values = self.minimum[level][key]
+        elif statistic == "max":
+            values = self.maximum[level][key]
+        else:
+            values = numpy.divide(self.total[level][key], count, out=numpy.zeros(count.shape), where=count > 0)
+        return values, count > 0
+
+    def view(self, viewport: Viewport, statistic: str = "mean") -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Sample the level matching the zoom of the viewport, reading only the blocks in the view
+        :param viewport: a viewport on a grid of the shape of the field
+        :param statistic: one of STATISTICS
+        :return: (*viewport.view_shape) the statistic of the block shown on each pixel, and the mask of the pixels that
+            show a block with a value
+        """
+        level = self.level_for(viewport.zoom)
+        rows, columns = viewport.sample(2 ** level)
+        inside = (rows >= 0)[:, None] & (columns >= 0)[None, :]
+        if not inside.any():
+            return numpy.zeros(inside.shape), inside
+        first_row, first_column = rows[rows >= 0].min(), columns[columns >= 0].min()
+        values, mask = self.region(level, slice(first_row, rows.max() + 1), slice(first_column, columns.max() + 1),
+                                   statistic)
+        key = numpy.ix_(numpy.maximum(rows - first_row, 0), numpy.maximum(columns - first_column, 0))
+        return values[key], mask[key] & inside
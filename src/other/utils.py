@@ -1,10 +1,12 @@
 from dataclasses import dataclass
 from typing import Union, Iterable, Iterator, TYPE_CHECKING
 
+import numpy
 from PyQt5 import QtGui, QtWidgets
 from PyQt5.QtGui import QValidator
 
-from constants import COMPONENTS
+from models.array_class.earth_state import EarthState
+from models.array_class.palette import mix_colors
 
 if TYPE_CHECKING:
     from models.physical_class.grid_chunk import GridChunk
@@ -26,28 +28,13 @@ def index_to_2D(index: int, shape: tuple[int, int]) -> tuple[int, int]:
 
 class ComponentColor(QtGui.QColor):
     """
-    Convert a component ratio to a color to draw
+    Convert a component ratio to a color to draw, see models.array_class.palette
     """
-    WATER = QtGui.QColor("blue")
-    AIR = QtGui.QColor("white")
-    LAND = QtGui.QColor("brown")
-    DICT = dict()  # Saves the ratio used for that color
-
     def __init__(self, ratios: dict[str, float], *args, **kwargs):
         self.ratios = ratios
         super().__init__(*args, **kwargs)
-        self.setRed(int(ComponentColor.WATER.red() * ratios.get("WATER", 0)) +
-                    int(ComponentColor.AIR.red() * ratios.get("AIR", 0)) +
-                    int(ComponentColor.LAND.red() * ratios.get("LAND", 0)))
-
-        self.setGreen(int(ComponentColor.WATER.green() * ratios.get("WATER", 0)) +
-                      int(ComponentColor.AIR.green() * ratios.get("AIR", 0)) +
-                      int(ComponentColor.LAND.green() * ratios.get("LAND", 0)))
-
-        self.setBlue(int(ComponentColor.WATER.blue() * ratios.get("WATER", 0)) +
-                     int(ComponentColor.AIR.blue() * ratios.get("AIR", 0)) +
-                     int(ComponentColor.LAND.blue() * ratios.get("LAND", 0)))
-        ComponentColor.DICT[self.rgb()] = ratios
+        red, green, blue = mix_colors(numpy.array([ratios.get(component, 0) for component in EarthState.COMPONENTS]))
+        self.setRgb(int(red), int(green), int(blue))
 
     @classmethod
     def from_chunk(cls, chunk: "GridChunk"):
@@ -0,0 +1,105 @@
+import math
+from typing import Optional
+
+import numpy
+
+
+class Viewport:
+    """
+    Part of a 2D grid shown by a view of a fixed size in pixels: the position (in cells) of the top left corner of the
+    view and the number of cells per pixel along each axis. Zoom below 1 shows a cell on several pixels, so that a grid
+    coarser than the view is scaled up to fill it
+    """
+    MIN_ZOOM: float = 1 / 16  # [cells per pixel]
+
+    def __init__(self, grid_shape: tuple[int, int], view_shape: tuple[int, int]):
+        """
+        :param grid_shape: (height, width) of the grid [cells]
+        :param view_shape: (height, width) of the view [pixels]
+        """
+        self.grid_shape = tuple(grid_shape)
+        self.view_shape = tuple(view_shape)
+        self.zoom = self.max_zoom  # The whole grid is visible
+        self.origin = (0., 0.)  # (row, column) of the top left corner of the view [cells]
+        self.__clamp()
+
+    @property
+    def max_zoom(self) -> float:
+        """
+        :return: the zoom at which the whole grid fits in the view
+        """
+        return max(grid / view for grid, view in zip(self.grid_shape, self.view_shape))
+
+    @property
+    def min_zoom(self) -> float:
+        return min(self.MIN_ZOOM, self.max_zoom)
+
+    def position_at(self, x: int, y: int) -> tuple[float, float]:
+        """
+        :param x: pixel of the view
+        :param y: pixel of the view
+        :return: (row, column) of the center of the pixel in the grid [cells]
+        """
+        return self.origin[0] + (y + 0.5) * self.zoom, self.origin[1] + (x + 0.5) * self.zoom
+
+    def cell_at(self, x: int, y: int) -> Optional[tuple[int, int]]:
+        """
+        :param x: pixel of the view
+        :param y: pixel of the view
+        :return: (row, column) of the cell shown on the pixel, None if it is outside of the grid
+        """
+        row, column = (math.floor(position) for position in self.position_at(x, y))
+        if 0 <= row < self.grid_shape[0] and 0 <= column < self.grid_shape[1]:
+            return row, column
+        return None
+
+    def zoom_at(self, x: int, y: int, factor: float):
+        """
+        Multiply the number of cells per pixel by the factor, keeping the cell under the pixel in place
+        :param x: pixel of the view
+        :param y: pixel of the view
+        :param factor: above 1 to zoom out, below 1 to zoom in
+        :return:
+        """
+        zoom = min(max(self.zoom * factor, self.min_zoom), self.max_zoom)
+        self.origin = tuple(origin + pixel * (self.zoom - zoom) for origin, pixel in zip(self.origin, (y, x)))
+        self.zoom = zoom
+        self.__clamp()
+
+    def pan(self, dx: int, dy: int):
+        """
+        Move the content of the view by a number of pixels
+        :param dx:
+        :param dy:
+        :return:
+        """
+        self.origin = (self.origin[0] - dy * self.zoom, self.origin[1] - dx * self.zoom)
+        self.__clamp()
+
+    def __clamp(self):
+        """
+        Keep part of the grid in the view, the grid is centered when it is smaller than the view
+        """
+        origin = []
+        for start, grid, view in zip(self.origin, self.grid_shape, self.view_shape):
+            visible = view * self.zoom
+            origin.append((grid - visible) / 2 if visible >= grid else min(max(start, 0.), grid - visible))
+        self.origin = tuple(origin)
+
+    def sample(self, block: int = 1) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        :param block: side of the blocks of cells that are sampled, see FieldPyramid
+        :return: the row of blocks shown on each row of pixels and the column of blocks shown on each column of pixels,
+            -1 outside of the grid
+        """
+        samples = []
+        for origin, grid, view in zip(self.origin, self.grid_shape, self.view_shape):
+            cells = numpy.floor(origin + (numpy.arange(view) + 0.5) * self.zoom).astype(numpy.int64)
+            samples.append(numpy.where((cells >= 0) & (cells < grid), cells // block, -1))
+        return samples[0], samples[1]
+
+    def source_rect(self) -> tuple[float, float, float, float]:
+        """
+        :return: (x, y, width, height) of the part of the grid in the view [cells]
+        """
+        return self.origin[1], self.origin[0], self.view_shape[1] * self.zoom, self.view_shape[0] * self.zoom
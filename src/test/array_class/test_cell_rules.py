@@ -0,0 +1,103 @@
+import unittest
+import warnings
+
+import numpy
+
+import models.physical_class.universe as universe
+from models.array_class import cell_rules
+from models.array_class.cell_rules import CompiledCellRule, UnsupportedCellRule
+from models.array_class.earth_state import EarthState
+from models.array_class.pipeline import CellRuleStage, TickPipeline
+from models.ticking_class.ticking_grid_chunk import TickingGridChunk
+from test.array_class.test_pipeline import random_earth
+
+
+def melt_land(chunk):
+    if chunk.land_component is None:
+        return
+    chunk.land_component.energy += 0.5 * chunk.land_component.mass * chunk.temperature
+    chunk.carbon_ppm = max(0.0, chunk.carbon_ppm - 1)
+
+
+def print_chunk(chunk):
+    print(chunk)
+
+
+melt_land.compiled = True
+print_chunk.compiled = True
+
+
+class TestCompiledCellRule(unittest.TestCase):
+    def test_evaporation_matches_per_cell_rule(self):
+        earth = random_earth((6, 5), seed=2)
+        rule = CompiledCellRule(TickingGridChunk.water_evaporation)
+        self.assertTrue(rule.verify(earth.not_nones()))
+        state = EarthState.from_earth(earth)
+        rule(state)
+        for chunk in earth.not_nones():
+            chunk.water_evaporation()
+        expected = EarthState.from_earth(earth)
+        for name in ("mass", "energy", "carbon_ppm"):
+            numpy.testing.assert_allclose(getattr(state, name), getattr(expected, name), rtol=1e-12, err_msg=name)
+
+    def test_external_values_read_on_each_call(self):
+        rule = CompiledCellRule(TickingGridChunk.water_evaporation)
+        state = EarthState.from_earth(random_earth((3, 3)))
+        water = state.mass[state.component_index("WATER")].copy()
+        rate = universe.Universe.EVAPORATION_RATE
+        try:
+            universe.Universe.EVAPORATION_RATE = 0
+            rule(state)
+        finally:
+            universe.Universe.EVAPORATION_RATE = rate
+        numpy.testing.assert_array_equal(water, state.mass[state.component_index("WATER")])
+
+    def test_rule_stage_in_pipeline(self):
+        state = EarthState.from_earth(random_earth((7, 5), seed=3))
+        fused_state, unfused_state = state.copy(), state.copy()
+        rule = CompiledCellRule(melt_land)
+        self.assertEqual({"mass", "energy", "carbon_ppm"}, rule.fields)
+        self.assertEqual({"energy", "carbon_ppm"}, CellRuleStage(rule).writes)
+        TickPipeline([CellRuleStage(rule)], fused=True, tile_size=3).run(fused_state)
+        TickPipeline([CellRuleStage(rule)], fused=False).run(unfused_state)
+        for name in EarthState.FIELDS:
+            numpy.testing.assert_array_equal(getattr(fused_state, name), getattr(unfused_state, name), err_msg=name)
+        earth = random_earth((7, 5), seed=3)
+        for chunk in earth.not_nones():
+            melt_land(chunk)
+        numpy.testing.assert_allclose(fused_state.energy, EarthState.from_earth(earth).energy, rtol=1e-12)
+
+    def test_untranslatable_rule(self):
+        with self.assertRaises(UnsupportedCellRule):
+            CompiledCellRule(print_chunk)
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter("always")
+            self.assertIsNone(cell_rules.compiled_rule(print_chunk))
+
+    def test_mismatch_falls_back(self):
+        rule = CompiledCellRule(melt_land)
+        rule.kernel = lambda *arguments: None  # The translation does nothing anymore
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            self.assertFalse(rule.verify(random_earth((3, 3)).not_nones()))
+        self.assertTrue(any("does not match" in str(warning.message) for warning in caught))
+
+    def test_verify_samples_the_whole_earth(self):
+        rule = CompiledCellRule(melt_land)
+        kernel = rule.kernel
+
+        def wrong_far_in(mass, energy, carbon_ppm, *arguments):
+            kernel(mass, energy, carbon_ppm, *arguments)
+            energy[:, carbon_ppm >= 40] *= 2  # The translation is wrong on the chunks after the first ones only
+
+        rule.kernel = wrong_far_in
+        earth = random_earth((10, 10))
+        for chunk in earth.not_nones():
+            chunk.carbon_ppm = chunk.index + 1
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter("always")
+            self.assertFalse(rule.verify(earth.not_nones()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+import numpy
+
+import models.physical_class.universe as universe
+from models.array_class import diffusion
+from models.array_class.earth_state import EarthState
+from models.array_class.equivalence import assert_engines_agree
+from models.physical_class.grid_chunk import GridChunk
+from test.array_class.test_pipeline import random_earth
+
+
+class TestConductance(unittest.TestCase):
+    def test_refresh_mixture_as_chunks(self):
+        earth = random_earth((6, 5))
+        for chunk in earth.not_nones():
+            if chunk.water_component is not None:
+                chunk.water_component.mass /= 3
+        state = EarthState.from_earth(earth)
+        changed = diffusion.refresh_mixture(state, GridChunk.MIXTURE_THRESHOLD)
+        for chunk in earth.not_nones():
+            self.assertEqual(chunk.update_mixture_properties(), changed.flat[chunk.index])
+        expected = EarthState.from_earth(earth)
+        numpy.testing.assert_allclose(state.specific_heat_capacity, expected.specific_heat_capacity, rtol=1e-12)
+        numpy.testing.assert_allclose(state.heat_transfer_coefficient, expected.heat_transfer_coefficient, rtol=1e-12)
+
+    def test_cache_updates_changed_cells(self):
+        state = EarthState.from_earth(random_earth((6, 5)))
+        cache = diffusion.ConductanceCache()
+        self.assertTrue(cache.update(state)[state.active].all())
+        edges = cache.edges(0, True).copy()
+        self.assertFalse(cache.update(state).any())
+        position = tuple(numpy.argwhere(state.active)[0])
+        state.specific_heat_capacity[position] *= 2
+        self.assertEqual(1, cache.update(state).sum())
+        numpy.testing.assert_array_equal(diffusion.cell_conductance(state), cache.cell)
+        index = numpy.arange(state.active.size).reshape(state.grid_shape)
+        numpy.testing.assert_array_equal(diffusion.edge_conductance(cache.cell, index, 0, True), cache.edges(0, True))
+        self.assertFalse((edges == cache.edges(0, True)).all())
+
+    def test_engines_agree_while_composition_changes(self):
+        rate = universe.Universe.EVAPORATION_RATE
+        try:
+            universe.Universe.EVAPORATION_RATE = 50  # Half of the water evaporates at each tick
+            assert_engines_agree((6, 5), 4, seed=2)
+        finally:
+            universe.Universe.EVAPORATION_RATE = rate
+
+
+class TestImplicitDiffusion(unittest.TestCase):
+    def test_close_to_stencil_on_short_steps(self):
+        explicit = EarthState.from_earth(random_earth((6, 5)))
+        implicit = explicit.copy()
+        diffusion.stencil_diffusion(explicit, 0.001)
+        diffusion.implicit_diffusion(implicit, 0.001)
+        numpy.testing.assert_allclose(implicit.temperature[implicit.active], explicit.temperature[explicit.active],
+                                      rtol=1e-4)
+
+    def test_stable_on_long_steps(self):
+        state = EarthState.from_earth(random_earth((6, 5)))
+        energy = state.energy.sum()
+        lowest, highest = state.temperature[state.active].min(), state.temperature[state.active].max()
+        diffusion.implicit_diffusion(state, 1e4, periodic=True)
+        self.assertAlmostEqual(1, state.energy.sum() / energy, places=9)
+        temperature = state.temperature[state.active]
+        self.assertTrue((temperature >= lowest - 1e-6).all() and (temperature <= highest + 1e-6).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
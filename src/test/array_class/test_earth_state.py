@@ -0,0 +1,79 @@
+import unittest
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.ticking_class.ticking_earth import TickingEarth
+from models.ticking_class.ticking_grid_chunk import TickingGridChunk
+from test.array_class.test_pipeline import random_earth
+
+
+class TestDerivedFields(unittest.TestCase):
+    def test_cached_until_modified(self):
+        state = EarthState.from_earth(random_earth((5, 4)))
+        temperature = state.temperature
+        self.assertIs(temperature, state.temperature)
+        self.assertFalse(temperature.flags.writeable)
+        state.add_energy(numpy.full(state.grid_shape, 1e6))
+        self.assertIsNot(temperature, state.temperature)
+        self.assertTrue((state.temperature[state.active] > temperature[state.active]).all())
+
+    def test_region_has_its_own_cache(self):
+        state = EarthState.from_earth(random_earth((5, 4)))
+        region = state.region((slice(1, 3), slice(0, 2)))
+        numpy.testing.assert_array_equal(state.temperature[1:3, :2], region.temperature)
+
+    def test_window_copies_written_fields(self):
+        state = EarthState.from_earth(random_earth((5, 4)))
+        window = state.window((slice(1, 3), slice(0, 2)), {"energy"})
+        window.add_energy(numpy.full(window.grid_shape, 1e6))
+        numpy.testing.assert_array_equal(state.energy, EarthState.from_earth(random_earth((5, 4))).energy)
+        with self.assertRaises(ValueError):
+            window.mass[...] = 0  # Read only view on the state
+
+
+class TestEarthFields(unittest.TestCase):
+    def test_fields_follow_the_earth(self):
+        earth = random_earth((5, 4))
+        fields = earth.fields
+        earth.add_energy(1e6)
+        numpy.testing.assert_allclose(earth.fields.energy.sum(), fields.energy.sum() + 1e6)
+        earth[0] = TickingGridChunk.from_components_tuple((1000, 300, "WATER"), volume=1, index=0, parent=earth)
+        self.assertAlmostEqual(300, earth.fields.temperature[0, 0])
+
+    def test_summaries_match_chunks(self):
+        earth = random_earth((5, 4))
+        self.assertAlmostEqual(sum(chunk.total_mass for chunk in earth.not_nones()), earth.total_mass)
+        self.assertAlmostEqual(sum(chunk.temperature for chunk in earth.not_nones()) / earth.nb_active_grid_chunks,
+                               earth.compute_average_temperature())
+        self.assertAlmostEqual(1, sum(earth.composition.values()))
+
+    def test_chunks_modified_directly(self):
+        earth = TickingEarth(shape=(2, 1))
+        for i in range(2):
+            earth[i] = TickingGridChunk.from_components_tuple((1000, 300, "WATER"), volume=1, index=i, parent=earth)
+        self.assertEqual(2000, earth.total_mass)
+        self.assertEqual(300, earth.compute_average_temperature())
+        earth[0].water_component.mass = 5000
+        earth[1].add_energy(-100 * 1000 * earth[1].water_component.specific_heat_capacity)
+        self.assertEqual(6000, earth.total_mass)
+        self.assertAlmostEqual((60 + 200) / 2, earth.compute_average_temperature())
+
+
+class TestComponentAxis(unittest.TestCase):
+    def test_registered_materials_round_trip(self):
+        earth = random_earth((3, 2))
+        earth[1] = TickingGridChunk.from_components_tuple((800, 280, "NITROGEN"), (200, 280, "OXYGEN"), volume=1,
+                                                          index=1, parent=earth)
+        state = EarthState.from_earth(earth)
+        self.assertEqual(800, state.mass[state.component_index("NITROGEN"), 0, 1])
+        self.assertAlmostEqual(280, state.temperature[0, 1])
+        state.mass[state.component_index("OXYGEN"), 0, 1] = 0
+        state.modified()
+        state.write_to(earth)
+        self.assertIsNone(earth[1].oxygen_component)
+        self.assertEqual(800, earth[1].nitrogen_component.mass)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import functools
+import os
+import random
+import tempfile
+import time
+import unittest
+
+import numpy
+
+from models.array_class.emulator import Run, simulate, train
+from models.array_class.equivalence import seeded_universe
+
+
+class TestEmulator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        build = functools.partial(seeded_universe, (4, 3), seed=2)
+        generator = random.Random(0)
+        cls.runs = [simulate(build, {"albedo": generator.uniform(0.2, 0.4),
+                                     "energy_radiated_per_second": generator.uniform(3e26, 4.5e26),
+                                     "EVAPORATION_RATE": generator.uniform(0, 0.01)}, 30, every=10)
+                    for _ in range(12)]
+
+    def test_validation_error(self):
+        emulator = train(self.runs, held_out=2)
+        self.assertEqual(2, emulator.validation.runs)
+        self.assertLess(emulator.validation.temperature_relative_error, 1e-3)
+        self.assertLess(emulator.validation.composition_max_error, 1e-3)
+
+    def test_query(self):
+        emulator = train(self.runs, held_out=2)
+        run = self.runs[-1]
+        start = time.perf_counter()
+        emulated = emulator.predict(run.parameters)
+        self.assertLess(time.perf_counter() - start, 0.1)
+        numpy.testing.assert_array_equal(run.ticks, emulated.ticks)
+        numpy.testing.assert_allclose(emulated.mean_temperature, run.mean_temperature, rtol=1e-3)
+        numpy.testing.assert_allclose(emulated.composition["AIR"], run.composition[:, 1], atol=1e-3)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "run.npz")
+            self.runs[0].save(path)
+            loaded = Run.load(path)
+        self.assertEqual(self.runs[0].parameters, loaded.parameters)
+        numpy.testing.assert_array_equal(self.runs[0].vector, loaded.vector)
+
+
+if __name__ == '__main__':
+    unittest.main()
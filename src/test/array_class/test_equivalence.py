@@ -0,0 +1,45 @@
+import unittest
+
+from models.array_class.equivalence import assert_engines_agree, seeded_universe
+from models.ticking_class.ticking_grid_chunk import TickingGridChunk
+
+
+class TestEngines(unittest.TestCase):
+    def test_engines_agree(self):
+        for periodic in (False, True):
+            comparison = assert_engines_agree((8, 6), 5, seed=3, periodic=periodic)
+            self.assertEqual(5, comparison.ticks)
+            self.assertGreater(comparison.speedup, 0)
+
+    def test_chunks_synchronized_on_interval(self):
+        universe = seeded_universe((5, 4), seed=1)
+        universe.ENGINE, universe.SYNC_INTERVAL = "array", 2
+        before = universe.earth.compute_total_energy()
+        universe.update_all()
+        self.assertEqual(before, universe.earth.compute_total_energy())
+        universe.update_all()
+        self.assertNotEqual(before, universe.earth.compute_total_energy())
+        self.assertFalse(universe.earth.chunks_outdated)
+
+    def test_replacing_chunk_releases_state(self):
+        universe = seeded_universe((5, 4), seed=1)
+        universe.ENGINE, universe.SYNC_INTERVAL = "array", 10
+        universe.update_all()
+        chunk = next(chunk for chunk in universe.earth.not_nones() if chunk.index > 0)
+        energy = universe.earth.array_state.flat(universe.earth.array_state.energy)[:, chunk.index].sum()
+        universe.earth[0] = TickingGridChunk.from_components_tuple((1000, 300, "WATER"), volume=1, index=0,
+                                                                   parent=universe.earth)
+        self.assertIsNone(universe.earth.array_state)
+        self.assertAlmostEqual(energy, chunk.energy)  # The chunks were brought up to date before being replaced
+        universe.update_all()
+        self.assertEqual(1000, universe.earth.array_state.mass[:, 0, 0].sum())
+
+    def test_unknown_engine(self):
+        universe = seeded_universe((2, 2))
+        universe.ENGINE = "gpu"
+        with self.assertRaises(ValueError):
+            universe.update_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.array_class.equivalence import assert_engines_agree
+from models.array_class.field_rules import FieldRule
+from models.array_class.pipeline import FieldRuleStage, StencilDiffusionStage, TickPipeline
+from models.ticking_class.ticking_earth import TickingEarth
+from test.array_class.test_pipeline import random_earth
+
+
+class TestFieldRule(unittest.TestCase):
+    def setUp(self):
+        self.rules = []
+
+    def tearDown(self):
+        for rule in self.rules:
+            TickingEarth.on_tick_methods.remove(rule)
+
+    def register(self, name: str, updates: dict[str, str]) -> FieldRule:
+        rule = TickingEarth.field_rule(name, updates)
+        self.rules.append(rule)
+        return rule
+
+    def test_registered_as_update_method(self):
+        rule = self.register("warming", {"temperature": "temperature + 1"})
+        self.assertIn(rule, TickingEarth.on_tick_methods)
+        self.assertEqual("warming", rule.__name__)
+        with self.assertRaises(ValueError):
+            TickingEarth.field_rule("warming", {"temperature": "temperature"})
+        with self.assertRaises(ValueError):
+            TickingEarth.field_rule("unknown_field", {"temperature": "salinity"})
+        with self.assertRaises(ValueError):
+            TickingEarth.field_rule("unknown_target", {"salinity": "temperature"})
+
+    def test_temperature_rule(self):
+        earth = random_earth((5, 4))
+        before = EarthState.from_earth(earth).temperature
+        self.register("warming", {"temperature": "temperature + 1"})(earth)
+        after = EarthState.from_earth(earth)
+        numpy.testing.assert_allclose(after.temperature[after.active], before[after.active] + 1)
+
+    def test_mass_rule_keeps_temperature(self):
+        earth = random_earth((5, 4))
+        state = EarthState.from_earth(earth)
+        self.register("drying", {"water_mass": "water_mass / 2", "air_mass": "air_mass + water_mass / 2"})(earth)
+        after = EarthState.from_earth(earth)
+        water = state.component_index("WATER")
+        numpy.testing.assert_allclose(after.mass[water], state.mass[water] / 2)
+        numpy.testing.assert_allclose(after.total_mass, state.total_mass)
+        has_water = state.mass[water] > 0
+        numpy.testing.assert_allclose((after.energy[water] / after.mass[water])[has_water],
+                                      (state.energy[water] / state.mass[water])[has_water])
+
+    def test_carbon_diffusion_conserves_carbon(self):
+        earth = random_earth((6, 5), periodic=True)
+        for chunk in earth.not_nones():
+            chunk.carbon_ppm = chunk.index % 7
+        before = sum(chunk.carbon_ppm for chunk in earth.not_nones())
+        TickingEarth.carbon_diffusion(earth)
+        self.assertAlmostEqual(before, sum(chunk.carbon_ppm for chunk in earth.not_nones()))
+
+    def test_fused_identical_to_unfused(self):
+        rule = self.register("smoothing", {"carbon_ppm": "neighbour_mean(carbon_ppm)",
+                                           "energy": "energy + 0.1 * laplacian(energy)"})
+        for periodic in (False, True):
+            state = EarthState.from_earth(random_earth((7, 5), periodic=periodic))
+            state.carbon_ppm[...] = numpy.arange(state.carbon_ppm.size).reshape(state.grid_shape)
+            fused_state, unfused_state = state.copy(), state.copy()
+            stages = [StencilDiffusionStage(0.5), FieldRuleStage(rule, {})]
+            TickPipeline(stages, fused=True, tile_size=3, periodic=periodic).run(fused_state)
+            TickPipeline(stages, fused=False, periodic=periodic).run(unfused_state)
+            for name in EarthState.FIELDS:
+                numpy.testing.assert_array_equal(getattr(fused_state, name), getattr(unfused_state, name))
+
+    def test_engines_agree(self):
+        self.register("cooling", {"temperature": "temperature - 0.5 * TIME_DELTA", "carbon_ppm": "carbon_ppm + 1"})
+        assert_engines_agree((6, 5), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+import numpy
+
+from other.heatmap import COOLWARM, colormap_lut, heatmap_pixels, unpack_rgb
+
+
+class TestHeatmap(unittest.TestCase):
+    def setUp(self):
+        self.lut = colormap_lut(COOLWARM, size=16)
+
+    def test_lut_packed_as_rgb32(self):
+        self.assertEqual((16,), self.lut.shape)
+        self.assertTrue(((self.lut >> 24) == 0xff).all())
+        numpy.testing.assert_array_equal([[59, 76, 192], [180, 4, 38]], unpack_rgb(self.lut[[0, -1]]))
+
+    def test_values_clamped_to_range(self):
+        pixels = heatmap_pixels(numpy.array([[-100., 0., 5., 10., 1e9]]), 0, 10, self.lut)
+        self.assertEqual(numpy.uint32, pixels.dtype)
+        self.assertTrue(pixels.flags.c_contiguous)
+        numpy.testing.assert_array_equal(self.lut[[0, 0, 8, 15, 15]], pixels[0])
+
+    def test_empty_range(self):
+        pixels = heatmap_pixels(numpy.array([[3., 3.], [4., numpy.nan]]), 3, 3, self.lut)
+        numpy.testing.assert_array_equal(numpy.full((2, 2), self.lut[0]), pixels)
+
+    def test_mask_shows_background(self):
+        mask = numpy.array([[True, False], [False, True]])
+        pixels = heatmap_pixels(numpy.array([[0., 10.], [10., 10.]]), 0, 10, self.lut, mask=mask, background=0xff123456)
+        numpy.testing.assert_array_equal([[self.lut[0], 0xff123456], [0xff123456, self.lut[-1]]], pixels)
+
+
+if __name__ == '__main__':
+    unittest.main()
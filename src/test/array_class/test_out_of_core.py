@@ -0,0 +1,85 @@
+import tempfile
+import unittest
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.array_class.equivalence import seeded_universe
+from models.array_class.out_of_core import MemmapStore, OutOfCorePipeline, seed_store
+from models.array_class.pipeline import CarbonStage, DepositStage, EvaporationStage, MixtureStage, \
+    StencilDiffusionStage
+from models.physical_class.universe import Universe
+from models.ticking_class.ticking_earth import OutOfCoreEarth
+
+
+class TestOutOfCore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def stages(self):
+        return [MixtureStage(0.01), StencilDiffusionStage(0.5, cached=False), EvaporationStage(0.01, 0.5),
+                DepositStage(1e6)]
+
+    def test_identical_to_array_engine(self):
+        for periodic in (False, True):
+            reference = seeded_universe((9, 7), periodic=periodic)
+            reference.ENGINE = "array"
+            store = MemmapStore.create(self.directory.name, (9, 7), precision="float64")
+            store.state.assign((slice(None), slice(None)), EarthState.from_earth(reference.earth))
+            sun = reference.sun
+            for _ in range(3):
+                reference.update_all()
+            universe = Universe()
+            universe.earth = OutOfCoreEarth(store, parent=universe, periodic=periodic)
+            universe.earth.TILE_SIZE = 4
+            universe.sun = sun
+            for _ in range(3):
+                universe.update_all()
+            universe.synchronize()
+            expected = reference.earth.array_state
+            for name in EarthState.FIELDS:
+                numpy.testing.assert_array_equal(getattr(expected, name), getattr(store.state, name), err_msg=name)
+            self.assertEqual(3, universe.earth.report.ticks)
+            self.assertAlmostEqual(reference.earth.compute_average_temperature(),
+                                   universe.earth.compute_average_temperature())
+
+    def test_update(self):
+        store = MemmapStore.create(self.directory.name, (6, 5), precision="float64")
+        seed_store(store)
+        earth = OutOfCoreEarth(store)
+        earth.TILE_SIZE = 4
+        mass = earth.total_mass
+        earth.update()
+        self.assertEqual(1, earth.get_time())
+        self.assertEqual(1, earth.report.ticks)
+        self.assertAlmostEqual(mass, earth.total_mass, delta=1e-9 * mass)
+
+    def test_prefetch_and_cache_budget(self):
+        store = MemmapStore.create(self.directory.name, (10, 9))
+        seed_store(store, tile_size=4)
+        initial = store.state.copy()
+        OutOfCorePipeline(self.stages(), store, tile_size=3).run()
+        prefetched = store.state.copy()
+        store.state.assign((slice(None), slice(None)), initial)
+        pipeline = OutOfCorePipeline(self.stages(), store, tile_size=3, prefetch=False, cache_bytes=1000)
+        pipeline.run()
+        self.assertGreater(pipeline.report.evictions, 0)
+        for name in EarthState.FIELDS:
+            numpy.testing.assert_array_equal(getattr(prefetched, name), getattr(store.state, name), err_msg=name)
+
+    def test_reopen(self):
+        store = MemmapStore.create(self.directory.name, (5, 4))
+        seed_store(store)
+        OutOfCorePipeline(self.stages(), store, tile_size=2).run()
+        store.flush()
+        reopened = MemmapStore.open(self.directory.name, mode="r")
+        self.assertEqual(numpy.float32, reopened.state.dtype)
+        numpy.testing.assert_array_equal(store.state.energy, reopened.state.energy)
+
+    def test_whole_grid_stage(self):
+        store = MemmapStore.create(self.directory.name, (5, 4))
+        pipeline = OutOfCorePipeline([CarbonStage(emissions=1000)], store)
+        self.assertRaises(ValueError, pipeline.run)
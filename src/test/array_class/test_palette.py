@@ -0,0 +1,49 @@
+import unittest
+
+import numpy
+
+from models.array_class.equivalence import seeded_universe
+from models.array_class.palette import EMPTY_COLOR, Palette
+from models.array_class.resampling import resample_nearest
+
+
+class TestPalette(unittest.TestCase):
+    def test_state_round_trip(self):
+        state = seeded_universe((6, 5)).earth.fields
+        palette, codes = Palette.from_state(state)
+        numpy.testing.assert_array_equal(state.active, codes >= 0)
+        self.assertEqual(len(palette), len(numpy.unique(palette.colors.view("V3"))))  # The colors are distinct
+        numpy.testing.assert_array_equal(codes, palette.codes(palette.pixels(codes)))
+        loaded = Palette.from_text(palette.to_text())
+        numpy.testing.assert_array_equal(palette.colors, loaded.colors)
+        numpy.testing.assert_allclose(palette.ratios, loaded.ratios)
+        total_mass = state.mass.sum(axis=0)
+        for code in range(len(palette)):
+            cell = numpy.argwhere(codes == code)[0]
+            numpy.testing.assert_allclose(palette.ratios[code],
+                                          state.mass[:, cell[0], cell[1]] / total_mass[cell[0], cell[1]], atol=1e-6)
+
+    def test_nearest_color(self):
+        palette = Palette.default()
+        numpy.testing.assert_array_equal(numpy.eye(len(palette))[[0, 2]], palette.ratios[[0, 2]])
+        pixels = numpy.array([[palette.colors[2], EMPTY_COLOR, (10, 5, 240), (3, 3, 3)]], dtype=numpy.uint8)
+        numpy.testing.assert_array_equal([[2, -1, 0, -1]], palette.codes(pixels))
+
+    def test_bounded(self):
+        self.assertRaises(ValueError, lambda: Palette(numpy.zeros((Palette.MAX_COLORS + 1, len(Palette.default())))))
+        state = seeded_universe((40, 30)).earth.fields
+        Palette.MAX_COLORS, maximum = 4, Palette.MAX_COLORS
+        try:
+            palette, codes = Palette.from_state(state)
+        finally:
+            Palette.MAX_COLORS = maximum
+        self.assertEqual(4, len(palette))
+        self.assertEqual(4, len(numpy.unique(codes[codes >= 0])))
+
+    def test_land_sea_mask(self):
+        palette = Palette.default()
+        mask = numpy.zeros((2000, 2000), dtype=numpy.int64)
+        mask[:, 700:1500] = 2
+        codes = palette.codes(palette.pixels(mask))
+        numpy.testing.assert_array_equal(mask, codes)
+        numpy.testing.assert_array_equal(mask[10::20, 10::20], resample_nearest(codes, (100, 100)))
@@ -0,0 +1,51 @@
+import unittest
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.array_class.equivalence import seeded_universe
+from models.array_class.parareal import best_speedup
+
+
+class TestParareal(unittest.TestCase):
+    def serial_run(self, ticks: int) -> EarthState:
+        universe = seeded_universe((6, 5), seed=3)
+        universe.ENGINE = "array"
+        for _ in range(ticks):
+            universe.update_all()
+        universe.synchronize()
+        return EarthState.from_earth(universe.earth)
+
+    def test_same_result_as_serial_run(self):
+        reference = self.serial_run(40)
+        universe = seeded_universe((6, 5), seed=3)
+        universe.ENGINE = "array"
+        report = universe.run_parareal(40, slices=4, workers=2, coarse_factor=5, tolerance=0, measure_serial=True)
+        self.assertFalse(report.converged)  # Stopped because every slice is exact, the tolerance was never met
+        self.assertEqual(4, report.iterations)  # Every slice is exact after as many iterations as slices
+        self.assertEqual(4, len(report.corrections))
+        self.assertAlmostEqual(0, report.serial_error, places=10)
+        self.assertGreater(report.speedup, 0)
+        self.assertEqual(40, universe.earth.get_time())
+        numpy.testing.assert_allclose(EarthState.from_earth(universe.earth).energy, reference.energy, rtol=1e-12)
+
+    def test_stops_on_tolerance(self):
+        reference = self.serial_run(40)
+        universe = seeded_universe((6, 5), seed=3)
+        universe.ENGINE = "array"
+        report = universe.run_parareal(40, slices=8, workers=2, coarse_factor=5, tolerance=1e-3)
+        self.assertTrue(report.converged)
+        self.assertLess(report.iterations, 8)
+        self.assertLessEqual(report.corrections[-1], 1e-3)
+        numpy.testing.assert_allclose(EarthState.from_earth(universe.earth).temperature, reference.temperature,
+                                      rtol=1e-3)
+
+    def test_best_speedup(self):
+        self.assertLess(best_speedup(8, 8, cores=1), 1)  # A single core only adds the coarse propagator
+        self.assertLess(best_speedup(1, 8, cores=8), 1)
+        self.assertGreater(best_speedup(8, 8, cores=8), 1)
+        self.assertLess(best_speedup(8, 8, cores=8, coarse_factor=2), best_speedup(8, 8, cores=8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import random
+import unittest
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.array_class.pipeline import AdvectionStage, CarbonStage, DepositStage, EvaporationStage, \
+    StencilDiffusionStage, TickPipeline, TileActivity
+from models.array_class.pipeline_benchmark import measure_pipeline, seeded_state, settled_state
+from models.ticking_class.ticking_earth import TickingEarth
+from models.ticking_class.ticking_grid_chunk import TickingGridChunk
+
+
+def random_earth(shape: tuple, *, periodic: bool = False, seed: int = 0) -> TickingEarth:
+    generator = random.Random(seed)
+    earth = TickingEarth(shape=shape, periodic=periodic)
+    for i in range(len(earth)):
+        if generator.uniform(0, 1) < 0.8:
+            components = [(generator.uniform(100, 1000), generator.uniform(250, 350), component_type)
+                          for component_type in ("WATER", "AIR", "LAND") if generator.uniform(0, 1) < 0.6]
+            earth[i] = TickingGridChunk.from_components_tuple(*(components or [(1000, 300, "WATER")]),
+                                                              volume=generator.uniform(1, 10), index=i, parent=earth)
+    return earth
+
+
+class TestTickPipeline(unittest.TestCase):
+    def stages(self):
+        return [StencilDiffusionStage(0.5),
+                CarbonStage(emissions=1000, ocean_uptake=100, land_decay=330, biosphere_absorption=300),
+                EvaporationStage(0.01, 0.5),
+                DepositStage(1e6)]
+
+    def assertSameState(self, first: EarthState, second: EarthState):
+        for name in EarthState.FIELDS:
+            numpy.testing.assert_array_equal(getattr(first, name), getattr(second, name), err_msg=name)
+
+    def test_fused_identical_to_unfused(self):
+        for periodic in (False, True):
+            for tile_size in (2, 3, 64):
+                state = EarthState.from_earth(random_earth((7, 5), periodic=periodic))
+                fused_state, unfused_state = state.copy(), state.copy()
+                TickPipeline(self.stages(), fused=True, tile_size=tile_size, periodic=periodic).run(fused_state)
+                TickPipeline(self.stages(), fused=False, periodic=periodic).run(unfused_state)
+                self.assertSameState(fused_state, unfused_state)
+
+    def test_global_stage_is_a_barrier(self):
+        stages = self.stages()
+        stages.insert(2, AdvectionStage(numpy.array([1.5, -0.5]).reshape((2, 1, 1)), 1))
+        pipeline = TickPipeline(stages, fused=True, tile_size=3)
+        self.assertEqual([2, 1, 2], [len(group) for group in pipeline.groups()])
+        state = EarthState.from_earth(random_earth((6, 6)))
+        unfused_state = state.copy()
+        pipeline.run(state)
+        TickPipeline(self.stages()[:2] + stages[2:3] + self.stages()[2:], fused=False).run(unfused_state)
+        self.assertSameState(state, unfused_state)
+
+    def test_carbon_budget_identical(self):
+        state = EarthState.from_earth(random_earth((7, 5)))
+        fused, unfused = CarbonStage(emissions=1000, ocean_uptake=100, land_decay=330, biosphere_absorption=300), \
+            CarbonStage(emissions=1000, ocean_uptake=100, land_decay=330, biosphere_absorption=300)
+        TickPipeline([fused], fused=True, tile_size=2).run(state.copy())
+        TickPipeline([unfused], fused=False).run(state.copy())
+        self.assertEqual(fused.budget, unfused.budget)
+
+    def test_benchmark(self):
+        timing = measure_pipeline(seeded_state((20, 12)), 1, tile_size=8)
+        self.assertEqual({"unfused", "fused"}, set(timing.seconds))
+        self.assertTrue(all(seconds > 0 for seconds in timing.seconds.values()))
+
+    def test_dormant_benchmark(self):
+        timing = measure_pipeline(settled_state((48, 48), hot_spot=4), 2, tile_size=8, dormant_threshold=1e-4)
+        self.assertEqual({"unfused", "fused", "unfused dormant", "fused dormant"}, set(timing.seconds))
+        self.assertGreater(timing.dormant["unfused dormant"], 0.5)
+
+    def test_pipeline_matches_object_update(self):
+        for periodic in (False, True):
+            earth = random_earth((6, 4), periodic=periodic, seed=1)
+            reference = random_earth((6, 4), periodic=periodic, seed=1)
+            self.assertTrue(earth.update_with_pipeline(1e5, tile_size=4))
+            reference.update()
+            reference.add_energy(1e5)
+            for chunk, reference_chunk in zip(earth, reference):
+                if reference_chunk is None:
+                    self.assertIsNone(chunk)
+                    continue
+                self.assertAlmostEqual(chunk.temperature, reference_chunk.temperature)
+                for component, reference_component in zip(chunk, reference_chunk):
+                    self.assertEqual(component.type, reference_component.type)
+                    self.assertAlmostEqual(component.mass, reference_component.mass)
+
+
+class TestTileActivity(unittest.TestCase):
+    def setUp(self):
+        # A uniform earth with a hot cell in a corner, only the tiles around it change
+        self.earth = TickingEarth(shape=(12, 12))
+        for i in range(len(self.earth)):
+            self.earth[i] = TickingGridChunk.from_components_tuple((1000, 350 if i == 0 else 300, "LAND"), volume=1,
+                                                                   index=i, parent=self.earth)
+        self.state = EarthState.from_earth(self.earth)
+
+    def test_dormant_tiles_skipped(self):
+        for fused in (True, False):
+            activity = TileActivity(self.state.grid_shape, 4, 1e-9, recheck_interval=100)
+            skipped, reference = self.state.copy(), self.state.copy()
+            for _ in range(3):
+                TickPipeline([StencilDiffusionStage(0.1), DepositStage(0)], fused=fused, tile_size=4,
+                             activity=activity).run(skipped)
+                TickPipeline([StencilDiffusionStage(0.1), DepositStage(0)], tile_size=4).run(reference)
+            self.assertFalse(activity.awake[2, 2])
+            self.assertTrue(activity.awake[1, 1])  # Next to the changing tile
+            numpy.testing.assert_array_equal(reference.energy, skipped.energy)
+
+    def test_awake_box(self):
+        activity = TileActivity(self.state.grid_shape, 4, 1e-9, recheck_interval=100)
+        activity.awake[...] = False
+        self.assertIsNone(activity.awake_box())
+        activity.awake[0, 1] = activity.awake[1, 0] = True
+        self.assertEqual((slice(0, 9), slice(0, 9)), activity.awake_box(1))
+        activity.changed[...] = False
+        before = {"energy": self.state.energy[(...,) + activity.awake_box()].copy()}
+        after = self.state.region(activity.awake_box())
+        after.energy[..., 5, 1] *= 2
+        activity.record_box(before, after, activity.awake_box())
+        self.assertEqual([(1, 0)], [tuple(position) for position in numpy.argwhere(activity.changed)])
+
+    def test_wake_ups(self):
+        activity = TileActivity(self.state.grid_shape, 4, 1e-9, recheck_interval=100)
+        for _ in range(2):
+            TickPipeline([StencilDiffusionStage(0.1), DepositStage(0)], tile_size=4, activity=activity).run(self.state)
+        self.assertFalse(activity.awake[2, 2])
+        activity.wake(11 + 11 * 12)  # Edited cell in the last tile
+        self.assertTrue(activity.awake[2, 2])
+        activity.start_tick([StencilDiffusionStage(0.1), DepositStage(0)])
+        activity.end_tick(False)
+        self.assertFalse(activity.awake[2, 2])
+        activity.start_tick([StencilDiffusionStage(0.1), DepositStage(1e3)])  # The forcing changed
+        self.assertTrue(activity.awake.all())
+
+    def test_forcing_applied_on_dormant_tiles(self):
+        activity = TileActivity(self.state.grid_shape, 4, 1e-9, recheck_interval=100)
+        TickPipeline([StencilDiffusionStage(0.1)], tile_size=4, activity=activity).run(self.state.copy())
+        self.assertFalse(activity.awake[2, 2])
+        energy = self.state.energy.sum()
+        TickPipeline([StencilDiffusionStage(0.1), DepositStage(1e3)], tile_size=4, activity=activity).run(self.state)
+        self.assertAlmostEqual(energy + 1e3, self.state.energy.sum(), delta=1e-6 * energy)
+
+    def test_edit_resets_activity(self):
+        for _ in range(2):
+            self.earth.update_with_pipeline(0, tile_size=4, dormant_threshold=1e-9, synchronize=False)
+        self.assertFalse(self.earth.tile_activity.awake[2, 2])
+        self.earth[143] = TickingGridChunk.from_components_tuple((1000, 400, "LAND"), volume=1, index=143,
+                                                                 parent=self.earth)
+        self.assertIsNone(self.earth.tile_activity)
+        self.earth.update_with_pipeline(0, tile_size=4, dormant_threshold=1e-9)
+        self.assertGreater(self.earth[142].temperature, 300)
+
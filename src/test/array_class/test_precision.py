@@ -0,0 +1,34 @@
+import unittest
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.array_class.equivalence import seeded_universe
+from models.array_class.precision import compare_precisions, run_precision, state_bytes
+
+
+class TestPrecision(unittest.TestCase):
+    def test_state_in_float32(self):
+        earth = seeded_universe((6, 5)).earth
+        state = EarthState.from_earth(earth)
+        reduced = EarthState.from_earth(earth, precision="float32")
+        self.assertEqual(numpy.float32, reduced.dtype)
+        self.assertEqual(state_bytes(state), 2 * state_bytes(reduced) - reduced.active.nbytes)
+        self.assertIs(state, state.with_precision("float64"))
+        numpy.testing.assert_allclose(state.temperature, reduced.with_precision("float64").temperature, rtol=1e-6)
+        self.assertRaises(ValueError, lambda: EarthState.empty((2, 2), precision="float16"))
+
+    def test_float64_is_unchanged(self):
+        states, _, _ = run_precision((8, 6), 5, "float64")
+        universe = seeded_universe((8, 6))
+        universe.ENGINE = "array"
+        for _ in range(5):
+            universe.update_all()
+        for name in EarthState.FIELDS:
+            numpy.testing.assert_array_equal(getattr(universe.earth.array_state, name), getattr(states[-1], name))
+
+    def test_reduced_precisions_drift(self):
+        for drift in compare_precisions((10, 8), 20):
+            self.assertLess(drift.relative_temperature_error, 1e-4)
+            self.assertLess(drift.energy_drift, 1e-5)
+            self.assertLess(drift.mass_drift, 1e-5)
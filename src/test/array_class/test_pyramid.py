@@ -0,0 +1,106 @@
+import unittest
+
+import numpy
+
+from other.pyramid import FieldPyramid
+from other.viewport import Viewport
+
+
+def brute_force(field: numpy.ndarray, mask: numpy.ndarray, level: int) -> dict[str, numpy.ndarray]:
+    """
+    :return: the statistics of the blocks of the level, and their mask, computed block by block
+    """
+    block = 2 ** level
+    shape = tuple(-(-size // block) for size in field.shape)
+    result = {"min": numpy.zeros(shape), "mean": numpy.zeros(shape), "max": numpy.zeros(shape),
+              "mask": numpy.zeros(shape, dtype=bool)}
+    for row in range(shape[0]):
+        for column in range(shape[1]):
+            key = (slice(row * block, (row + 1) * block), slice(column * block, (column + 1) * block))
+            values = field[key][mask[key]]
+            if values.size:
+                result["min"][row, column], result["max"][row, column] = values.min(), values.max()
+                result["mean"][row, column] = values.mean()
+                result["mask"][row, column] = True
+    return result
+
+
+class TestFieldPyramid(unittest.TestCase):
+    def setUp(self):
+        generator = numpy.random.default_rng(0)
+        self.field = generator.uniform(200, 400, (13, 7))
+        self.mask = generator.uniform(0, 1, self.field.shape) < 0.7
+
+    def assert_matches(self, pyramid: FieldPyramid, field: numpy.ndarray, mask: numpy.ndarray):
+        for level in range(pyramid.levels):
+            expected = brute_force(field, mask, level)
+            for statistic in FieldPyramid.STATISTICS:
+                values, shown = pyramid.region(level, slice(None), slice(None), statistic)
+                numpy.testing.assert_array_equal(expected["mask"], shown)
+                numpy.testing.assert_allclose(expected[statistic][shown], values[shown], rtol=1e-12,
+                                              err_msg=f"{statistic} of level {level}")
+
+    def test_levels_match_brute_force(self):
+        pyramid = FieldPyramid(self.field.shape)
+        self.assertEqual(self.field.size, pyramid.update(self.field, self.mask))
+        self.assertEqual([(13, 7), (7, 4), (4, 2), (2, 1), (1, 1)], pyramid.shapes)
+        self.assert_matches(pyramid, self.field, self.mask)
+
+    def test_padding(self):
+        pyramid = FieldPyramid(self.field.shape)
+        pyramid.update(self.field, self.mask)
+        self.assertEqual([(14, 8), (8, 4), (4, 2), (2, 2), (2, 2)], [count.shape for count in pyramid.count])
+        self.assertFalse(pyramid.count[0][13:].any() or pyramid.count[0][:, 7:].any())
+        self.assertEqual(self.mask.sum(), pyramid.count[-1][0, 0])
+
+    def test_sparse_and_dense_updates(self):
+        pyramid = FieldPyramid(self.field.shape)
+        pyramid.update(self.field, self.mask)
+        self.assertEqual(0, pyramid.update(self.field, self.mask))
+        field, mask = self.field.copy(), self.mask.copy()
+        field[tuple(numpy.argwhere(mask)[0])] = 1000
+        mask[12, 0] = not mask[12, 0]
+        self.assertEqual(2, pyramid.update(field, mask))  # Below DENSE_RATIO, by positions
+        self.assert_matches(pyramid, field, mask)
+        field[::2] = 100
+        self.assertGreater(pyramid.update(field, mask), FieldPyramid.DENSE_RATIO * field.size)
+        self.assert_matches(pyramid, field, mask)
+
+    def test_level_for(self):
+        pyramid = FieldPyramid((64, 32))
+        self.assertEqual(0, pyramid.level_for(0.5))
+        self.assertEqual(1, pyramid.level_for(3.9))
+        self.assertEqual(pyramid.levels - 1, pyramid.level_for(1e6))
+
+    def test_view(self):
+        pyramid = FieldPyramid(self.field.shape)
+        pyramid.update(self.field, self.mask)
+        viewport = Viewport(self.field.shape, (26, 28))  # The grid is narrower than the view, centered in it
+        values, shown = pyramid.view(viewport)
+        rows, columns = viewport.sample()
+        self.assertEqual((26, 28), values.shape)
+        self.assertTrue((columns[:7] == -1).all() and (columns[-7:] == -1).all())
+        self.assertFalse(shown[:, :7].any() or shown[:, -7:].any())
+        inside = numpy.ix_(rows, columns[7:-7])
+        numpy.testing.assert_array_equal(self.mask[inside], shown[:, 7:-7])
+        numpy.testing.assert_array_equal(self.field[inside][self.mask[inside]], values[:, 7:-7][shown[:, 7:-7]])
+
+    def test_view_of_coarse_level(self):
+        pyramid = FieldPyramid(self.field.shape)
+        pyramid.update(self.field, self.mask)
+        viewport = Viewport(self.field.shape, (3, 1))  # 7 cells per pixel, blocks of 4 x 4 cells
+        level = pyramid.level_for(viewport.zoom)
+        self.assertEqual(2, level)
+        values, shown = pyramid.view(viewport, "max")
+        rows, columns = viewport.sample(2 ** level)
+        numpy.testing.assert_array_equal([-1, 1, -1], rows)  # The first and last pixels are above and below the grid
+        numpy.testing.assert_array_equal([[False], [True], [False]], shown)
+        self.assertEqual(brute_force(self.field, self.mask, level)["max"][1, columns[0]], values[1, 0])
+
+    def test_unknown_statistic(self):
+        pyramid = FieldPyramid(self.field.shape)
+        self.assertRaises(ValueError, pyramid.region, 0, slice(None), slice(None), "median")
+
+
+if __name__ == '__main__':
+    unittest.main()
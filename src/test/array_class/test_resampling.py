@@ -0,0 +1,27 @@
+import unittest
+
+import numpy
+
+from models.array_class.resampling import overlap_weights, resample_area
+
+
+class TestResampling(unittest.TestCase):
+    def test_weights(self):
+        numpy.testing.assert_allclose(numpy.ones(3), overlap_weights(7, 3).sum(axis=1))
+        numpy.testing.assert_allclose([[0.5, 0.5, 0, 0], [0, 0, 0.5, 0.5]], overlap_weights(4, 2))
+        numpy.testing.assert_allclose([[1], [1], [1]], overlap_weights(1, 3))
+
+    def test_coverage_of_a_mask(self):
+        mask = numpy.zeros((400, 400), dtype=bool)
+        mask[:100, :50] = True
+        coverage = resample_area(mask, (3, 3))
+        self.assertAlmostEqual(mask.mean() * 9, coverage.sum())
+        self.assertAlmostEqual(3 / 4 * 3 / 8, coverage[0, 0])
+        self.assertEqual(0, coverage[2, 2])
+        numpy.testing.assert_array_equal(numpy.kron(numpy.eye(2), numpy.ones((2, 2))),
+                                         resample_area(numpy.eye(2), (4, 4)))
+
+    def test_preserves_average(self):
+        field = numpy.random.default_rng(0).random((60, 45))
+        for shape in ((60, 45), (7, 13), (120, 100)):
+            self.assertAlmostEqual(field.mean(), resample_area(field, shape).mean())
@@ -0,0 +1,67 @@
+import time
+import unittest
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.array_class.equivalence import seeded_universe
+from models.array_class.simulation_process import SimulationProcess
+
+
+class TestSimulationProcess(unittest.TestCase):
+    def setUp(self):
+        self.universe = seeded_universe((8, 6))
+        self.universe.ENGINE = "array"
+        self.process = SimulationProcess(self.universe, interval=1)
+
+    def tearDown(self):
+        self.process.close()
+
+    def test_same_as_serial_run(self):
+        self.process.step()
+        self.process.step()
+        self.assertEqual(2, self.universe.get_time())
+        serial = seeded_universe((8, 6))
+        serial.ENGINE = "array"
+        for _ in range(2):
+            serial.update_all()
+        serial.synchronize()
+        for name in EarthState.FIELDS:
+            numpy.testing.assert_allclose(getattr(serial.earth.fields, name), getattr(self.universe.earth.fields, name))
+        with self.process.latest() as snapshot:
+            self.assertEqual(2, snapshot.tick)
+            self.assertFalse(snapshot.active.flags.writeable)
+            self.assertEqual(str(serial.summary.earth), str(snapshot.summary.earth))
+
+    def test_run_and_pause(self):
+        self.process.set("universe", "TIME_DELTA", 0.02)
+        self.process.resume()
+        deadline = time.perf_counter() + 30
+        while self.process.published < 3 and time.perf_counter() < deadline:
+            with self.process.latest() as snapshot:
+                if snapshot is not None:
+                    numpy.testing.assert_allclose(snapshot.summary.earth.average_temperature,
+                                                  snapshot.temperature[snapshot.active].mean())
+        self.process.pause()
+        self.assertGreaterEqual(self.universe.get_time(), 3)
+        with self.process.latest() as snapshot:
+            self.assertEqual(self.universe.get_time(), snapshot.tick)
+            self.assertAlmostEqual(0.02 * snapshot.tick, snapshot.time)
+
+    def wait_published(self, count: int):
+        deadline = time.perf_counter() + 30
+        while self.process.published < count and time.perf_counter() < deadline:
+            time.sleep(0.01)
+
+    def test_publications_not_read_are_replaced(self):
+        self.process.resume()
+        self.wait_published(1)
+        time.sleep(1)  # Not polled, every tick is published meanwhile
+        self.assertEqual(2, self.process.published)  # Only the first publication after the one read was sent
+        self.wait_published(3)
+        published = self.process.published
+        with self.process.latest() as snapshot:
+            self.assertGreater(snapshot.tick, published + 1)  # The publications in between replaced each other
+        self.process.pause()
+        with self.process.latest() as snapshot:
+            self.assertEqual(self.universe.get_time(), snapshot.tick)
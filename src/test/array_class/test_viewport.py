@@ -0,0 +1,55 @@
+import unittest
+
+import numpy
+
+from other.viewport import Viewport
+
+
+class TestViewport(unittest.TestCase):
+    def setUp(self):
+        self.viewport = Viewport((100, 200), (50, 50))
+
+    def test_whole_grid_visible(self):
+        self.assertEqual(4, self.viewport.zoom)  # The width fits in the view
+        self.assertEqual((-50, 0), self.viewport.origin)  # Centered vertically
+        self.assertIsNone(self.viewport.cell_at(0, 0))
+        self.assertEqual((4, 2), self.viewport.cell_at(0, 13))
+        rows, columns = self.viewport.sample()
+        self.assertEqual(-1, rows[0])
+        self.assertEqual(198, columns[-1])  # Center of the last pixel
+
+    def test_zoom_keeps_the_cell_under_the_pointer(self):
+        self.viewport.zoom_at(10, 30, 0.5)
+        corner = numpy.add(self.viewport.origin, numpy.multiply((30, 10), self.viewport.zoom))
+        self.viewport.zoom_at(10, 30, 0.25)
+        self.assertEqual(0.5, self.viewport.zoom)
+        numpy.testing.assert_allclose(corner, numpy.add(self.viewport.origin, numpy.multiply((30, 10), 0.5)))
+        self.assertEqual((60, 40), self.viewport.cell_at(10, 30))
+
+    def test_zoom_clamped(self):
+        self.viewport.zoom_at(25, 25, 1e-6)
+        self.assertEqual(Viewport.MIN_ZOOM, self.viewport.zoom)
+        self.viewport.zoom_at(25, 25, 1e6)
+        self.assertEqual(self.viewport.max_zoom, self.viewport.zoom)
+        self.assertEqual((-50, 0), self.viewport.origin)
+        small = Viewport((2, 2), (64, 64))
+        self.assertEqual(small.max_zoom, small.min_zoom)  # Already below MIN_ZOOM to fill the view
+
+    def test_pan_clamped(self):
+        self.viewport.zoom_at(0, 0, 0.5)
+        self.viewport.pan(1000, 1000)
+        self.assertEqual((0, 0), self.viewport.origin)
+        self.viewport.pan(-1000, -1000)
+        self.assertEqual((100 - 50 * 2, 200 - 50 * 2), self.viewport.origin)
+        self.assertEqual((99, 199), self.viewport.cell_at(49, 49))
+
+    def test_sample_blocks(self):
+        self.viewport.zoom_at(0, 0, 0.25)
+        rows, columns = self.viewport.sample(4)
+        numpy.testing.assert_array_equal(numpy.arange(50) // 4, rows)
+        numpy.testing.assert_array_equal(rows, columns)
+        self.assertEqual((0, 0, 50, 50), self.viewport.source_rect())
+
+
+if __name__ == '__main__':
+    unittest.main()
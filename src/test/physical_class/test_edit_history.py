@@ -0,0 +1,81 @@
+import unittest
+
+import numpy
+
+from models.array_class.earth_state import EarthState
+from models.physical_class.edit_history import EditHistory
+from models.physical_class.grid_chunk import GridChunk
+from models.physical_class.universe import Universe
+from models.ticking_class.ticking_earth import TickingEarth
+from models.ticking_class.ticking_grid_chunk import TickingGridChunk
+
+
+class TestEditHistory(unittest.TestCase):
+    def setUp(self):
+        self.universe = Universe()
+        self.earth = TickingEarth(shape=(8, 6), parent=self.universe)
+        self.earth[0] = GridChunk.from_components_tuple((1000, 300, "WATER"), volume=1, index=0, parent=self.earth)
+        self.earth[9] = TickingGridChunk.from_components_tuple((1000, 250, "WATER"), (10, 250, "AIR"), volume=1,
+                                                               index=9, parent=self.earth)
+        self.earth[9].carbon_ppm = 400
+        self.brush = TickingGridChunk.from_components_tuple((500, 280, "LAND"), volume=1000)
+        self.mask = numpy.zeros((6, 8), dtype=bool)
+        self.mask[0:3, 0:4] = True
+        self.history = EditHistory()
+
+    def assert_same_earth(self, expected: EarthState):
+        for name in EarthState.FIELDS:
+            numpy.testing.assert_allclose(getattr(expected, name), getattr(EarthState.from_earth(self.earth), name),
+                                          err_msg=name)
+
+    def test_undo_redo_paint(self):
+        before = EarthState.from_earth(self.earth)
+        self.history.paint(self.earth, self.mask, self.brush)
+        after = EarthState.from_earth(self.earth)
+        self.assertIsNotNone(self.history.undo())
+        self.assert_same_earth(before)
+        self.assertEqual(2, self.earth.nb_active_grid_chunks)
+        self.assertIs(GridChunk, type(self.earth[0]))
+        self.assertIs(TickingGridChunk, type(self.earth[9]))
+        for chunk in self.earth.not_nones():
+            self.assertEqual(self.earth.neighbours(chunk.index), chunk.neighbours)
+        self.assertIsNotNone(self.history.redo())
+        self.assert_same_earth(after)
+        self.assertIsNone(self.history.redo())
+
+    def test_undo_array_state(self):
+        self.earth.update_with_pipeline(0)
+        before = self.earth.array_state.copy()
+        self.history.paint(self.earth, self.mask, self.brush)
+        self.history.undo()
+        for name in EarthState.FIELDS:
+            numpy.testing.assert_allclose(getattr(before, name), getattr(self.earth.array_state, name), err_msg=name)
+        self.earth.synchronize()
+        self.assert_same_earth(before)
+
+    def test_attributes(self):
+        with self.history.group():
+            self.history.set(self.earth, "albedo", 0.5)
+            self.history.set(self.earth, "radius", 10)
+        self.history.set(self.universe, "TIME_DELTA", 7)
+        self.history.set(self.universe, "TIME_DELTA", 7)
+        self.assertEqual(2, len(self.history.undo_stack))
+        self.history.undo()
+        self.assertEqual(Universe.TIME_DELTA, self.universe.TIME_DELTA)
+        self.history.undo()
+        self.assertEqual((0.3, 6.3781e6), (self.earth.albedo, self.earth.radius))
+        self.history.redo()
+        self.assertEqual((0.5, 10), (self.earth.albedo, self.earth.radius))
+        self.history.set(self.earth, "albedo", 0.2)
+        self.assertFalse(self.history.can_redo)
+
+    def test_budget(self):
+        self.history.paint(self.earth, self.mask, self.brush)
+        self.history.paint(self.earth, self.mask, None)
+        self.history.budget = self.history.nbytes - 1
+        self.history.paint(self.earth, self.mask, self.brush)
+        self.assertEqual(2, len(self.history.undo_stack))
+        self.assertLessEqual(self.history.nbytes, self.history.budget)
+        self.history.undo()
+        self.assertEqual(0, self.earth.nb_active_grid_chunks)
+        self.assertLessEqual(self.history.nbytes, self.history.budget)
@@ -1,6 +1,9 @@
 import unittest
 
+import numpy
+
 from models.physical_class.chunk_component import ChunkComponent
+from models.physical_class.component_registry import COMPONENT_REGISTRY
 from models.physical_class.grid_chunk import GridChunk
 
 
@@ -39,3 +42,28 @@ class TestGridChunkBase(unittest.TestCase):
 
     def test_error_unknown_component(self):
         self.assertRaises(NotImplementedError, lambda: self.a_chunk.__setitem__("Chocolate", self.an_air_component))
+
+    def test_mixture_properties_follow_composition(self):
+        chunk = GridChunk([ChunkComponent(1000, 300, "Water"), ChunkComponent(1000, 300, "Land")], volume=1)
+        specific_heat_capacity = chunk.specific_heat_capacity
+        chunk.water_component.mass *= 1 + GridChunk.MIXTURE_THRESHOLD  # Small change, kept as it is
+        self.assertFalse(chunk.update_mixture_properties())
+        self.assertEqual(specific_heat_capacity, chunk.specific_heat_capacity)
+        chunk.water_component.mass /= 2
+        self.assertTrue(chunk.update_mixture_properties())
+        self.assertEqual(GridChunk(list(chunk), volume=1).specific_heat_capacity, chunk.specific_heat_capacity)
+        self.assertAlmostEqual(chunk.heat_transfer_coefficient / chunk.surface * chunk.specific_heat_capacity,
+                               chunk.conductance)
+
+    def test_registered_materials(self):
+        chunk = GridChunk([ChunkComponent(780, 300, "Nitrogen"), ChunkComponent(210, 300, "Oxygen"),
+                           ChunkComponent(10, 300, "Argon")], volume=1)
+        self.assertEqual(3, len(chunk))
+        self.assertIs(chunk.oxygen_component, chunk["OXYGEN"])
+        self.assertEqual(COMPONENT_REGISTRY.id("Nitrogen"), chunk.nitrogen_component.id)
+        self.assertIsNone(chunk.water_component)
+        ratios = numpy.zeros(len(COMPONENT_REGISTRY))
+        for component_type, ratio in chunk.get_mass_ratio().items():
+            ratios[COMPONENT_REGISTRY.id(component_type)] = ratio
+        self.assertAlmostEqual(COMPONENT_REGISTRY.heat_transfer_coefficient @ ratios / 3,
+                               chunk.heat_transfer_coefficient)
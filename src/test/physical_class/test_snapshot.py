@@ -0,0 +1,96 @@
+import threading
+import time
+import unittest
+
+import numpy
+
+from models.array_class.equivalence import seeded_universe
+from models.physical_class.edit_history import EditHistory
+from models.physical_class.snapshot import SnapshotBuffer
+
+
+class TestSnapshotBuffer(unittest.TestCase):
+    def setUp(self):
+        self.universe = seeded_universe((6, 5))
+        self.universe.ENGINE = "array"
+        self.universe.update_all()  # The earth is kept in arrays, whose changes the summary follows
+        self.buffer = SnapshotBuffer()
+
+    def test_publish(self):
+        with self.buffer.latest() as snapshot:
+            self.assertIsNone(snapshot)
+        self.assertTrue(self.buffer.publish(self.universe))
+        with self.buffer.latest() as snapshot:
+            numpy.testing.assert_array_equal(self.universe.earth.fields.temperature, snapshot.temperature)
+            self.assertFalse(snapshot.temperature.flags.writeable)
+            self.assertEqual(str(self.universe), str(snapshot.summary))
+            first = snapshot
+        self.assertTrue(self.buffer.publish(self.universe))
+        self.assertEqual(1, self.buffer.published)  # Nothing changed
+        for _ in range(2):
+            self.universe.update_all()
+            self.buffer.publish(self.universe)
+        with self.buffer.latest() as snapshot:
+            self.assertEqual(3, snapshot.tick)
+            self.assertIs(first.temperature, snapshot.temperature)  # The arrays of the buffers are reused
+
+    def test_never_overwrites_read_snapshot(self):
+        self.buffer.publish(self.universe)
+        with self.buffer.latest() as snapshot:
+            self.universe.update_all()
+            self.assertTrue(self.buffer.publish(self.universe))  # In the other buffer
+            read = snapshot.temperature.copy()
+            self.universe.update_all()
+            self.assertFalse(self.buffer.publish(self.universe))  # Would overwrite the snapshot being read
+            numpy.testing.assert_array_equal(read, snapshot.temperature)
+            self.assertEqual(1, snapshot.tick)
+        self.assertEqual((2, 1), (self.buffer.published, self.buffer.skipped))
+
+    def test_simulation_thread(self):
+        self.universe.SNAPSHOT_INTERVAL = 1
+        thread = threading.Thread(target=self.universe.start_simulation)
+        thread.start()
+        try:
+            deadline = time.perf_counter() + 5
+            while self.universe.snapshots.published < 5 and time.perf_counter() < deadline:
+                with self.universe.snapshots.latest() as snapshot:
+                    if snapshot is not None:
+                        average = snapshot.temperature[snapshot.active].mean()
+                        self.assertAlmostEqual(snapshot.summary.earth.average_temperature, average,
+                                               delta=1e-9 * abs(average))
+        finally:
+            self.universe.stop_updating()
+            thread.join()
+        self.assertGreaterEqual(self.universe.snapshots.published, 5)
+
+
+class TestUniverseSummary(unittest.TestCase):
+    def test_summary(self):
+        universe = seeded_universe((6, 5))
+        summary = universe.summary
+        earth = universe.earth
+        self.assertAlmostEqual(earth.total_mass, summary.earth.total_mass)
+        self.assertAlmostEqual(earth.compute_average_temperature(), summary.earth.average_temperature)
+        energy = earth.compute_total_energy()
+        self.assertAlmostEqual(energy, summary.earth.energy, delta=1e-9 * energy)
+        for component_type, ratio in earth.composition.items():
+            self.assertAlmostEqual(ratio, summary.earth.composition[component_type])
+        universe.update_all()
+        self.assertIsNot(summary, universe.summary)
+        self.assertEqual(1, universe.summary.tick)
+
+    def test_summary_kept_until_modified(self):
+        universe = seeded_universe((6, 5))
+        summary = universe.summary
+        self.assertIs(summary, universe.summary)  # The grid chunks are not gathered again while the earth is unchanged
+        universe.earth.paint(numpy.eye(6, 5, dtype=bool).T, next(universe.earth.not_nones()))
+        self.assertIsNot(summary, universe.summary)
+        summary = universe.summary
+        EditHistory().set(universe.earth, "albedo", 0.5)
+        self.assertIsNot(summary, universe.summary)
+        universe.ENGINE = "array"
+        universe.update_all()
+        summary = universe.summary
+        self.assertIs(summary, universe.summary)
+        universe.update_all()
+        self.assertIsNot(summary, universe.summary)
@@ -1,7 +1,13 @@
+import math
 import unittest
 
+import numpy
+
+from models.array_class import diffusion
+from models.array_class.earth_state import EarthState
 from models.physical_class.grid_chunk import GridChunk
 from models.ticking_class.ticking_earth import TickingEarth
+from models.ticking_class.ticking_grid_chunk import TickingGridChunk
 
 
 class TestTickingEarth(unittest.TestCase):
@@ -25,3 +31,137 @@ class TestTickingEarth(unittest.TestCase):
         for i in range(60 * int(1 / self.earth.get_universe().TIME_DELTA)):
             self.earth.update()
         self.assertAlmostEqual(self.earth[0].temperature, self.earth[1].temperature)
+
+
+class TestTickingEarthPeriodic(unittest.TestCase):
+    def setUp(self):
+        self.earth = TickingEarth(shape=(8, 1), periodic=True)
+        self.initial_temperatures = [300 + 10 * math.cos(2 * math.pi * i / len(self.earth)) for i in range(len(self.earth))]
+        for i, temperature in enumerate(self.initial_temperatures):
+            self.earth[i] = GridChunk.from_components_tuple((1000, temperature, "WATER"), volume=1, index=i,
+                                                            parent=self.earth)
+
+    def test_periodic_neighbours(self):
+        self.assertIn(self.earth[7], self.earth[0].neighbours, "The left border is linked to the right border")
+        self.assertIn(self.earth[0], self.earth[7].neighbours)
+
+    def test_spectral_diffusion_exact_decay(self):
+        self.earth.update()
+        # Water chunks of 1000kg and 1m3 exchange exactly the temperature difference per second
+        decay = math.exp(-self.earth.get_universe().TIME_DELTA * (2 - 2 * math.cos(2 * math.pi / len(self.earth))))
+        for chunk, temperature in zip(self.earth, self.initial_temperatures):
+            self.assertAlmostEqual(chunk.temperature, 300 + (temperature - 300) * decay)
+
+    def test_spectral_diffusion_close_to_stencil(self):
+        stencil_earth = TickingEarth(shape=(8, 1), periodic=True)
+        for i, chunk in enumerate(self.earth):
+            stencil_earth[i] = chunk.deep_copy(new_index=i, new_parent=stencil_earth)
+        stencil_earth.SPECTRAL_DIFFUSION = False
+        self.earth.update()
+        stencil_earth.update()
+        for spectral, stencil in zip(self.earth, stencil_earth):
+            self.assertAlmostEqual(spectral.temperature, stencil.temperature, places=3)
+
+    def test_heterogeneous_falls_back_to_stencil(self):
+        self.earth[1] = GridChunk.from_components_tuple((128, 250, "AIR"), volume=1, index=1, parent=self.earth)
+        self.assertFalse(diffusion.is_uniform(EarthState.from_earth(self.earth)))
+        self.assertFalse(self.earth.uniform_chunks())
+        before_energy = self.earth.compute_total_energy()
+        self.earth.update()
+        self.assertAlmostEqual(self.earth.compute_total_energy(), before_energy, places=3)
+
+    def test_uniform_chunks_as_state(self):
+        self.assertTrue(self.earth.uniform_chunks())
+        self.assertTrue(diffusion.is_uniform(EarthState.from_earth(self.earth)))
+        self.earth[3].water_component.mass *= 1.5
+        self.assertFalse(self.earth.uniform_chunks())
+        self.earth[3] = None
+        self.assertFalse(self.earth.uniform_chunks())
+
+    def test_3d_not_periodic(self):
+        self.assertRaises(ValueError, TickingEarth, shape=(4, 3, 2), periodic=True)
+
+
+class TestTickingEarthWind(unittest.TestCase):
+    def setUp(self):
+        self.earth = TickingEarth(shape=(8, 1), periodic=True)
+        self.air_masses = [10 * (i + 1) for i in range(len(self.earth))]
+        for i, air_mass in enumerate(self.air_masses):
+            self.earth[i] = GridChunk.from_components_tuple((1000, 300, "WATER"), (air_mass, 300, "AIR"), volume=1,
+                                                            index=i, parent=self.earth)
+            self.earth[i].carbon_ppm = i
+        self.time_delta = self.earth.get_universe().TIME_DELTA
+
+    def test_no_wind_no_transport(self):
+        self.earth.update()
+        self.assertEqual(self.air_masses, [chunk.air_component.mass for chunk in self.earth])
+
+    def test_large_courant_number(self):
+        # 3 cells per tick, an explicit scheme would be unstable
+        self.earth.wind = numpy.array([3 / self.time_delta, 0]).reshape((2, 1, 1))
+        self.earth.update()
+        for i, chunk in enumerate(self.earth):
+            self.assertAlmostEqual(chunk.air_component.mass, self.air_masses[(i - 3) % len(self.earth)])
+            self.assertAlmostEqual(chunk.carbon_ppm, (i - 3) % len(self.earth))
+
+    def test_time_varying_wind_conserves_mass(self):
+        self.earth.wind = lambda time: numpy.array([0.37 / self.time_delta + time, 0]).reshape((2, 1, 1))
+        for _ in range(5):
+            self.earth.update()
+        self.assertAlmostEqual(sum(self.air_masses), sum(chunk.air_component.mass for chunk in self.earth))
+
+
+class TestTickingEarthCarbonCycle(unittest.TestCase):
+    def setUp(self):
+        self.earth = TickingEarth(shape=(4, 1))
+        self.earth[0] = GridChunk.from_components_tuple((1000, 300, "WATER"), volume=1, index=0, parent=self.earth)
+        self.earth[1] = GridChunk.from_components_tuple((500, 300, "WATER"), (500, 300, "LAND"), volume=1, index=1,
+                                                        parent=self.earth)
+        self.earth[2] = GridChunk.from_components_tuple((1000, 300, "LAND"), volume=1, index=2, parent=self.earth)
+
+    def test_carbon_budget_conserved(self):
+        self.earth.carbon_cycle()
+        budget = self.earth.carbon_budget
+        self.assertAlmostEqual(budget.emissions, self.earth.CARBON_EMISSIONS_PER_TIME_DELTA)
+        self.assertAlmostEqual(budget.ocean_uptake, self.earth.carbon_flux_to_ocean)
+        self.assertAlmostEqual(budget.total, budget.net)
+        self.assertAlmostEqual(sum(chunk.carbon_ppm for chunk in self.earth.not_nones()), budget.net)
+
+    def test_carbon_flows_follow_composition(self):
+        self.earth.carbon_cycle()
+        emitted = self.earth.CARBON_EMISSIONS_PER_TIME_DELTA / 3
+        ocean = self.earth.carbon_flux_to_ocean
+        land = self.earth.land_carbon_decay - self.earth.biosphere_carbon_absorption
+        self.assertAlmostEqual(self.earth[0].carbon_ppm, emitted - ocean * 2 / 3)
+        self.assertAlmostEqual(self.earth[1].carbon_ppm, emitted - ocean / 3 + land / 3)
+        self.assertAlmostEqual(self.earth[2].carbon_ppm, emitted + land * 2 / 3)
+
+
+class TestTickingEarthPaint(unittest.TestCase):
+    def setUp(self):
+        self.earth = TickingEarth(shape=(6, 5))
+        self.earth[0] = GridChunk.from_components_tuple((1000, 300, "WATER"), volume=1, index=0, parent=self.earth)
+        self.brush = TickingGridChunk.from_components_tuple((500, 280, "WATER"), (300, 280, "AIR"), volume=1000)
+        self.mask = numpy.zeros((5, 6), dtype=bool)
+        self.mask[1:4, 2:5] = True
+
+    def test_paint(self):
+        self.earth.paint(self.mask, self.brush)
+        self.assertEqual(10, self.earth.nb_active_grid_chunks)
+        for chunk in self.earth.not_nones():
+            self.assertEqual(self.earth.neighbours(chunk.index), chunk.neighbours)
+        painted = self.earth.get_component_at(3, 2)
+        self.assertIsNot(self.brush, painted)
+        self.assertEqual(self.brush.deep_copy(), painted)
+        self.assertAlmostEqual(280, painted.temperature)
+        painted.water_component.mass *= 2
+        self.assertEqual(500, self.brush.water_component.mass)
+
+    def test_paint_array_state(self):
+        self.earth.update_with_pipeline(0)
+        self.earth.paint(self.mask, self.brush)
+        self.assertIsNotNone(self.earth.array_state)
+        self.earth.synchronize()
+        expected = EarthState.from_earth(self.earth)
+        for name in EarthState.FIELDS:
+            numpy.testing.assert_allclose(getattr(expected, name), getattr(self.earth.array_state, name), err_msg=name)
@@ -1,5 +1,38 @@
+import os
+import struct
+import tempfile
 import unittest
+import zlib
+
+import numpy
+
+from models.array_class.equivalence import seeded_universe
+from other.animation import AnimationExporter
 
 
 class TestTickingUniverse(unittest.TestCase):
-    pass
+    def test_animation_exporter(self):
+        universe = seeded_universe((12, 7))
+        with tempfile.TemporaryDirectory() as directory:
+            with AnimationExporter(directory, ("temperature", "carbon_ppm"), interval=2, block=True, scale=2,
+                                   gap=1) as exporter:
+                universe.attach(exporter)
+                for _ in range(6):
+                    universe.update_all()
+                universe.detach(exporter)
+            self.assertEqual((3, 3, 0), (exporter.recorded, exporter.written, exporter.dropped))
+            self.assertEqual(["frame000000.png", "frame000001.png", "frame000002.png"], sorted(os.listdir(directory)))
+            with open(exporter.path(2), "rb") as file:
+                data = file.read()
+        self.assertEqual(b"\x89PNG\r\n\x1a\n", data[:8])
+        width, height = struct.unpack(">II", data[16:24])
+        self.assertEqual(((12 + 1) * 2 - 1) * 2, width)
+        self.assertEqual(7 * 2, height)
+        length, = struct.unpack(">I", data[33:37])
+        self.assertEqual(b"IDAT", data[37:41])
+        rows = numpy.frombuffer(zlib.decompress(data[41:41 + length]), dtype=numpy.uint8).reshape((height, -1))
+        pixels = (numpy.cumsum(rows[:, 1:], axis=0, dtype=numpy.uint64) % 256).reshape((height, width, 3))
+        numpy.testing.assert_array_equal(0, pixels[:, 24:26])  # The gap between the fields
+        active = numpy.repeat(numpy.repeat(universe.earth.fields.active, 2, axis=0), 2, axis=1)
+        self.assertTrue((pixels[:, :24][~active] == 0).all())
+        self.assertTrue((pixels[:, :24][active].sum(axis=1) > 0).all())
@@ -1,8 +1,10 @@
 from typing import TYPE_CHECKING
 
-from PyQt5 import QtWidgets
+from PyQt5 import QtCore, QtWidgets
 from PyQt5.QtWidgets import QPushButton
 
+from constants import FRAME_RATE
+
 if TYPE_CHECKING:
     from controller.CanvasArea.canvas_area_controller import CanvasAreaController
     from controller.main_controller import MainController
@@ -30,6 +32,10 @@ class CanvasArea(QtWidgets.QWidget):
 
         self.layout().addLayout(sub_layout)
 
+        self.frame_timer = QtCore.QTimer()
+        self.frame_timer.timeout.connect(self.controller.render_snapshot)
+        self.frame_timer.start(1000 // FRAME_RATE)
+
     def clear_canvas(self):
         self.canvas.clear()
 
@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from PyQt5 import QtWidgets
+from PyQt5 import QtGui, QtWidgets
 
 from models.physical_class.universe import Universe
 
@@ -21,3 +21,7 @@ class MainView(QtWidgets.QWidget):
 
         self.canvas_area_view = self.controller.canvas_controller.view
         self.layout().addWidget(self.canvas_area_view)
+
+    def closeEvent(self, event: QtGui.QCloseEvent) -> None:
+        self.controller.closed()
+        super().closeEvent(event)
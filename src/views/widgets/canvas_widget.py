@@ -1,11 +1,14 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
-from PyQt5 import QtWidgets, QtGui
+import numpy
+from PyQt5 import QtCore, QtWidgets, QtGui
 from PyQt5.QtCore import Qt
 
 from constants import CANVAS_SIZE
 from messages import CannotPaintNow, NoComponentBrushSelected
+from other.earth_image import pixels_to_image
 from other.utils import color_from_chunk
+from other.viewport import Viewport
 
 if TYPE_CHECKING:
     from controller.CanvasArea.subcontrollers.canvas_controller import CanvasController
@@ -13,6 +16,7 @@ if TYPE_CHECKING:
 
 class CanvasWidget(QtWidgets.QLabel):
     CLEAR_COLOR = QtGui.QColor("black")
+    PAN_BUTTONS = (Qt.RightButton, Qt.MiddleButton)
 
     def __init__(self, controller: "CanvasController"):
         self.controller = controller
@@ -21,16 +25,36 @@ class CanvasWidget(QtWidgets.QLabel):
         self.setPixmap(QtGui.QPixmap(*CANVAS_SIZE))
         self.setFixedSize(*CANVAS_SIZE)
         self.setMouseTracking(True)
+        # The composition of the earth, one pixel per cell, of which the viewport is shown
+        self.image: Optional[QtGui.QImage] = None
+        self.viewport: Optional[Viewport] = None
+        self.drag_position: Optional[QtCore.QPoint] = None  # Last position of the mouse while panning
 
     def mousePressEvent(self, ev: QtGui.QMouseEvent) -> None:
+        if ev.button() in CanvasWidget.PAN_BUTTONS:
+            self.drag_position = ev.pos()
+            return
         self.controller.mouse_engaged()
 
     def mouseReleaseEvent(self, ev: QtGui.QMouseEvent) -> None:
+        if ev.button() in CanvasWidget.PAN_BUTTONS:
+            self.drag_position = None
+            return
         self.controller.mouse_released()
 
+    def wheelEvent(self, e: QtGui.QWheelEvent) -> None:
+        self.viewport.zoom_at(e.pos().x(), e.pos().y(), 0.5 if e.angleDelta().y() > 0 else 2)
+        self.render()
+
     def mouseMoveEvent(self, e: QtGui.QMouseEvent):
-        if self.rect().contains(e.pos()):
-            self.controller.mouse_moved(e.x(), e.y())
+        if self.drag_position is not None:
+            self.viewport.pan(e.x() - self.drag_position.x(), e.y() - self.drag_position.y())
+            self.drag_position = e.pos()
+            self.render()
+            return
+        cell = self.viewport.cell_at(e.x(), e.y())
+        if cell is not None:
+            self.controller.mouse_moved(cell[1], cell[0])
         # If we are not pressing (keyDown) the left mouse button, return
         if Qt.LeftButton != e.buttons():
             return
@@ -43,23 +67,55 @@ class CanvasWidget(QtWidgets.QLabel):
         if chunk is None:
             self.controller.main_controller.process_message(NoComponentBrushSelected())
             return
-        with QtGui.QPainter(self.pixmap()) as painter:
-            pen = QtGui.QPen()
-            brush_color = color_from_chunk(chunk)  # color_from_ratio(ratios)
-            pen.setColor(brush_color)
-            width = self.controller.get_brush_width()
-            pen.setWidth(width)
-            painter.setPen(pen)
-            x, y = e.x(), e.y()
-            painter.drawPoint(e.x(), e.y())
-            if width == 1:
-                self.controller.last_painted_positions.append((x, y))
-            else:
-                for i in range(max(0, x - width // 2), min(CANVAS_SIZE[0], x + width // 2)):
-                    for j in range(max(0, y - width // 2), min(CANVAS_SIZE[1], y + width // 2)):
-                        self.controller.last_painted_positions.append((i, j))
+        # The brush is as wide on the screen at any zoom, the stroke is rasterized on the cells when it is released
+        width = self.controller.get_brush_width() * self.viewport.zoom
+        position = self.viewport.position_at(e.x(), e.y())
+        with QtGui.QPainter(self.image) as painter:
+            painter.fillRect(QtCore.QRectF(position[1] - width / 2, position[0] - width / 2, width, width),
+                             color_from_chunk(chunk))  # color_from_ratio(ratios)
+        self.controller.paint_square(*position, width)
+        self.render()
+
+    def render(self):
+        """
+        Draw the part of the composition in the viewport, scaled to the canvas. Qt only reads the visible cells
+        :return:
+        """
+        pixmap = QtGui.QPixmap(*CANVAS_SIZE)
+        pixmap.fill(CanvasWidget.CLEAR_COLOR)
+        with QtGui.QPainter(pixmap) as painter:
+            painter.drawImage(QtCore.QRectF(0, 0, *CANVAS_SIZE), self.image,
+                              QtCore.QRectF(*self.viewport.source_rect()))
+        self.setPixmap(pixmap)
         self.update()
 
+    def draw_cells(self, indices: numpy.ndarray, colors: list[int]):
+        """
+        :param indices: flat indices of the cells, x + y * width
+        :param colors: color of each cell, as QColor.rgb
+        :return:
+        """
+        width = self.image.width()
+        for index, color in zip(indices.tolist(), colors):
+            self.image.setPixel(index % width, index // width, color)
+        self.render()
+
+    def draw_pixels(self, pixels: numpy.ndarray):
+        """
+        :param pixels: (height, width, 3) uint8 color of every cell of the earth
+        :return:
+        """
+        self.image = pixels_to_image(pixels)
+        self.render()
+
     def clear(self):
-        self.pixmap().fill(CanvasWidget.CLEAR_COLOR)
-        self.update()
+        """
+        Start again from an empty composition, of the shape of the earth
+        :return:
+        """
+        height, width = self.controller.get_grid_shape()
+        if self.image is None or (self.image.height(), self.image.width()) != (height, width):
+            self.image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+            self.viewport = Viewport((height, width), (CANVAS_SIZE[1], CANVAS_SIZE[0]))
+        self.image.fill(CanvasWidget.CLEAR_COLOR)
+        self.render()
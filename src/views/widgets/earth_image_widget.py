@@ -0,0 +1,41 @@
+from typing import TYPE_CHECKING
+
+from PyQt5 import QtWidgets
+
+if TYPE_CHECKING:
+    from controller.ToolbarArea.subcontrollers.earth_image_controller import EarthImageController
+
+
+class EarthImageWidget(QtWidgets.QWidget):
+    FILTER = "Images (*.png *.bmp *.jpg *.jpeg)"
+
+    def __init__(self, controller: "EarthImageController"):
+        self.controller = controller
+        super().__init__()
+        self.setLayout(QtWidgets.QVBoxLayout())
+
+        self.import_button = QtWidgets.QPushButton("Import Image")
+        self.import_button.setToolTip("Replace the earth by the components of an image, painted with the brush "
+                                      "properties")
+        self.import_button.clicked.connect(self.controller.import_pressed)
+        self.layout().addWidget(self.import_button)
+
+        self.export_button = QtWidgets.QPushButton("Export Image")
+        self.export_button.setToolTip("Save the components of the earth as a PNG image")
+        self.export_button.clicked.connect(self.controller.export_pressed)
+        self.layout().addWidget(self.export_button)
+
+        self.record_button = QtWidgets.QPushButton("Record Animation")
+        self.record_button.setCheckable(True)
+        self.record_button.setToolTip("Write a heatmap of the temperature as a PNG frame while the simulation runs")
+        self.record_button.toggled.connect(self.controller.record_toggled)
+        self.layout().addWidget(self.record_button)
+
+    def ask_open_path(self) -> str:
+        return QtWidgets.QFileDialog.getOpenFileName(self, "Import Image", filter=self.FILTER)[0]
+
+    def ask_save_path(self) -> str:
+        return QtWidgets.QFileDialog.getSaveFileName(self, "Export Image", filter="PNG (*.png)")[0]
+
+    def ask_directory(self) -> str:
+        return QtWidgets.QFileDialog.getExistingDirectory(self, "Record Animation")
@@ -1,8 +1,10 @@
 import random
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 import matplotlib.cm
+import numpy
 from PyQt5 import QtGui
+from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QImage, QPixmap, QColor
 from PyQt5.QtWidgets import *
 
@@ -12,12 +14,16 @@ if TYPE_CHECKING:
     from controller.CanvasArea.canvas_area_controller import CanvasAreaController
 from models.physical_class.chunk_component import ChunkComponent
 from models.physical_class.grid_chunk import GridChunk
-from other.utils import index_to_2D
+from models.physical_class.snapshot import Snapshot
+from other.heatmap import colormap_lut, heatmap_pixels
+from other.pyramid import FieldPyramid
+from other.viewport import Viewport
 
 
 class PropertyViewWidget(QWidget):
     CLEAR_COLOR = QtGui.QColor("black")
     heatmap = matplotlib.cm.get_cmap('coolwarm')
+    HEATMAP_LUT = colormap_lut(heatmap)  # Colors of the heatmap, sampled once
 
     def temperature_to_color(self, temperature: float) -> QtGui.QColor:
         ratio = (temperature - self.lowest_temperature_spinbox.value()) / (
@@ -35,7 +41,14 @@ class PropertyViewWidget(QWidget):
         self.canvas.setPixmap(QPixmap.fromImage(QImage(*CANVAS_SIZE, QImage.Format_RGB32)))
         self.canvas.setFixedSize(*CANVAS_SIZE)
         self.canvas.mouseMoveEvent = self.mouse_moved
+        self.canvas.mousePressEvent = self.mouse_pressed
+        self.canvas.wheelEvent = self.wheel_turned
         self.canvas.setMouseTracking(True)
+        self.pixels: numpy.ndarray = None  # Buffer of the last heatmap
+        # Temperatures of the last snapshot shown, at every zoom, and the part of the earth in the canvas
+        self.pyramid: Optional[FieldPyramid] = None
+        self.viewport: Optional[Viewport] = None
+        self.drag_position: Optional[tuple[int, int]] = None  # Last position of the mouse while panning
 
         lowest_temperature_layout = QHBoxLayout()
         text = QLabel("Lowest temperature (°C) for heatmap: ")
@@ -55,8 +68,17 @@ class PropertyViewWidget(QWidget):
         self.highest_temperature_spinbox.setValue(30)
         highest_temperature_layout.addWidget(self.highest_temperature_spinbox)
 
+        statistic_layout = QHBoxLayout()
+        statistic_layout.addWidget(QLabel("Temperature of the cells shown by a pixel when zoomed out: "))
+        self.statistic_combobox = QComboBox(self)
+        self.statistic_combobox.addItems(FieldPyramid.STATISTICS)
+        self.statistic_combobox.setCurrentText("mean")
+        self.statistic_combobox.currentTextChanged.connect(self.render)
+        statistic_layout.addWidget(self.statistic_combobox)
+
         self.layout().addLayout(lowest_temperature_layout)
         self.layout().addLayout(highest_temperature_layout)
+        self.layout().addLayout(statistic_layout)
         self.layout().addWidget(self.canvas)
         button = QPushButton("Update")
         button.clicked.connect(self.update_pixels)
@@ -64,29 +86,69 @@ class PropertyViewWidget(QWidget):
         self.clear()
 
     def update_pixels(self) -> None:
-        self.canvas.pixmap().fill(PropertyViewWidget.CLEAR_COLOR)
         if not self.controller.main_controller.model:
+            self.clear()
+            return
+        with self.controller.main_controller.latest_snapshot() as snapshot:
+            self.show_snapshot(snapshot)
+
+    def show_snapshot(self, snapshot: Optional[Snapshot]) -> None:
+        """
+        :param snapshot: must not be published again while it is shown, see SnapshotBuffer.latest
+        :return:
+        """
+        if snapshot is None:
+            self.clear()
+            return
+        if self.pyramid is None or self.pyramid.shapes[0] != snapshot.temperature.shape:
+            self.pyramid = FieldPyramid(snapshot.temperature.shape)
+            self.viewport = Viewport(snapshot.temperature.shape, (self.canvas.height(), self.canvas.width()))
+        # Only the blocks above the cells that changed since the last snapshot are computed again
+        self.pyramid.update(snapshot.temperature, snapshot.active)
+        self.render()
+
+    def render(self) -> None:
+        """
+        Draw the part of the earth in the viewport, from the level of the pyramid matching its zoom
+        :return:
+        """
+        if self.pyramid is None:
             return
-        image = QImage(*CANVAS_SIZE, QImage.Format_RGB32)
-        image.fill(PropertyViewWidget.CLEAR_COLOR)
         min_value = self.lowest_temperature_spinbox.value() + 273.15
         max_value = self.highest_temperature_spinbox.value() + 273.15
-        for component in self.controller.main_controller.model.earth.not_nones():
-            temp = component.temperature + 273.15
-            x, y = index_to_2D(component.index, self.controller.main_controller.model.earth.shape)
-            r, g, b, _ = PropertyViewWidget.heatmap((temp - min_value) / (max_value - min_value))
-            image.setPixel(x, y, QColor(r * 255, g * 255, b * 255).rgb())
+        values, mask = self.pyramid.view(self.viewport, self.statistic_combobox.currentText())
+        # The whole heatmap in one pass over the arrays, the image uses the pixels as its buffer
+        self.pixels = heatmap_pixels(values + 273.15, min_value, max_value, PropertyViewWidget.HEATMAP_LUT, mask=mask,
+                                     background=PropertyViewWidget.CLEAR_COLOR.rgb())
+        height, width = self.pixels.shape
+        image = QImage(self.pixels.data, width, height, self.pixels.strides[0], QImage.Format_RGB32)
         self.canvas.setPixmap(QPixmap.fromImage(image))
 
+    def mouse_pressed(self, e: QtGui.QMouseEvent):
+        self.drag_position = (e.x(), e.y())
+
     def mouse_moved(self, e: QtGui.QMouseEvent):
-        if self.controller.main_controller.model.earth.get_component_at(e.x(), e.y()):
-            component = self.controller.main_controller.model.get_component_at(e.x(), e.y())
-            self.canvas.setToolTip(f"Temperature: {component.temperature} C")
+        if self.viewport is None:
+            return
+        if e.buttons() & Qt.LeftButton and self.drag_position is not None:
+            self.viewport.pan(e.x() - self.drag_position[0], e.y() - self.drag_position[1])
+            self.drag_position = (e.x(), e.y())
+            self.render()
+        cell = self.viewport.cell_at(e.x(), e.y())
+        if cell is not None and self.pyramid.mask[cell]:
+            self.canvas.setToolTip(f"Temperature: {self.pyramid.field[cell]} C")
         else:
             self.canvas.setToolTip("")
 
+    def wheel_turned(self, e: QtGui.QWheelEvent):
+        if self.viewport is None:
+            return
+        self.viewport.zoom_at(e.pos().x(), e.pos().y(), 0.5 if e.angleDelta().y() > 0 else 2)
+        self.render()
+
     def clear(self):
         self.canvas.pixmap().fill(PropertyViewWidget.CLEAR_COLOR)
+        self.pyramid = self.viewport = None
         self.update()
 
 
@@ -0,0 +1,27 @@
+from typing import TYPE_CHECKING
+
+from PyQt5 import QtWidgets
+
+if TYPE_CHECKING:
+    from controller.ToolbarArea.subcontrollers.resolution_controller import ResolutionController
+
+
+class ResolutionWidget(QtWidgets.QWidget):
+    def __init__(self, controller: "ResolutionController"):
+        self.controller = controller
+        super().__init__()
+        self.setLayout(QtWidgets.QVBoxLayout())
+
+        self.layout().addWidget(QtWidgets.QLabel("Resolution"))
+        self.combobox = QtWidgets.QComboBox()
+        self.combobox.setToolTip("Number of cells of the simulated earth, changing it resets the earth")
+        for width, height in self.controller.get_shapes():
+            self.combobox.addItem(f"{width} x {height}")
+        self.show_shape(self.controller.get_shape())
+        self.combobox.activated.connect(self.controller.shape_selected)
+        self.layout().addWidget(self.combobox)
+
+    def show_shape(self, shape: tuple[int, int]):
+        shapes = self.controller.get_shapes()
+        if tuple(shape) in shapes:
+            self.combobox.setCurrentIndex(shapes.index(tuple(shape)))
@@ -86,5 +86,8 @@ class SelectComponentWidget(QtWidgets.QWidget):
         sub_sub_v_layout.addWidget(self.spinbox)
         sub_h_layout.addLayout(sub_sub_v_layout)
         sub_h_layout.addWidget(self.controller.parent_controller.clear_canvas_controller.view)
+        sub_h_layout.addWidget(self.controller.parent_controller.undo_redo_controller.view)
+        sub_h_layout.addWidget(self.controller.parent_controller.resolution_controller.view)
+        sub_h_layout.addWidget(self.controller.parent_controller.earth_image_controller.view)
 
         self.layout().addLayout(sub_h_layout)
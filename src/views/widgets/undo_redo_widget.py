@@ -0,0 +1,25 @@
+from typing import TYPE_CHECKING
+
+from PyQt5 import QtGui, QtWidgets
+
+if TYPE_CHECKING:
+    from controller.ToolbarArea.subcontrollers.undo_redo_controller import UndoRedoController
+
+
+class UndoRedoWidget(QtWidgets.QWidget):
+    def __init__(self, controller: "UndoRedoController"):
+        self.controller = controller
+        super().__init__()
+        self.setLayout(QtWidgets.QVBoxLayout())
+
+        self.undo_button = QtWidgets.QPushButton("Undo")
+        self.undo_button.setShortcut(QtGui.QKeySequence.Undo)
+        self.undo_button.setToolTip("Undo the last stroke or property change")
+        self.undo_button.clicked.connect(self.controller.undo_pressed)
+        self.layout().addWidget(self.undo_button)
+
+        self.redo_button = QtWidgets.QPushButton("Redo")
+        self.redo_button.setShortcut(QtGui.QKeySequence.Redo)
+        self.redo_button.setToolTip("Redo the last undone stroke or property change")
+        self.redo_button.clicked.connect(self.controller.redo_pressed)
+        self.layout().addWidget(self.redo_button)